@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Categorie, Facture, Client, LogCreationFacture
+from .models import Categorie, Facture, Client, LogCreationFacture, SequenceFacture
 
 
 @admin.register(Client)
@@ -9,7 +9,7 @@ class ClientAdmin(admin.ModelAdmin):
     Configuration de l'interface d'administration pour les clients.
     Permet la recherche par nom et email, et le filtrage par date de création.
     """
-    list_display = ['nom', 'email', 'telephone', 'date_creation']
+    list_display = ['nom', 'email', 'telephone', 'date_creation', 'nb_factures', 'total_ttc', 'total_impaye']
     search_fields = ['nom', 'email']
     list_filter = ['date_creation']
     ordering = ['nom']
@@ -21,7 +21,7 @@ class CategorieAdmin(admin.ModelAdmin):
     Configuration de l'interface d'administration pour les catégories.
     Permet la recherche par nom et le filtrage par couleur.
     """
-    list_display = ['nom', 'couleur']
+    list_display = ['nom', 'couleur', 'nb_factures', 'total_ttc', 'total_impaye']
     search_fields = ['nom']
     list_filter = ['couleur']
 
@@ -37,6 +37,7 @@ class FactureAdmin(admin.ModelAdmin):
     search_fields = ['numero', 'client__nom', 'client__email']
     date_hierarchy = 'date'
     list_editable = ['paye']
+    list_select_related = ['client', 'categorie']
     actions = ['marquer_comme_paye', 'marquer_comme_non_paye']
     list_per_page = 25
 
@@ -51,6 +52,15 @@ class FactureAdmin(admin.ModelAdmin):
             return format_html('<span style="color: red; font-weight: bold;">✗ Non payée</span>')
     statut_paye_colore.short_description = 'Statut'
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Utilise l'index plein texte de FactureQuerySet.recherche_avancee
+        plutôt que des icontains sur la jointure avec Client.
+        """
+        if not search_term.strip():
+            return queryset, False
+        return queryset.recherche_avancee(search_term), False
+
     def marquer_comme_paye(self, request, queryset):
         """
         Action pour marquer les factures sélectionnées comme payées.
@@ -89,6 +99,7 @@ class LogCreationFactureAdmin(admin.ModelAdmin):
     search_fields = ['facture__numero', 'facture__client__nom', 'ip_utilisateur']
     date_hierarchy = 'date_creation'
     readonly_fields = ['facture', 'date_creation', 'ip_utilisateur', 'user_agent', 'methode_creation', 'details_supplementaires']
+    list_select_related = ['facture', 'facture__client']
     list_per_page = 50
     ordering = ['-date_creation']
 
@@ -122,3 +133,17 @@ class LogCreationFactureAdmin(admin.ModelAdmin):
         Permet la suppression des logs pour la maintenance.
         """
         return True
+
+
+@admin.register(SequenceFacture)
+class SequenceFactureAdmin(admin.ModelAdmin):
+    """
+    Consultation des séquences de numérotation des factures.
+    Les valeurs ne sont modifiées que par SequenceFacture.objects : lecture seule.
+    """
+    list_display = ['prefixe', 'annee', 'dernier']
+    list_filter = ['prefixe', 'annee']
+    readonly_fields = ['prefixe', 'annee', 'dernier']
+
+    def has_add_permission(self, request):
+        return False
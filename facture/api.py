@@ -0,0 +1,244 @@
+"""
+API JSON en lecture seule pour les factures, clients et catégories.
+
+Les lignes sont lues avec values_list() et sérialisées directement : aucune
+instance de modèle n'est créée et aucun template n'est rendu. Les montants
+sont sérialisés en chaînes pour ne pas perdre de précision.
+
+    GET /api/factures/?fields=numero,date,montant_ttc&client=1&date_debut=2024-01-01
+    GET /api/factures/?apres=<curseur>&limite=100
+    GET /api/factures/lot/?ids=1,2,3
+    GET /api/clients/?fields=id,nom
+    GET /api/categories/
+
+Paramètres communs :
+    fields : champs retournés, séparés par des virgules (défaut : tous)
+    limite : nombre de lignes par page (défaut 50, maximum 500)
+    apres  : curseur opaque renvoyé dans « suivant » par la page précédente
+
+Les factures sont triées par (-date, -id), les clients et catégories par id.
+Le sérialiseur orjson est utilisé s'il est installé, json sinon.
+"""
+import base64
+import binascii
+import functools
+from datetime import date
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from .models import Categorie, Client, Facture
+from .pagination import decoder_curseur, encoder_curseur
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    orjson = None
+    import json
+
+
+LIMITE_PAR_DEFAUT = 50
+LIMITE_MAX = 500
+TAILLE_MAX_LOT = 200
+
+# Champs exposés : nom dans la réponse -> champ lu en base
+CHAMPS_FACTURE = {
+    'id': 'id',
+    'numero': 'numero',
+    'date': 'date',
+    'montant_ht': 'montant_ht',
+    'taux_tva': 'taux_tva',
+    'montant_tva': 'montant_tva',
+    'montant_ttc': 'montant_ttc',
+    'paye': 'paye',
+    'client': 'client_id',
+    'client_nom': 'client__nom',
+    'categorie': 'categorie_id',
+    'categorie_nom': 'categorie__nom',
+}
+
+CHAMPS_CLIENT = {
+    'id': 'id',
+    'nom': 'nom',
+    'email': 'email',
+    'telephone': 'telephone',
+    'adresse': 'adresse',
+    'date_creation': 'date_creation',
+    'nb_factures': 'nb_factures',
+    'total_ttc': 'total_ttc',
+    'total_impaye': 'total_impaye',
+}
+
+CHAMPS_CATEGORIE = {
+    'id': 'id',
+    'nom': 'nom',
+    'couleur': 'couleur',
+    'nb_factures': 'nb_factures',
+    'total_ttc': 'total_ttc',
+    'total_impaye': 'total_impaye',
+}
+
+
+class ErreurParametre(ValueError):
+    """Paramètre de requête invalide, renvoyé au client avec un statut 400."""
+
+
+def _serialiser_par_defaut(valeur):
+    if isinstance(valeur, Decimal):
+        return str(valeur)
+    raise TypeError(f"Type non sérialisable : {type(valeur).__name__}")
+
+
+def reponse_json(donnees, status=200):
+    """Réponse JSON compacte."""
+    if orjson is not None:
+        contenu = orjson.dumps(donnees, default=_serialiser_par_defaut)
+    else:
+        contenu = json.dumps(donnees, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return HttpResponse(contenu, content_type='application/json', status=status)
+
+
+def _api(vue):
+    """Décore une vue d'API : GET uniquement, erreurs de paramètres en 400."""
+    @require_GET
+    @functools.wraps(vue)
+    def enveloppe(request, *args, **kwargs):
+        try:
+            return vue(request, *args, **kwargs)
+        except ErreurParametre as e:
+            return reponse_json({'erreur': str(e)}, status=400)
+    return enveloppe
+
+
+def champs_demandes(request, champs):
+    """Retourne les noms de champs du paramètre fields (tous par défaut)."""
+    valeur = request.GET.get('fields')
+    if not valeur:
+        return list(champs)
+    noms = [nom.strip() for nom in valeur.split(',') if nom.strip()]
+    inconnus = [nom for nom in noms if nom not in champs]
+    if inconnus or not noms:
+        raise ErreurParametre(
+            f"Champ(s) inconnu(s) : {', '.join(inconnus) or valeur}. "
+            f"Champs disponibles : {', '.join(champs)}."
+        )
+    return list(dict.fromkeys(noms))
+
+
+def _entier(request, nom, defaut=None, maximum=None):
+    valeur = request.GET.get(nom)
+    if not valeur:
+        return defaut
+    try:
+        entier = int(valeur)
+    except ValueError:
+        raise ErreurParametre(f"Paramètre {nom} invalide : {valeur!r}")
+    if entier < 1:
+        raise ErreurParametre(f"Paramètre {nom} invalide : {valeur!r}")
+    return min(entier, maximum) if maximum else entier
+
+
+def _date(request, nom):
+    valeur = request.GET.get(nom)
+    if not valeur:
+        return None
+    try:
+        return date.fromisoformat(valeur)
+    except ValueError:
+        raise ErreurParametre(f"Paramètre {nom} invalide (format attendu : AAAA-MM-JJ).")
+
+
+def _lignes(queryset, noms, champs, internes=()):
+    """
+    Lit les champs demandés (et les champs internes nécessaires au curseur)
+    avec values_list() et retourne des dictionnaires nom -> valeur.
+    """
+    lus = list(dict.fromkeys([*noms, *internes]))
+    lignes = queryset.values_list(*[champs[nom] for nom in lus])
+    return [dict(zip(lus, ligne)) for ligne in lignes]
+
+
+def _page(lignes, limite, curseur, noms):
+    """Construit la réponse paginée : lignes filtrées sur noms et curseur suivant."""
+    suivant = curseur(lignes[limite - 1]) if len(lignes) > limite else None
+    resultats = [{nom: ligne[nom] for nom in noms} for ligne in lignes[:limite]]
+    return reponse_json({'resultats': resultats, 'suivant': suivant})
+
+
+def _encoder_id(pk):
+    return base64.urlsafe_b64encode(str(pk).encode()).decode().rstrip('=')
+
+
+def _decoder_id(curseur):
+    try:
+        return int(base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4)).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ErreurParametre(f"Curseur invalide : {curseur!r}")
+
+
+@_api
+def liste_factures(request):
+    """Factures filtrées (client, categorie, date_debut, date_fin), par pages de curseur."""
+    noms = champs_demandes(request, CHAMPS_FACTURE)
+    limite = _entier(request, 'limite', LIMITE_PAR_DEFAUT, LIMITE_MAX)
+    queryset = Facture.objects.filtrer(
+        client=_entier(request, 'client'),
+        categorie=_entier(request, 'categorie'),
+        date_debut=_date(request, 'date_debut'),
+        date_fin=_date(request, 'date_fin'),
+    )
+    apres = request.GET.get('apres')
+    if apres:
+        try:
+            queryset = queryset.apres_curseur(*decoder_curseur(apres))
+        except ValueError as e:
+            raise ErreurParametre(str(e))
+    lignes = _lignes(queryset.order_by('-date', '-id')[:limite + 1], noms, CHAMPS_FACTURE, ('date', 'id'))
+    return _page(lignes, limite, lambda ligne: encoder_curseur(ligne['date'], ligne['id']), noms)
+
+
+@_api
+def lot_factures(request):
+    """Factures désignées par le paramètre ids (liste séparée par des virgules), en une requête."""
+    noms = champs_demandes(request, CHAMPS_FACTURE)
+    try:
+        ids = list(dict.fromkeys(int(pk) for pk in request.GET.get('ids', '').split(',') if pk.strip()))
+    except ValueError:
+        raise ErreurParametre("Paramètre ids invalide : entiers séparés par des virgules attendus.")
+    if not ids:
+        raise ErreurParametre("Paramètre ids requis.")
+    if len(ids) > TAILLE_MAX_LOT:
+        raise ErreurParametre(f"{TAILLE_MAX_LOT} identifiants au maximum par lot.")
+    trouvees = {
+        ligne['id']: ligne
+        for ligne in _lignes(Facture.objects.filter(pk__in=ids).order_by(), noms, CHAMPS_FACTURE, ('id',))
+    }
+    return reponse_json({
+        # Dans l'ordre des identifiants demandés
+        'resultats': [{nom: trouvees[pk][nom] for nom in noms} for pk in ids if pk in trouvees],
+        'introuvables': [pk for pk in ids if pk not in trouvees],
+    })
+
+
+def _liste_par_id(request, queryset, champs):
+    noms = champs_demandes(request, champs)
+    limite = _entier(request, 'limite', LIMITE_PAR_DEFAUT, LIMITE_MAX)
+    apres = request.GET.get('apres')
+    if apres:
+        queryset = queryset.filter(pk__gt=_decoder_id(apres))
+    lignes = _lignes(queryset.order_by('id')[:limite + 1], noms, champs, ('id',))
+    return _page(lignes, limite, lambda ligne: _encoder_id(ligne['id']), noms)
+
+
+@_api
+def liste_clients(request):
+    """Clients, par pages de curseur sur l'identifiant."""
+    return _liste_par_id(request, Client.objects.all(), CHAMPS_CLIENT)
+
+
+@_api
+def liste_categories(request):
+    """Catégories, par pages de curseur sur l'identifiant."""
+    return _liste_par_id(request, Categorie.objects.all(), CHAMPS_CATEGORIE)
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class FactureConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'facture'
+
+    def ready(self):
+        # Enregistrement des signaux de l'application
+        from . import signals  # noqa: F401
+        # Réglage des connexions SQLite (PRAGMA à l'ouverture)
+        from . import connexions  # noqa: F401
+        # /metrics exposé sans le jeton exigé : refus de démarrer
+        from .metriques import verifier_configuration
+        verifier_configuration()
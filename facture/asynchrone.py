@@ -0,0 +1,95 @@
+"""
+Exécution simultanée de requêtes ORM depuis du code asynchrone.
+
+L'ORM de Django est synchrone : ses méthodes asynchrones (acount(),
+aaggregate()...) passent toutes par sync_to_async(thread_sensitive=True), donc
+par un même thread, et s'exécutent les unes après les autres. en_parallele()
+lance au contraire chaque appel dans un thread du pool de la boucle
+d'évènements, avec sa propre connexion : la latence d'un groupe de requêtes
+indépendantes est celle de la plus lente, et non leur somme.
+
+    tableau_de_bord, total_clients = await en_parallele(
+        Facture.objects.tableau_de_bord,
+        Client.objects.count,
+    )
+
+Les appels restent exécutés l'un après l'autre, dans le thread de l'appelant :
+- sur une base SQLite en mémoire (tests), qui ne supporte pas les accès
+  simultanés de plusieurs connexions ;
+- si settings.REQUETES_ASYNCHRONES['PARALLELE'] vaut False.
+
+Les requêtes lancées en parallèle ne voient pas les écritures non validées
+d'une transaction ouverte par l'appelant : à réserver aux lectures.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from .routeurs import configuration_routage
+
+
+CONFIGURATION_PAR_DEFAUT = {
+    'PARALLELE': True,
+}
+
+
+def configuration_asynchrone():
+    """Retourne la configuration de l'exécution asynchrone des requêtes."""
+    return {**CONFIGURATION_PAR_DEFAUT, **getattr(settings, 'REQUETES_ASYNCHRONES', {})}
+
+
+def parallelisme_possible():
+    """Indique si les requêtes peuvent être exécutées sur des connexions simultanées."""
+    if not configuration_asynchrone()['PARALLELE']:
+        return False
+    config = configuration_routage()
+    for alias in [config['PRIMAIRE'], *config['REPLICAS']]:
+        connexion = connections[alias]
+        if connexion.vendor == 'sqlite' and connexion.is_in_memory_db():
+            return False
+    return True
+
+
+def _evaluer(appel):
+    """Retourne une fonction sans argument qui évalue un appel ou un QuerySet."""
+    if hasattr(appel, '_fetch_all'):
+        return lambda: list(appel)
+
+    def evaluer():
+        resultat = appel()
+        # Un QuerySet retourné est évalué ici, et non plus tard dans le template
+        return list(resultat) if hasattr(resultat, '_fetch_all') else resultat
+    return evaluer
+
+
+def _dans_un_thread(fonction):
+    """Exécute une fonction puis libère la connexion du thread, comme en fin de requête."""
+    def executer():
+        try:
+            return fonction()
+        finally:
+            close_old_connections()
+    return executer
+
+
+async def executer(appel):
+    """
+    Exécute un appel synchrone d'accès aux données (ou évalue un QuerySet)
+    depuis du code asynchrone, dans un thread dédié si possible.
+    """
+    if parallelisme_possible():
+        return await sync_to_async(_dans_un_thread(_evaluer(appel)), thread_sensitive=False)()
+    return await sync_to_async(_evaluer(appel))()
+
+
+async def en_parallele(*appels):
+    """
+    Exécute simultanément des appels synchrones d'accès aux données (fonctions
+    sans argument ou QuerySets, évalués en listes) et retourne leurs résultats
+    dans l'ordre des appels. La première exception levée est propagée.
+    """
+    if not parallelisme_possible():
+        return [await sync_to_async(_evaluer(appel))() for appel in appels]
+    return await asyncio.gather(*(executer(appel) for appel in appels))
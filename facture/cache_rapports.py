@@ -0,0 +1,218 @@
+"""
+Cache versionné des rapports de factures (totaux, statistiques, classements).
+
+Les résultats sont stockés dans le cache Django sous une clé construite à
+partir du nom du rapport, de ses arguments, du SQL du QuerySet (donc de ses
+filtres) et d'une version globale des données. Toute écriture sur Facture,
+Client ou Categorie (signaux, update() et delete() en masse) change cette
+version au commit : les entrées précédentes ne sont plus jamais lues et
+disparaissent à l'expiration de leur TTL.
+
+La version n'invalide les entrées que si tous les processus partagent le
+même cache. Avec plusieurs workers (PROCESSUS_MULTIPLES), un cache propre à
+chaque processus (LocMemCache) est refusé : les rapports et les fragments
+sont alors calculés sans cache. Le profil de production utilise le cache en
+base de données (python manage.py createcachetable).
+
+Le cache est opt-in, par appel :
+    Facture.objects.en_cache().tableau_de_bord()
+    Facture.objects.par_client(1).en_cache(timeout=60).statistiques_par_periode('mois')
+
+La même version sert de clé aux fragments de templates mis en cache par la
+balise {% cache_donnees %} (facture/templatetags/fragments.py) et aux valeurs
+de valeur_en_cache(). Les lectures de ces trois caches sont comptées dans
+les métriques exposées sur /metrics (voir facture/metriques.py).
+
+Configuration (settings.CACHE_RAPPORTS_FACTURES) :
+    ALIAS               : cache Django utilisé ('default')
+    TTL                 : durée de vie des entrées en secondes (300)
+    PROCESSUS_MULTIPLES : True si plusieurs processus servent l'application (False)
+"""
+import functools
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import EmptyResultSet
+from django.db import transaction
+
+from .metriques import compter_lecture_cache
+
+
+CONFIGURATION_PAR_DEFAUT = {
+    'ALIAS': 'default',
+    'TTL': 300,
+    'PROCESSUS_MULTIPLES': False,
+}
+
+CLE_VERSION = 'facture:rapports:version'
+
+_ABSENT = object()
+
+# Caches dont le contenu n'est visible que du processus qui l'écrit
+BACKENDS_PAR_PROCESSUS = (LocMemCache,)
+
+logger = logging.getLogger(__name__)
+_alias_refuses = set()
+
+
+def configuration_cache():
+    """Retourne la configuration du cache des rapports."""
+    return {**CONFIGURATION_PAR_DEFAUT, **getattr(settings, 'CACHE_RAPPORTS_FACTURES', {})}
+
+
+def _cache():
+    return caches[configuration_cache()['ALIAS']]
+
+
+class StatistiquesCache:
+    """Compteurs de succès et d'échecs du cache des rapports (par processus)."""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.reinitialiser()
+
+    def reinitialiser(self):
+        with self._verrou:
+            self.succes = 0
+            self.echecs = 0
+
+    def enregistrer(self, succes):
+        with self._verrou:
+            if succes:
+                self.succes += 1
+            else:
+                self.echecs += 1
+
+    def en_dict(self):
+        with self._verrou:
+            total = self.succes + self.echecs
+            return {
+                'succes': self.succes,
+                'echecs': self.echecs,
+                'taux_succes': self.succes / total if total else 0.0,
+            }
+
+
+statistiques_cache = StatistiquesCache()
+
+
+def version_donnees():
+    """Retourne la version courante des données de facturation."""
+    cache = _cache()
+    # Initialisée à l'horodatage courant : si la clé est évincée, la nouvelle
+    # version ne peut pas coïncider avec celle d'entrées encore présentes.
+    cache.add(CLE_VERSION, time.time_ns())
+    return cache.get(CLE_VERSION)
+
+
+def _changer_version():
+    # Nouvelle valeur plutôt que incr(), qui n'est pas atomique sur tous les
+    # caches (get puis set pour le cache en base) : deux écritures concurrentes
+    # n'avanceraient la version qu'une fois.
+    _cache().set(CLE_VERSION, time.time_ns())
+
+
+def invalider_rapports(using=None):
+    """
+    Invalide tous les rapports en cache, au commit de la transaction courante
+    (immédiatement hors transaction). D'ici là, les autres connexions lisent
+    encore les anciennes données : leurs entrées en cache restent justes.
+    La connexion qui écrit contourne le cache jusqu'à la fin de sa transaction.
+    """
+    connexion = transaction.get_connection(using)
+    if connexion.in_atomic_block:
+        connexion.rapports_modifies = True
+    transaction.on_commit(_changer_version, using=using)
+
+
+def cache_partage():
+    """
+    Indique si le cache configuré est commun à tous les processus qui servent
+    l'application : un LocMemCache ne l'est pas dès qu'il y en a plusieurs.
+    """
+    config = configuration_cache()
+    if not config['PROCESSUS_MULTIPLES'] or not isinstance(caches[config['ALIAS']], BACKENDS_PAR_PROCESSUS):
+        return True
+    if config['ALIAS'] not in _alias_refuses:
+        _alias_refuses.add(config['ALIAS'])
+        logger.warning(
+            "Cache %r propre à chaque processus : cache des rapports et des fragments désactivé",
+            config['ALIAS'],
+        )
+    return False
+
+
+def cache_utilisable(using=None):
+    """
+    Indique si le cache peut servir les rapports sur cette connexion : ce n'est
+    pas le cas si le cache n'est pas partagé entre les processus, ni dans une
+    transaction qui a modifié des données, dont les résultats ne doivent être
+    ni lus en cache ni partagés avant le commit.
+    """
+    connexion = transaction.get_connection(using)
+    if not connexion.in_atomic_block:
+        connexion.rapports_modifies = False
+    elif getattr(connexion, 'rapports_modifies', False):
+        return False
+    return cache_partage()
+
+
+def valeur_en_cache(nom, calcul, timeout=None):
+    """
+    Retourne calcul() lu dans (ou écrit en) cache, sous le nom donné, jusqu'à
+    la prochaine écriture sur les données de facturation.
+    """
+    if not cache_utilisable():
+        return calcul()
+    cache = _cache()
+    cle = f'facture:valeurs:{version_donnees()}:{nom}'
+    resultat = cache.get(cle, _ABSENT)
+    compter_lecture_cache('valeurs', resultat is not _ABSENT)
+    if resultat is _ABSENT:
+        resultat = calcul()
+        cache.set(cle, resultat, configuration_cache()['TTL'] if timeout is None else timeout)
+    return resultat
+
+
+def cle_rapport(queryset, nom, args, kwargs):
+    """Construit la clé de cache d'un rapport calculé sur un QuerySet."""
+    try:
+        sql, parametres = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        # Filtre toujours faux (par exemple pk__in=[])
+        sql, parametres = None, ()
+    empreinte = hashlib.sha1(
+        repr((queryset.db, nom, args, sorted(kwargs.items()), sql, parametres)).encode()
+    ).hexdigest()
+    return f'facture:rapports:{version_donnees()}:{empreinte}'
+
+
+def rapport_en_cache(methode):
+    """
+    Décore une méthode de rapport de FactureQuerySet : lorsque le QuerySet a
+    été marqué par en_cache(), le résultat est lu dans (ou écrit en) cache.
+    Un QuerySet retourné par la méthode est alors évalué en liste.
+    """
+    @functools.wraps(methode)
+    def enveloppe(self, *args, **kwargs):
+        timeout = getattr(self, '_timeout_cache', None)
+        if timeout is None or not cache_utilisable(self.db):
+            return methode(self, *args, **kwargs)
+
+        cache = _cache()
+        cle = cle_rapport(self, methode.__name__, args, kwargs)
+        resultat = cache.get(cle, _ABSENT)
+        statistiques_cache.enregistrer(resultat is not _ABSENT)
+        compter_lecture_cache('rapports', resultat is not _ABSENT)
+        if resultat is _ABSENT:
+            resultat = methode(self, *args, **kwargs)
+            if hasattr(resultat, '_fetch_all'):
+                resultat = list(resultat)
+            cache.set(cle, resultat, timeout)
+        return resultat
+    return enveloppe
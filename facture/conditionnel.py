@@ -0,0 +1,106 @@
+"""
+Requêtes conditionnelles (ETag / Last-Modified) des pages de factures et clients.
+
+Pour chaque page, une seule requête d'agrégats indexée calcule, sur les
+données affichées, la date de dernière modification et celle de la dernière
+suppression (une suppression ne change pas le max() des lignes restantes, voir
+DerniereSuppression). Le décorateur condition() de Django en tire les en-têtes
+ETag et Last-Modified et répond 304 Not Modified, sans exécuter la vue,
+lorsque le client possède déjà la version courante de la page.
+
+Les modifications en masse (update()) mettent aussi à jour date_modification
+(voir InvalidationRapportsQuerySet).
+"""
+import hashlib
+
+from django.db.models import IntegerField, Max, Value
+from django.views.decorators.http import condition
+
+from .models import Categorie, Client, DerniereSuppression, Facture
+
+
+def _etats(*querysets):
+    """
+    Retourne la date de dernière modification de chaque QuerySet, puis la date
+    de dernière suppression d'une ligne de leurs modèles, calculées ensemble
+    en une seule requête (UNION ALL). Chaque max(date_modification) est
+    résolu par une recherche dans un index, sans parcourir la table.
+    """
+    modeles = {queryset.model._meta.label_lower for queryset in querysets}
+    agregats = [
+        queryset.order_by().annotate(source=Value(rang, output_field=IntegerField()))
+        .values('source').annotate(derniere=Max('date_modification'))
+        for rang, queryset in enumerate(querysets)
+    ]
+    agregats.append(
+        DerniereSuppression.objects.filter(modele__in=modeles).order_by()
+        .annotate(source=Value(len(querysets), output_field=IntegerField()))
+        .values('source').annotate(derniere=Max('date'))
+    )
+    lignes = {ligne['source']: ligne['derniere'] for ligne in agregats[0].union(*agregats[1:], all=True)}
+    return tuple(lignes.get(rang) for rang in range(len(agregats)))
+
+
+def etat_liste_factures(request):
+    """Factures filtrées de la liste, et clients et catégories proposés dans les filtres."""
+    try:
+        factures = Facture.objects.filtrer(
+            client=request.GET.get('client'),
+            categorie=request.GET.get('categorie'),
+        )
+        return _etats(factures, Client.objects.all(), Categorie.objects.all())
+    except ValueError:
+        # Filtre invalide : la vue traite la requête normalement
+        return None
+
+
+def etat_facture(request, pk):
+    """La facture, son client et sa catégorie."""
+    return Facture.objects.filter(pk=pk).values_list(
+        'date_modification', 'client__date_modification', 'categorie__date_modification',
+    ).first()
+
+
+def etat_client(request, pk):
+    """Le client, ses factures et les catégories affichées avec elles."""
+    etat = _etats(Client.objects.filter(pk=pk), Facture.objects.filter(client_id=pk), Categorie.objects.all())
+    if etat[0] is None:
+        # Client introuvable : la vue répond 404
+        return None
+    return etat
+
+
+def _dates(etat):
+    """Dates contenues dans un état, quelle que soit son imbrication."""
+    for valeur in etat:
+        if isinstance(valeur, tuple):
+            yield from _dates(valeur)
+        elif hasattr(valeur, 'utctimetuple'):
+            yield valeur
+
+
+def page_conditionnelle(calculer_etat):
+    """
+    Décorateur de vue : ETag et Last-Modified tirés d'un même état des
+    données affichées, calculé une seule fois par requête par
+    calculer_etat(request, *args, **kwargs). Un état None désactive les
+    requêtes conditionnelles (page introuvable, paramètres invalides).
+    """
+    def etat(request, *args, **kwargs):
+        if not hasattr(request, '_etat_conditionnel'):
+            request._etat_conditionnel = calculer_etat(request, *args, **kwargs)
+        return request._etat_conditionnel
+
+    def etag(request, *args, **kwargs):
+        valeur = etat(request, *args, **kwargs)
+        if valeur is None:
+            return None
+        return hashlib.sha1(repr(valeur).encode()).hexdigest()
+
+    def derniere_modification(request, *args, **kwargs):
+        valeur = etat(request, *args, **kwargs)
+        if valeur is None:
+            return None
+        return max(_dates(valeur), default=None)
+
+    return condition(etag_func=etag, last_modified_func=derniere_modification)
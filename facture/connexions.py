@@ -0,0 +1,68 @@
+"""
+Réglage des connexions SQLite à leur ouverture.
+
+Le signal connection_created applique à chaque nouvelle connexion SQLite les
+PRAGMA de settings.PRAGMAS_SQLITE. Les PRAGMA ne sont pas persistés dans le
+fichier (sauf journal_mode) : ils doivent être rejoués à chaque connexion.
+
+Profil de production (voir gestion_factures/settings_production.py) :
+    journal_mode = WAL       : les lectures ne bloquent plus les écritures
+    synchronous  = NORMAL    : un fsync par checkpoint au lieu d'un par commit
+    busy_timeout = 20000     : attente (ms) d'un verrou avant « database is locked »
+    cache_size   = -65536    : cache de pages de 64 Mio par connexion
+    mmap_size    = 268435456 : lecture du fichier par mmap (256 Mio)
+    temp_store   = MEMORY    : tables temporaires (tris, GROUP BY) en mémoire
+
+Sans réglage (profil de développement), SQLite garde ses valeurs par défaut.
+"""
+import re
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+CONFIGURATION_PAR_DEFAUT = {}
+
+NOM_PRAGMA = re.compile(r'^[a-z_]+$')
+VALEUR_PRAGMA = re.compile(r'^-?\w+$')
+
+
+def pragmas_sqlite():
+    """Retourne les PRAGMA à appliquer aux nouvelles connexions SQLite."""
+    return {**CONFIGURATION_PAR_DEFAUT, **getattr(settings, 'PRAGMAS_SQLITE', {})}
+
+
+def appliquer_pragmas(connexion, pragmas):
+    """Applique des PRAGMA à une connexion SQLite ouverte."""
+    # Les PRAGMA n'acceptent pas de paramètres liés : noms et valeurs sont validés
+    for nom, valeur in pragmas.items():
+        if not NOM_PRAGMA.match(nom) or not VALEUR_PRAGMA.match(str(valeur)):
+            raise ValueError(f"PRAGMA SQLite invalide : {nom} = {valeur!r}")
+    with connexion.cursor() as cursor:
+        for nom, valeur in pragmas.items():
+            cursor.execute(f'PRAGMA {nom} = {valeur}')
+
+
+def lire_pragmas(connexion, noms):
+    """Retourne la valeur courante de PRAGMA sur une connexion SQLite."""
+    for nom in noms:
+        if not NOM_PRAGMA.match(nom):
+            raise ValueError(f"PRAGMA SQLite invalide : {nom}")
+    valeurs = {}
+    with connexion.cursor() as cursor:
+        for nom in noms:
+            cursor.execute(f'PRAGMA {nom}')
+            ligne = cursor.fetchone()
+            valeurs[nom] = ligne[0] if ligne else None
+    return valeurs
+
+
+@receiver(connection_created)
+def regler_connexion_sqlite(sender, connection, **kwargs):
+    """Applique les PRAGMA configurés à chaque nouvelle connexion SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = pragmas_sqlite()
+    if pragmas:
+        appliquer_pragmas(connection, pragmas)
@@ -0,0 +1,47 @@
+"""
+Export CSV en flux des factures.
+
+Les lignes sont lues par paquets avec values_list(...).iterator() et écrites
+au fil de l'eau : la mémoire consommée ne dépend pas du nombre de factures
+et le premier octet est émis immédiatement.
+"""
+import csv
+
+# Colonnes exportées : (en-tête CSV, champ lu en base)
+COLONNES_EXPORT = [
+    ('numero', 'numero'),
+    ('date', 'date'),
+    ('montant_ht', 'montant_ht'),
+    ('taux_tva', 'taux_tva'),
+    ('montant_tva', 'montant_tva'),
+    ('montant_ttc', 'montant_ttc'),
+    ('client', 'client__nom'),
+    ('categorie', 'categorie__nom'),
+    ('paye', 'paye'),
+]
+
+TAILLE_PAQUET_EXPORT = 2000
+
+
+class _Tampon:
+    """Pseudo-fichier dont write() retourne la ligne au lieu de la stocker."""
+
+    def write(self, valeur):
+        return valeur
+
+
+def lignes_csv(queryset, taille_paquet=TAILLE_PAQUET_EXPORT):
+    """
+    Génère l'export CSV d'un QuerySet de factures, ligne par ligne.
+    Le client et la catégorie sont joints dans la même requête.
+    """
+    ecrivain = csv.writer(_Tampon())
+    yield ecrivain.writerow([entete for entete, _ in COLONNES_EXPORT])
+
+    lignes = (
+        queryset.order_by('-date', '-id')
+        .values_list(*[champ for _, champ in COLONNES_EXPORT])
+        .iterator(chunk_size=taille_paquet)
+    )
+    for ligne in lignes:
+        yield ecrivain.writerow(ligne)
@@ -67,4 +67,8 @@ class FactureForm(forms.ModelForm):
         self.fields['taux_tva'].label = "Taux TVA (%)"
         # Ajouter des placeholders informatifs
         self.fields['montant_ht'].widget.attrs['placeholder'] = "Ex: 100.00"
+        # À la création, un numéro laissé vide est attribué par SequenceFacture
+        if self.instance.pk is None:
+            self.fields['numero'].required = False
+            self.fields['numero'].widget.attrs['placeholder'] = "Vide : numéro attribué automatiquement"
         self.fields['taux_tva'].widget.attrs['placeholder'] = "Ex: 20.00"
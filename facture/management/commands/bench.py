@@ -0,0 +1,326 @@
+"""
+Banc d'essai des méthodes de FactureQuerySet / FactureManager et des pages
+de l'application, à plusieurs volumes de données.
+
+Pour chaque taille, une base SQLite neuve est créée dans un répertoire
+temporaire et remplie par generer_donnees (même graine d'une taille à
+l'autre) : la base configurée n'est pas modifiée. Chaque méthode du
+catalogue et chaque URL de facture/urls.py est ensuite exécutée plusieurs
+fois ; la médiane et le minimum des durées et le nombre de requêtes SQL sont
+écrits dans un fichier JSON.
+
+Les caches (rapports, fragments) sont vidés avant chaque exécution, sauf
+avec --cache-chaud. Les méthodes qui écrivent sont exécutées dans une
+transaction annulée.
+
+Comparaison avec une référence : une mesure est en régression si sa médiane
+dépasse celle de la référence de plus de --seuil (et de plus de --plancher-ms,
+pour ignorer le bruit des mesures très courtes), ou si elle exécute plus de
+requêtes. La commande échoue alors.
+
+Usage :
+    python manage.py bench
+    python manage.py bench --tailles 1000,10000,100000 --repetitions 7
+    python manage.py bench --reference bench_reference.json --enregistrer-reference
+    python manage.py bench --reference bench_reference.json --seuil 0.2
+"""
+import json
+import platform
+import sqlite3
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+import django
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import Client as ClientHttp
+from django.test.utils import override_settings
+from django.urls import URLPattern, reverse
+
+from facture import urls
+from facture.management.commands.expliquer_requetes import CATEGORIE, CLIENT, FACTURE, REQUETES_AUDITEES
+from facture.models import Categorie, Facture
+
+
+TAILLES_PAR_DEFAUT = '1000,10000'
+
+# Factures par client dans les jeux de données générés
+FACTURES_PAR_CLIENT = 100
+
+
+def _annulee(appel):
+    """Exécute un appel qui écrit dans une transaction annulée."""
+    def executer(manager):
+        with transaction.atomic(using=manager.db):
+            resultat = appel(manager)
+            transaction.set_rollback(True, using=manager.db)
+        return resultat
+    return executer
+
+
+def _nouvelles_factures(nombre):
+    return [
+        Facture(numero=f'BENCH-{rang}', date=date(2024, 6, 1), montant_ht=Decimal('100.00'),
+                taux_tva=Decimal('20.00'), montant_tva=Decimal('20.00'), montant_ttc=Decimal('120.00'),
+                client_id=CLIENT, categorie_id=CATEGORIE)
+        for rang in range(nombre)
+    ]
+
+
+# (nom, appel sur le manager) : les requêtes auditées par expliquer_requetes,
+# puis les méthodes qui écrivent et les variantes asynchrones
+METHODES = [(nom, appel) for nom, appel, _ in REQUETES_AUDITEES] + [
+    ('creer_avec_categorie_autres', _annulee(lambda m: m.creer_avec_categorie_autres(
+        numero='BENCH', date=date(2024, 6, 1), montant_ht=Decimal('100.00'),
+        taux_tva=Decimal('20.00'), client_id=CLIENT,
+    ))),
+    ('bulk_create (100)', _annulee(lambda m: m.bulk_create(_nouvelles_factures(100)))),
+    ('par_client().update', _annulee(lambda m: m.par_client(CLIENT).update(paye=True))),
+    ('recalculer_montants', _annulee(lambda m: m.recalculer_montants())),
+    ('amontant_total', lambda m: async_to_sync(m.amontant_total)()),
+    ('atableau_de_bord', lambda m: async_to_sync(m.atableau_de_bord)()),
+    ('astatistiques_par_periode', lambda m: async_to_sync(m.astatistiques_par_periode)('mois')),
+    ('atop_clients', lambda m: async_to_sync(m.atop_clients)()),
+    ('atop_categories', lambda m: async_to_sync(m.atop_categories)()),
+]
+
+# Variantes mesurées par nom d'URL : (libellé, paramètres GET) ; défaut : la page sans paramètre
+PARAMETRES_URLS = {
+    'liste_factures': [('', ''), ('client', f'client={CLIENT}')],
+    'liste_factures_async': [('', ''), ('client', f'client={CLIENT}')],
+    'api_factures': [('', ''), ('client, 500 lignes', f'client={CLIENT}&fields=numero,date,montant_ttc&limite=500')],
+    'api_lot_factures': [('200 ids', 'ids=' + ','.join(str(pk) for pk in range(1, 201)))],
+}
+
+
+def urls_mesurees():
+    """
+    Retourne les (nom, chemin) des pages de facture/urls.py, objets désignés
+    par leur identifiant. Les routes à d'autres paramètres sont ignorées.
+    """
+    resultat = []
+    for motif in urls.urlpatterns:
+        if not isinstance(motif, URLPattern) or not motif.name or set(motif.pattern.converters) - {'pk'}:
+            continue
+        kwargs = {}
+        if 'pk' in motif.pattern.converters:
+            if 'client' in motif.name:
+                kwargs['pk'] = CLIENT
+            elif 'categorie' in motif.name:
+                kwargs['pk'] = CATEGORIE
+            else:
+                kwargs['pk'] = FACTURE
+        chemin = reverse(motif.name, kwargs=kwargs)
+        for libelle, parametres in PARAMETRES_URLS.get(motif.name, [('', '')]):
+            resultat.append((
+                f'{motif.name} ({libelle})' if libelle else motif.name,
+                f'{chemin}?{parametres}' if parametres else chemin,
+            ))
+    return resultat
+
+
+def comparer(resultats, reference, seuil, plancher_ms):
+    """
+    Compare des résultats à une référence ; retourne la liste des régressions
+    (clé, médiane de référence, médiane, requêtes de référence, requêtes).
+    """
+    regressions = []
+    for taille, groupes in resultats['mesures'].items():
+        for groupe, mesures in groupes.items():
+            for nom, mesure in mesures.items():
+                ancienne = reference['mesures'].get(taille, {}).get(groupe, {}).get(nom)
+                if ancienne is None:
+                    continue
+                plus_lente = (
+                    mesure['mediane_ms'] > ancienne['mediane_ms'] * (1 + seuil)
+                    and mesure['mediane_ms'] - ancienne['mediane_ms'] > plancher_ms
+                )
+                if plus_lente or mesure['requetes'] > ancienne['requetes']:
+                    regressions.append((
+                        f'{taille} {groupe} {nom}', ancienne['mediane_ms'], mesure['mediane_ms'],
+                        ancienne['requetes'], mesure['requetes'],
+                    ))
+    return regressions
+
+
+class Command(BaseCommand):
+    help = "Mesure les méthodes de factures et les pages à plusieurs volumes, et compare à une référence."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tailles', default=TAILLES_PAR_DEFAUT,
+            help=f"Nombres de factures, séparés par des virgules (défaut : {TAILLES_PAR_DEFAUT}).",
+        )
+        parser.add_argument('--repetitions', type=int, default=5, help="Exécutions par mesure (défaut : 5).")
+        parser.add_argument('--seed', type=int, default=0, help="Graine des données générées (défaut : 0).")
+        parser.add_argument('--filtre', help="Ne mesure que les méthodes et URL dont le nom contient ce texte.")
+        parser.add_argument(
+            '--cache-chaud', action='store_true',
+            help="Ne vide pas les caches entre deux exécutions.",
+        )
+        parser.add_argument('--sortie', default='bench.json', help="Fichier JSON des résultats (défaut : bench.json).")
+        parser.add_argument('--reference', help="Fichier JSON de référence à comparer aux résultats.")
+        parser.add_argument(
+            '--enregistrer-reference', action='store_true',
+            help="Enregistre les résultats comme nouvelle référence (--reference) au lieu de comparer.",
+        )
+        parser.add_argument(
+            '--seuil', type=float, default=0.25,
+            help="Ralentissement relatif toléré par rapport à la référence (défaut : 0.25).",
+        )
+        parser.add_argument(
+            '--plancher-ms', type=float, default=2.0,
+            help="Ralentissement absolu ignoré, en millisecondes (défaut : 2).",
+        )
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError("Ce banc d'essai ne concerne que SQLite.")
+        try:
+            tailles = [int(taille) for taille in options['tailles'].split(',') if taille.strip()]
+        except ValueError:
+            raise CommandError(f"--tailles invalide : {options['tailles']!r}")
+        if not tailles or min(tailles) < 1 or options['repetitions'] < 1:
+            raise CommandError("--tailles et --repetitions doivent être strictement positifs.")
+        if options['enregistrer_reference'] and not options['reference']:
+            raise CommandError("--enregistrer-reference nécessite --reference.")
+
+        resultats = {
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'environnement': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'machine': platform.machine(),
+            },
+            'repetitions': options['repetitions'],
+            'seed': options['seed'],
+            'cache_chaud': options['cache_chaud'],
+            'mesures': {},
+        }
+        for taille in tailles:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{taille} factures"))
+            with tempfile.TemporaryDirectory() as repertoire:
+                with self._base_temporaire(Path(repertoire) / 'bench.sqlite3'):
+                    call_command(
+                        'generer_donnees', factures=taille, clients=max(10, taille // FACTURES_PAR_CLIENT),
+                        seed=options['seed'], verbosity=0,
+                    )
+                    resultats['mesures'][str(taille)] = self._mesurer(options)
+
+        Path(options['sortie']).write_text(json.dumps(resultats, indent=2, ensure_ascii=False), encoding='utf-8')
+        self.stdout.write(f"Résultats écrits dans {options['sortie']}.")
+
+        if not options['reference']:
+            return
+        chemin_reference = Path(options['reference'])
+        if options['enregistrer_reference']:
+            chemin_reference.write_text(json.dumps(resultats, indent=2, ensure_ascii=False), encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f"Référence enregistrée dans {chemin_reference}."))
+            return
+        if not chemin_reference.exists():
+            raise CommandError(f"Référence introuvable : {chemin_reference}")
+        reference = json.loads(chemin_reference.read_text(encoding='utf-8'))
+        regressions = comparer(resultats, reference, options['seuil'], options['plancher_ms'])
+        for cle, ancienne, mediane, anciennes_requetes, requetes in regressions:
+            self.stdout.write(self.style.WARNING(
+                f"  {cle} : {ancienne:.2f} -> {mediane:.2f} ms, {anciennes_requetes} -> {requetes} requête(s)"
+            ))
+        if regressions:
+            raise CommandError(f"{len(regressions)} régression(s) par rapport à {chemin_reference}.")
+        self.stdout.write(self.style.SUCCESS(f"Aucune régression par rapport à {chemin_reference}."))
+
+    @contextmanager
+    def _base_temporaire(self, chemin):
+        """
+        Remplace la base par défaut par une base neuve, sans réplicas ; la
+        configuration est restaurée ensuite.
+        """
+        parametres = connections.settings[DEFAULT_DB_ALIAS]
+        origine = dict(parametres)
+        connections[DEFAULT_DB_ALIAS].close()
+        parametres['NAME'] = str(chemin)
+        Categorie.objects.invalider_cache_autres()
+        routage = {**getattr(settings, 'ROUTAGE_BASES', {}), 'REPLICAS': []}
+        try:
+            with override_settings(ROUTAGE_BASES=routage, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                call_command('migrate', database=DEFAULT_DB_ALIAS, verbosity=0)
+                yield
+        finally:
+            connections[DEFAULT_DB_ALIAS].close()
+            parametres.clear()
+            parametres.update(origine)
+            Categorie.objects.invalider_cache_autres()
+
+    def _mesurer(self, options):
+        manager = Facture.objects.db_manager(DEFAULT_DB_ALIAS)
+        http = ClientHttp(raise_request_exception=False)
+        mesures = {'methodes': {}, 'urls': {}}
+
+        def evaluer(appel):
+            resultat = appel(manager)
+            if hasattr(resultat, '_fetch_all'):
+                list(resultat)
+
+        def page(chemin):
+            def appel(_):
+                reponse = http.get(chemin)
+                if reponse.status_code >= 400:
+                    raise CommandError(f"{chemin} : statut {reponse.status_code}")
+                if getattr(reponse, 'streaming', False):
+                    b''.join(reponse.streaming_content)
+            return appel
+
+        catalogue = [('methodes', nom, appel) for nom, appel in METHODES]
+        catalogue += [('urls', nom, page(chemin)) for nom, chemin in urls_mesurees()]
+        for groupe, nom, appel in catalogue:
+            if options['filtre'] and options['filtre'] not in nom:
+                continue
+            mesure = self._chronometrer(lambda: evaluer(appel), options)
+            mesures[groupe][nom] = mesure
+            self.stdout.write(
+                f"  {groupe[:-1]:<8} {nom:<45} {mesure['mediane_ms']:9.2f} ms "
+                f"(min {mesure['min_ms']:.2f}), {mesure['requetes']} requête(s)"
+            )
+        return mesures
+
+    def _chronometrer(self, executer, options):
+        """
+        Exécute une mesure : un premier passage compte les requêtes, les
+        suivants sont chronométrés.
+        """
+        caches_utilises = [caches[alias] for alias in settings.CACHES]
+        requetes = []
+
+        def compter(execute, sql, params, many, context):
+            requetes.append(sql)
+            return execute(sql, params, many, context)
+
+        # Requêtes asynchrones dans le thread courant, pour être toutes comptées
+        with override_settings(REQUETES_ASYNCHRONES={'PARALLELE': False}):
+            with connections[DEFAULT_DB_ALIAS].execute_wrapper(compter):
+                for cache in caches_utilises:
+                    cache.clear()
+                executer()
+        durees = []
+        for _ in range(options['repetitions']):
+            if not options['cache_chaud']:
+                for cache in caches_utilises:
+                    cache.clear()
+            debut = time.perf_counter()
+            executer()
+            durees.append((time.perf_counter() - debut) * 1000)
+        return {
+            'mediane_ms': round(statistics.median(durees), 3),
+            'min_ms': round(min(durees), 3),
+            'requetes': len(requetes),
+        }
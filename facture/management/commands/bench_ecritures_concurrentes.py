@@ -0,0 +1,230 @@
+"""
+Banc d'essai des écritures concurrentes sur SQLite.
+
+Plusieurs processus créent et modifient des factures en parallèle (une
+transaction par écriture, signaux compris), pendant que d'autres lisent le tableau de bord.
+Chaque profil de connexion est mesuré sur une base SQLite neuve, dans un
+répertoire temporaire : la base configurée n'est pas modifiée.
+
+Profils comparés :
+    developpement : réglages par défaut de Django et de SQLite
+    production    : CONNEXION_SQLITE et PRAGMAS_SQLITE de
+                    gestion_factures/settings_production.py
+
+Chaque processus ferme ses connexions périmées entre deux écritures, comme à la
+fin d'une requête HTTP : CONN_MAX_AGE décide de leur réutilisation.
+
+Usage :
+    python manage.py bench_ecritures_concurrentes
+    python manage.py bench_ecritures_concurrentes --ecrivains 16 --factures 200 --lecteurs 4
+"""
+import importlib
+import multiprocessing
+import statistics
+import tempfile
+import time
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, close_old_connections, connections, transaction
+from django.test.utils import override_settings
+
+from facture.connexions import lire_pragmas
+from facture.models import Categorie, Client, Facture
+
+
+PROFILS = ('developpement', 'production')
+
+PRAGMAS_AFFICHES = ('journal_mode', 'synchronous', 'busy_timeout')
+
+
+def charger_profil(nom):
+    """Retourne (réglages de connexion, PRAGMA) d'un profil."""
+    if nom == 'developpement':
+        return {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}}, {}
+    module = importlib.import_module('gestion_factures.settings_production')
+    return module.CONNEXION_SQLITE, module.PRAGMAS_SQLITE
+
+
+def erreur_verrou(exc):
+    """Indique si une OperationalError est un conflit de verrou SQLite."""
+    message = str(exc).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def ecrivain(numero, nombre, client_id, categorie_id, resultats):
+    """
+    Processus d'écriture : crée puis modifie des factures, en alternance.
+    Renvoie (durées, erreurs de verrou).
+    """
+    durees, erreurs, derniere = [], 0, None
+    try:
+        for rang in range(nombre):
+            close_old_connections()
+            debut = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    if rang % 2 == 0 or derniere is None:
+                        facture = Facture.objects.create(
+                            numero=f'BENCH-{numero}-{rang}', date=date(2024, 1 + rang % 12, 1),
+                            montant_ht=Decimal('100.00'), taux_tva=Decimal('20.00'),
+                            client_id=client_id, categorie_id=categorie_id,
+                        )
+                    else:
+                        # Lecture puis écriture, comme ModifierFactureView
+                        facture = Facture.objects.get(pk=derniere)
+                        facture.paye = not facture.paye
+                        facture.save()
+            except OperationalError as exc:
+                if not erreur_verrou(exc):
+                    raise
+                erreurs += 1
+            else:
+                durees.append(time.perf_counter() - debut)
+                derniere = facture.pk
+    finally:
+        connections.close_all()
+        resultats.put(('ecriture', durees, erreurs))
+
+
+def lecteur(fin_ecritures, resultats):
+    """Processus de lecture : calcule le tableau de bord jusqu'à la fin des écritures."""
+    lectures, erreurs = 0, 0
+    try:
+        while not fin_ecritures.is_set():
+            close_old_connections()
+            try:
+                Facture.objects.tableau_de_bord()
+            except OperationalError as exc:
+                if not erreur_verrou(exc):
+                    raise
+                erreurs += 1
+            else:
+                lectures += 1
+    finally:
+        connections.close_all()
+        resultats.put(('lecture', lectures, erreurs))
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit et le taux d'erreurs de verrou des écritures concurrentes sur SQLite."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ecrivains', type=int, default=8, help="Processus d'écriture (défaut : 8).")
+        parser.add_argument('--factures', type=int, default=100, help="Écritures par processus (défaut : 100).")
+        parser.add_argument('--lecteurs', type=int, default=2, help="Processus de lecture (défaut : 2).")
+        parser.add_argument(
+            '--profil', choices=PROFILS, action='append',
+            help="Profil à mesurer (répétable ; défaut : tous).",
+        )
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError("Ce banc d'essai ne concerne que SQLite.")
+        if options['ecrivains'] < 1 or options['factures'] < 1:
+            raise CommandError("--ecrivains et --factures doivent être positifs.")
+
+        resultats = []
+        for nom in options['profil'] or PROFILS:
+            reglages, pragmas = charger_profil(nom)
+            with tempfile.TemporaryDirectory() as repertoire:
+                resultat = self._mesurer(Path(repertoire) / 'bench.sqlite3', reglages, pragmas, options)
+            resultat['profil'] = nom
+            resultats.append(resultat)
+            self._afficher(resultat)
+
+        if len(resultats) > 1:
+            reference = resultats[0]
+            for resultat in resultats[1:]:
+                if reference['debit']:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"{resultat['profil']} / {reference['profil']} : "
+                        f"débit x{resultat['debit'] / reference['debit']:.2f}, "
+                        f"erreurs de verrou {reference['taux_erreurs']:.1%} -> {resultat['taux_erreurs']:.1%}"
+                    ))
+
+    def _mesurer(self, chemin, reglages, pragmas, options):
+        """Mesure un profil sur une base neuve ; la configuration est restaurée ensuite."""
+        parametres = connections.settings[DEFAULT_DB_ALIAS]
+        origine = dict(parametres)
+        connections[DEFAULT_DB_ALIAS].close()
+        parametres.update(reglages, NAME=str(chemin))
+        try:
+            with override_settings(PRAGMAS_SQLITE=pragmas):
+                call_command('migrate', database=DEFAULT_DB_ALIAS, verbosity=0)
+                client = Client.objects.create(nom="Client banc d'essai", email='bench@example.com')
+                categorie = Categorie.objects.create(nom="Banc d'essai", couleur='#000000')
+                configuration = lire_pragmas(connections[DEFAULT_DB_ALIAS], PRAGMAS_AFFICHES)
+                connections[DEFAULT_DB_ALIAS].close()
+                return self._executer(client, categorie, configuration, options)
+        finally:
+            connections[DEFAULT_DB_ALIAS].close()
+            parametres.clear()
+            parametres.update(origine)
+
+    def _executer(self, client, categorie, configuration, options):
+        # Des processus plutôt que des threads : comme des workers WSGI, ils ne
+        # partagent pas le GIL, qui fausserait la durée de détention des verrous.
+        contexte = multiprocessing.get_context('fork')
+        resultats = contexte.Queue()
+        fin_ecritures = contexte.Event()
+        lecteurs = [
+            contexte.Process(target=lecteur, args=(fin_ecritures, resultats))
+            for _ in range(options['lecteurs'])
+        ]
+        ecrivains = [
+            contexte.Process(
+                target=ecrivain, args=(numero, options['factures'], client.pk, categorie.pk, resultats),
+            )
+            for numero in range(options['ecrivains'])
+        ]
+        debut = time.perf_counter()
+        for processus in lecteurs + ecrivains:
+            processus.start()
+        for processus in ecrivains:
+            processus.join()
+        duree = time.perf_counter() - debut
+        fin_ecritures.set()
+        for processus in lecteurs:
+            processus.join()
+
+        durees, erreurs, lectures, erreurs_lecture = [], 0, 0, 0
+        for _ in lecteurs + ecrivains:
+            nature, valeur, nombre_erreurs = resultats.get(timeout=60)
+            if nature == 'ecriture':
+                durees.extend(valeur)
+                erreurs += nombre_erreurs
+            else:
+                lectures += valeur
+                erreurs_lecture += nombre_erreurs
+
+        tentatives = len(durees) + erreurs
+        durees.sort()
+        return {
+            'configuration': configuration,
+            'duree': duree,
+            'ecritures': len(durees),
+            'erreurs': erreurs,
+            'taux_erreurs': erreurs / tentatives if tentatives else 0.0,
+            'debit': len(durees) / duree if duree else 0.0,
+            'latence_mediane': statistics.median(durees) if durees else 0.0,
+            'latence_p95': durees[int(len(durees) * 0.95)] if durees else 0.0,
+            'lectures': lectures,
+            'erreurs_lecture': erreurs_lecture,
+        }
+
+    def _afficher(self, resultat):
+        configuration = ', '.join(f"{nom}={valeur}" for nom, valeur in resultat['configuration'].items())
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{resultat['profil']} ({configuration})"))
+        self.stdout.write(
+            f"  écritures : {resultat['ecritures']} en {resultat['duree']:.2f} s "
+            f"({resultat['debit']:.0f}/s), médiane {resultat['latence_mediane'] * 1000:.1f} ms, "
+            f"p95 {resultat['latence_p95'] * 1000:.1f} ms"
+        )
+        self.stdout.write(
+            f"  erreurs de verrou : {resultat['erreurs']} ({resultat['taux_erreurs']:.1%}) ; "
+            f"lectures : {resultat['lectures']} ({resultat['erreurs_lecture']} en erreur)"
+        )
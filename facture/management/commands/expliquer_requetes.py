@@ -0,0 +1,141 @@
+"""
+Audit des plans d'exécution des requêtes de FactureQuerySet / FactureManager.
+
+Chaque méthode du catalogue est exécutée, ses requêtes SELECT sont capturées
+puis passées à EXPLAIN QUERY PLAN. Les parcours complets d'une table sont
+signalés, sauf pour les méthodes qui lisent volontairement toute la table :
+« SCAN table » sans index, ou le parcours entier d'un index non partiel
+par une requête sans LIMIT.
+
+Usage :
+    python manage.py expliquer_requetes            # affiche les plans
+    python manage.py expliquer_requetes --strict   # échoue sur un parcours complet inattendu
+"""
+import re
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+from facture.models import Facture
+
+
+# Identifiants fictifs : le plan ne dépend pas de l'existence des lignes
+CLIENT, CATEGORIE, FACTURE = 1, 1, 1
+DEBUT, FIN = date(2024, 1, 1), date(2024, 12, 31)
+
+# (nom, appel sur le manager, parcours complet attendu)
+REQUETES_AUDITEES = [
+    ('payees', lambda m: m.payees(), True),
+    ('non_payees', lambda m: m.non_payees()[:30], False),
+    ('par_client', lambda m: m.par_client(CLIENT), False),
+    ('par_client().non_payees', lambda m: m.par_client(CLIENT).non_payees(), False),
+    ('par_categorie', lambda m: m.par_categorie(CATEGORIE), False),
+    ('par_numero', lambda m: m.par_numero('FAC-2024-000001'), False),
+    ('par_periode', lambda m: m.get_queryset().par_periode(DEBUT, FIN), False),
+    ('filtrer', lambda m: m.filtrer(client=CLIENT, date_debut=DEBUT), False),
+    ('apres_curseur', lambda m: m.get_queryset().apres_curseur(FIN, FACTURE)[:30], False),
+    ('avant_curseur', lambda m: m.get_queryset().avant_curseur(DEBUT, FACTURE)[:30], False),
+    ('montant_total', lambda m: m.montant_total(), True),
+    ('montant_ht_total', lambda m: m.montant_ht_total(), True),
+    ('montant_tva_total', lambda m: m.montant_tva_total(), True),
+    ('par_client().montant_total', lambda m: m.par_client(CLIENT).montant_total(), False),
+    ('tableau_de_bord', lambda m: m.tableau_de_bord(), True),
+    ('statistiques_par_categorie', lambda m: m.get_queryset().statistiques_par_categorie(), True),
+    ('statistiques_par_client', lambda m: m.get_queryset().statistiques_par_client(), True),
+    ('statistiques_par_periode', lambda m: m.statistiques_par_periode('mois', par=('client', 'categorie')), True),
+    ('statistiques_par_periode (bornée)', lambda m: m.statistiques_par_periode('jour', date_debut=DEBUT, date_fin=FIN), False),
+    ('montants_incoherents', lambda m: m.montants_incoherents().count(), True),
+    ('recherche_avancee', lambda m: m.recherche_avancee('FAC-2024'), False),
+    # Terme trop court pour l'index plein texte : repli sur icontains
+    ('recherche_avancee (terme court)', lambda m: m.recherche_avancee('FA'), True),
+    ('factures_du_mois', lambda m: m.factures_du_mois(), False),
+    ('factures_de_l_annee', lambda m: m.factures_de_l_annee(2024), False),
+    ('top_clients', lambda m: m.top_clients(), False),
+    ('top_categories', lambda m: m.top_categories(), False),
+]
+
+# « SCAN table » ou « SCAN table USING INDEX index » (SEARCH désigne un accès ciblé)
+PARCOURS = re.compile(r'\bSCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?$')
+LIMITE = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+
+
+class Command(BaseCommand):
+    help = "Affiche les plans d'exécution des requêtes de factures et signale les parcours complets."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help="Échoue si une requête parcourt entièrement une table sans que ce soit attendu.",
+        )
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help="Base de données à analyser (défaut : default).",
+        )
+
+    def handle(self, *args, **options):
+        connexion = connections[options['database']]
+        if connexion.vendor != 'sqlite':
+            raise CommandError("EXPLAIN QUERY PLAN n'est disponible que sur SQLite.")
+
+        manager = Facture.objects.db_manager(options['database'])
+        index_partiels = self._index_partiels(connexion)
+        inattendus = []
+        for nom, appel, scan_attendu in REQUETES_AUDITEES:
+            self.stdout.write(self.style.MIGRATE_HEADING(nom))
+            for sql in self._requetes(connexion, manager, appel):
+                borne = LIMITE.search(sql) is not None
+                for ligne in self._plan(connexion, sql):
+                    parcours = PARCOURS.search(ligne)
+                    if parcours and parcours.group(2) and (borne or parcours.group(2) in index_partiels):
+                        # Parcours d'index interrompu par LIMIT, ou limité aux lignes du partiel
+                        parcours = None
+                    if parcours is None:
+                        self.stdout.write(f"  {ligne}")
+                    elif scan_attendu:
+                        self.stdout.write(f"  {ligne}  (parcours complet attendu)")
+                    else:
+                        inattendus.append((nom, parcours.group(1)))
+                        self.stdout.write(self.style.WARNING(f"  {ligne}  <-- PARCOURS COMPLET"))
+
+        if inattendus:
+            detail = ', '.join(f"{nom} ({table})" for nom, table in inattendus)
+            message = f"{len(inattendus)} parcours complet(s) inattendu(s) : {detail}"
+            if options['strict']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(REQUETES_AUDITEES)} méthode(s) analysée(s), aucun parcours complet inattendu."
+            ))
+
+    def _index_partiels(self, connexion):
+        """Noms des index partiels (CREATE INDEX ... WHERE) de la base."""
+        with connexion.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'")
+            return {nom for nom, in cursor.fetchall()}
+
+    def _requetes(self, connexion, manager, appel):
+        """Exécute un appel et retourne le SQL des SELECT émis."""
+        with CaptureQueriesContext(connexion) as capture:
+            resultat = appel(manager)
+            if hasattr(resultat, '_fetch_all'):
+                list(resultat)
+        return [
+            requete['sql'] for requete in capture.captured_queries
+            if requete['sql'].lstrip().upper().startswith('SELECT')
+        ]
+
+    def _plan(self, connexion, sql):
+        """Retourne les lignes d'EXPLAIN QUERY PLAN, indentées selon leur profondeur."""
+        with connexion.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            lignes = cursor.fetchall()
+        profondeurs = {0: -1}
+        resultat = []
+        for identifiant, parent, _, detail in lignes:
+            profondeurs[identifiant] = profondeurs.get(parent, -1) + 1
+            resultat.append('  ' * profondeurs[identifiant] + detail)
+        return resultat
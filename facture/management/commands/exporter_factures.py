@@ -0,0 +1,54 @@
+"""
+Export CSV en flux des factures, avec les mêmes filtres que la liste des factures.
+
+Usage :
+    python manage.py exporter_factures --sortie factures.csv
+    python manage.py exporter_factures --client 3 --debut 2024-01-01 --fin 2024-12-31
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from facture.export import TAILLE_PAQUET_EXPORT, lignes_csv
+from facture.models import Facture
+
+
+class Command(BaseCommand):
+    help = "Exporte les factures filtrées au format CSV, en flux et à mémoire constante."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--client', type=int, help="Identifiant du client.")
+        parser.add_argument('--categorie', type=int, help="Identifiant de la catégorie.")
+        parser.add_argument('--debut', help="Date de début incluse (AAAA-MM-JJ).")
+        parser.add_argument('--fin', help="Date de fin incluse (AAAA-MM-JJ).")
+        parser.add_argument('--sortie', help="Fichier de sortie (sortie standard par défaut).")
+        parser.add_argument(
+            '--taille-paquet', type=int, default=TAILLE_PAQUET_EXPORT,
+            help=f"Nombre de lignes lues par aller-retour en base (défaut : {TAILLE_PAQUET_EXPORT}).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            date_debut = date.fromisoformat(options['debut']) if options['debut'] else None
+            date_fin = date.fromisoformat(options['fin']) if options['fin'] else None
+        except ValueError:
+            raise CommandError("Date invalide (format attendu : AAAA-MM-JJ).")
+
+        factures = Facture.objects.filtrer(
+            client=options['client'],
+            categorie=options['categorie'],
+            date_debut=date_debut,
+            date_fin=date_fin,
+        )
+        lignes = lignes_csv(factures, taille_paquet=options['taille_paquet'])
+
+        if options['sortie']:
+            nb_lignes = 0
+            with open(options['sortie'], 'w', newline='', encoding='utf-8') as fichier:
+                for ligne in lignes:
+                    fichier.write(ligne)
+                    nb_lignes += 1
+            self.stderr.write(f"{nb_lignes - 1} facture(s) exportée(s) vers {options['sortie']}.")
+        else:
+            for ligne in lignes:
+                self.stdout.write(ligne, ending='')
@@ -0,0 +1,200 @@
+"""
+Génération d'un jeu de données synthétique pour les mesures de performance.
+
+Les données sont réalistes et volontairement déséquilibrées :
+    - clients : quelques gros clients concentrent l'essentiel des factures
+      (loi de Zipf), les autres en ont peu ou pas ;
+    - catégories : nombreuses, d'usage inégal ;
+    - dates : réparties sur plusieurs années, plus nombreuses vers la fin
+      (activité en croissance) ;
+    - montants : loi log-normale, taux de TVA français, factures anciennes
+      presque toutes payées.
+
+Les factures sont insérées par lots avec bulk_create, sans la maintenance
+par lot de FactureQuerySet.bulk_create() : l'index de recherche est alimenté
+lot par lot, mais les compteurs des clients et catégories et les agrégats
+mensuels ne sont recalculés qu'une fois, à la fin. Les numéros
+(GEN-AAAA-NNNNNN) sont réservés par plages dans SequenceFacture. Une même
+graine produit les mêmes données.
+
+Usage :
+    python manage.py generer_donnees
+    python manage.py generer_donnees --clients 2000 --factures 500000 --seed 7
+"""
+import math
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+
+from facture.cache_rapports import invalider_rapports
+from facture.models import (
+    Categorie, Client, Facture, FactureRollupMensuel, SequenceFacture, calculer_montants, debut_mois,
+)
+from facture.recherche import indexer_factures
+
+
+NOMS_CATEGORIES = [
+    'Conseil', 'Développement', 'Maintenance', 'Formation', 'Hébergement',
+    'Licences', 'Support', 'Audit', 'Design', 'Infogérance', 'Matériel',
+    'Déplacements', 'Sous-traitance', 'Marketing', 'Traduction', 'Rédaction',
+    'Recrutement', 'Juridique', 'Comptabilité', 'Télécoms', 'Sécurité',
+    'Données', 'Cloud', 'Réseau', 'Location',
+]
+
+FORMES = ['SARL', 'SAS', 'SA', 'EURL', 'SCOP']
+RACINES = [
+    'Atlas', 'Boréal', 'Cobalt', 'Delta', 'Émeraude', 'Faucon', 'Granit',
+    'Horizon', 'Iris', 'Jade', 'Krypton', 'Lumen', 'Mistral', 'Nova', 'Orion',
+    'Phénix', 'Quartz', 'Rivage', 'Saphir', 'Titane', 'Ulysse', 'Vega',
+]
+VILLES = ['Paris', 'Lyon', 'Marseille', 'Toulouse', 'Nantes', 'Lille', 'Bordeaux', 'Rennes']
+
+# Taux de TVA et fréquences relatives
+TAUX_TVA = [Decimal('20.00'), Decimal('10.00'), Decimal('5.50'), Decimal('2.10')]
+POIDS_TVA = [80, 12, 6, 2]
+
+# Exposants de Zipf : concentration des factures sur les premiers clients / catégories
+ZIPF_CLIENTS = 1.1
+ZIPF_CATEGORIES = 0.8
+
+MONTANT_MAX = Decimal('99999999.99')
+
+# Préfixe des numéros générés : GEN-AAAA-NNNNNN, à la suite des séquences existantes
+PREFIXE = 'GEN'
+
+
+def poids_cumules(nombre, exposant):
+    """Poids cumulés d'une loi de Zipf sur nombre rangs."""
+    total, cumules = 0.0, []
+    for rang in range(1, nombre + 1):
+        total += 1 / rang ** exposant
+        cumules.append(total)
+    return cumules
+
+
+class Command(BaseCommand):
+    help = "Génère des clients, catégories et factures synthétiques (données déséquilibrées, bulk_create)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=200, help="Nombre de clients (défaut : 200).")
+        parser.add_argument('--factures', type=int, default=10000, help="Nombre de factures (défaut : 10000).")
+        parser.add_argument('--categories', type=int, default=25, help="Nombre de catégories (défaut : 25).")
+        parser.add_argument('--annees', type=int, default=3, help="Années couvertes jusqu'à aujourd'hui (défaut : 3).")
+        parser.add_argument('--seed', type=int, default=0, help="Graine du générateur aléatoire (défaut : 0).")
+        parser.add_argument(
+            '--taille-lot', type=int, default=5000,
+            help="Nombre de factures insérées par transaction (défaut : 5000).",
+        )
+
+    def handle(self, *args, **options):
+        for option in ('clients', 'categories', 'annees', 'taille_lot'):
+            if options[option] < 1:
+                raise CommandError(f"--{option.replace('_', '-')} doit être strictement positif.")
+        if options['factures'] < 0:
+            raise CommandError("--factures ne peut pas être négatif.")
+
+        self.aleatoire = random.Random(options['seed'])
+        debut = time.perf_counter()
+        with transaction.atomic():
+            categories = self._creer_categories(options['categories'])
+            clients = self._creer_clients(options['clients'])
+        self.stdout.write(f"{len(clients)} client(s) et {len(categories)} catégorie(s) créés.")
+
+        factures, mois = self._creer_factures(clients, categories, options)
+        with transaction.atomic():
+            Client.objects.recalculer_compteurs(clients)
+            Categorie.objects.recalculer_compteurs(categories)
+            FactureRollupMensuel.objects.reconstruire(mois)
+            invalider_rapports()
+        self.stdout.write(self.style.SUCCESS(
+            f"{factures} facture(s) générée(s) en {time.perf_counter() - debut:.1f} s "
+            f"(graine {options['seed']})."
+        ))
+
+    def _creer_categories(self, nombre):
+        categories = [
+            Categorie(
+                nom=NOMS_CATEGORIES[rang % len(NOMS_CATEGORIES)]
+                + (f' {rang // len(NOMS_CATEGORIES) + 1}' if rang >= len(NOMS_CATEGORIES) else ''),
+                couleur=f'#{self.aleatoire.randrange(0x1000000):06X}',
+            )
+            for rang in range(nombre)
+        ]
+        return [categorie.pk for categorie in Categorie.objects.bulk_create(categories)]
+
+    def _creer_clients(self, nombre):
+        clients = []
+        for rang in range(nombre):
+            racine = self.aleatoire.choice(RACINES)
+            nom = f"{racine} {self.aleatoire.choice(FORMES)} {rang + 1:05d}"
+            clients.append(Client(
+                nom=nom,
+                email=None if self.aleatoire.random() < 0.1 else f"contact{rang + 1}@{racine.lower()}.example.com",
+                telephone=f"0{self.aleatoire.randrange(1, 10)}{self.aleatoire.randrange(10 ** 8):08d}",
+                adresse=f"{self.aleatoire.randrange(1, 200)} rue {racine}, {self.aleatoire.choice(VILLES)}",
+            ))
+        return [client.pk for client in Client.objects.bulk_create(clients)]
+
+    def _creer_factures(self, clients, categories, options):
+        """
+        Crée les factures par lots, dans l'ordre chronologique. Retourne leur
+        nombre et les premiers jours des mois concernés.
+        """
+        nombre = options['factures']
+        aleatoire = self.aleatoire
+        fin = date.today()
+        jours = 365 * options['annees']
+        premier = fin - timedelta(days=jours)
+
+        # Tirages groupés : une liste par attribut, rangée dans l'ordre des dates
+        dates = sorted(
+            premier + timedelta(days=int(jours * aleatoire.random() ** 0.7))
+            for _ in range(nombre)
+        )
+        ids_clients = aleatoire.choices(clients, cum_weights=poids_cumules(len(clients), ZIPF_CLIENTS), k=nombre)
+        ids_categories = aleatoire.choices(
+            categories, cum_weights=poids_cumules(len(categories), ZIPF_CATEGORIES), k=nombre,
+        )
+        taux = aleatoire.choices(TAUX_TVA, weights=POIDS_TVA, k=nombre)
+
+        creees = 0
+        for debut_lot in range(0, nombre, options['taille_lot']):
+            lot = []
+            for rang in range(debut_lot, min(debut_lot + options['taille_lot'], nombre)):
+                jour = dates[rang]
+                montant_ht = min(
+                    Decimal(math.exp(aleatoire.gauss(6, 1.2))).quantize(Decimal('0.01')),
+                    MONTANT_MAX,
+                )
+                # Même calcul que Facture.save(), appliqué hors save() pour bulk_create
+                montant_tva, montant_ttc = calculer_montants(montant_ht, taux[rang])
+                anciennete = (fin - jour).days
+                lot.append(Facture(
+                    date=jour,
+                    montant_ht=montant_ht,
+                    taux_tva=taux[rang],
+                    montant_tva=montant_tva,
+                    montant_ttc=montant_ttc,
+                    client_id=ids_clients[rang],
+                    categorie_id=ids_categories[rang],
+                    paye=aleatoire.random() < (0.97 if anciennete > 90 else 0.5),
+                ))
+            with transaction.atomic():
+                # Numéros réservés par plages, une requête par année du lot
+                par_annee = {}
+                for facture in lot:
+                    par_annee.setdefault(facture.date.year, []).append(facture)
+                for annee, factures in par_annee.items():
+                    for facture, numero in zip(factures, SequenceFacture.objects.numeros(PREFIXE, annee, len(factures))):
+                        facture.numero = numero
+                # bulk_create() de base : compteurs et agrégats sont recalculés par handle()
+                models.QuerySet.bulk_create(Facture.objects.all(), lot)
+                indexer_factures([facture.pk for facture in lot])
+            creees += len(lot)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {creees}/{nombre} factures")
+        return creees, {debut_mois(jour) for jour in dates}
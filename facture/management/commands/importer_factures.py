@@ -0,0 +1,270 @@
+"""
+Import en masse de factures depuis un fichier CSV ou JSONL.
+
+Le fichier est lu en flux (mémoire constante) et les factures sont insérées
+par lots avec bulk_create, chaque lot dans sa propre transaction.
+
+Colonnes / clés attendues :
+    numero (optionnel : attribué par SequenceFacture si vide), date (AAAA-MM-JJ),
+    montant_ht, taux_tva (optionnel, 20 par défaut),
+    client (nom du client), categorie (nom, optionnel : 'Autres' si vide),
+    paye (optionnel : 1/0, oui/non, true/false)
+
+Les numéros manquants d'un lot sont réservés en une requête par année de
+facturation, dans la transaction du lot. Une ligne dont le numéro est déjà
+utilisé (en base ou plus haut dans le même lot) est rejetée.
+
+Usage :
+    python manage.py importer_factures factures.csv
+    python manage.py importer_factures factures.jsonl --taille-lot 5000
+    python manage.py importer_factures factures.csv --dry-run --rapport erreurs.csv
+"""
+import csv
+import json
+from datetime import date
+from decimal import InvalidOperation
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from facture.metriques import factures_creees
+from facture.models import (
+    PREFIXE_NUMERO_PAR_DEFAUT, Categorie, Client, Facture, LogCreationFacture, SequenceFacture, calculer_montants,
+)
+
+
+VALEURS_VRAIES = {'1', 'true', 'vrai', 'oui', 'yes', 'o', 'y'}
+VALEURS_FAUSSES = {'', '0', 'false', 'faux', 'non', 'no', 'n'}
+
+
+class LigneInvalide(Exception):
+    """Erreur de validation d'une ligne du fichier importé."""
+
+
+class Command(BaseCommand):
+    help = "Importe des factures depuis un fichier CSV ou JSONL par lots (bulk_create)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="Chemin du fichier CSV ou JSONL à importer.")
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'],
+            help="Format du fichier (déduit de l'extension par défaut).",
+        )
+        parser.add_argument(
+            '--taille-lot', type=int, default=1000,
+            help="Nombre de factures insérées par transaction (défaut : 1000).",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Valide le fichier sans rien écrire en base.",
+        )
+        parser.add_argument(
+            '--rapport',
+            help="Fichier CSV où écrire les lignes rejetées (ligne, erreur).",
+        )
+        parser.add_argument(
+            '--delimiteur', default=',',
+            help="Délimiteur des fichiers CSV (défaut : ',').",
+        )
+
+    def handle(self, *args, **options):
+        chemin = Path(options['fichier'])
+        if not chemin.exists():
+            raise CommandError(f"Fichier introuvable : {chemin}")
+        if options['taille_lot'] < 1:
+            raise CommandError("--taille-lot doit être strictement positif.")
+
+        format_fichier = options['format'] or ('jsonl' if chemin.suffix in ('.jsonl', '.ndjson') else 'csv')
+        self.dry_run = options['dry_run']
+        self.source = chemin.name
+
+        # Tables de correspondance en mémoire : une requête par table, aucune par ligne
+        self.clients = dict(Client.objects.values_list('nom', 'id'))
+        self.categories = dict(Categorie.objects.values_list('nom', 'id'))
+        self.id_autres = None
+        self.doublons = 0
+
+        rapport = open(options['rapport'], 'w', newline='', encoding='utf-8') if options['rapport'] else None
+        ecrivain = csv.writer(rapport) if rapport else None
+        if ecrivain:
+            ecrivain.writerow(['ligne', 'erreur'])
+
+        importees = rejetees = 0
+        lot = []
+        try:
+            with chemin.open(newline='', encoding='utf-8') as flux:
+                for numero_ligne, donnees in self._lire(flux, format_fichier, options['delimiteur']):
+                    try:
+                        lot.append((numero_ligne, self._construire_facture(donnees)))
+                    except LigneInvalide as e:
+                        rejetees += 1
+                        self.stderr.write(f"Ligne {numero_ligne} : {e}")
+                        if ecrivain:
+                            ecrivain.writerow([numero_ligne, str(e)])
+                        continue
+
+                    if len(lot) >= options['taille_lot']:
+                        importees += self._inserer(self._rejeter_doublons(lot, ecrivain))
+                        lot = []
+                if lot:
+                    importees += self._inserer(self._rejeter_doublons(lot, ecrivain))
+        finally:
+            if rapport:
+                rapport.close()
+
+        rejetees += self.doublons
+        verbe = "validée(s)" if self.dry_run else "importée(s)"
+        self.stdout.write(self.style.SUCCESS(f"{importees} facture(s) {verbe}, {rejetees} ligne(s) rejetée(s)."))
+
+    def _lire(self, flux, format_fichier, delimiteur):
+        """Itère sur (numéro de ligne, dictionnaire) sans charger le fichier en mémoire."""
+        if format_fichier == 'csv':
+            lecteur = csv.DictReader(flux, delimiter=delimiteur)
+            for donnees in lecteur:
+                yield lecteur.line_num, donnees
+            return
+
+        for numero_ligne, ligne in enumerate(flux, start=1):
+            if not ligne.strip():
+                continue
+            try:
+                donnees = json.loads(ligne)
+            except json.JSONDecodeError as e:
+                donnees = {'_erreur': f"JSON invalide ({e.msg})"}
+            yield numero_ligne, donnees
+
+    def _construire_facture(self, donnees):
+        """Valide une ligne et retourne une Facture non sauvegardée, montants calculés."""
+        if not isinstance(donnees, dict):
+            raise LigneInvalide("objet JSON attendu")
+        if '_erreur' in donnees:
+            raise LigneInvalide(donnees['_erreur'])
+
+        def champ(nom, obligatoire=True):
+            valeur = donnees.get(nom)
+            valeur = '' if valeur is None else str(valeur).strip()
+            if obligatoire and not valeur:
+                raise LigneInvalide(f"champ « {nom} » manquant")
+            return valeur
+
+        numero = champ('numero', obligatoire=False)
+        if numero:
+            try:
+                # clean() refuse les numéros plus longs que la colonne (max_length)
+                Facture._meta.get_field('numero').clean(numero, None)
+            except ValidationError:
+                raise LigneInvalide(f"numéro invalide : {numero!r}")
+        try:
+            date_facture = date.fromisoformat(champ('date'))
+        except ValueError:
+            raise LigneInvalide(f"date invalide : {donnees.get('date')!r}")
+        try:
+            # clean() refuse NaN, Infinity et les valeurs hors max_digits / decimal_places
+            montant_ht = self._montant('montant_ht', champ('montant_ht'))
+            taux_tva = self._montant('taux_tva', champ('taux_tva', obligatoire=False) or '20.00')
+            # Même calcul que Facture.save(), appliqué hors save() pour bulk_create
+            montant_tva, montant_ttc = calculer_montants(montant_ht, taux_tva)
+            self._montant('montant_tva', montant_tva)
+            self._montant('montant_ttc', montant_ttc)
+        except (ValidationError, InvalidOperation):
+            raise LigneInvalide("montant ou taux de TVA invalide")
+
+        nom_client = champ('client')
+        client_id = self.clients.get(nom_client)
+        if client_id is None:
+            raise LigneInvalide(f"client inconnu : {nom_client!r}")
+
+        nom_categorie = champ('categorie', obligatoire=False)
+        if nom_categorie:
+            categorie_id = self.categories.get(nom_categorie)
+            if categorie_id is None:
+                raise LigneInvalide(f"catégorie inconnue : {nom_categorie!r}")
+        else:
+            categorie_id = self._id_autres()
+
+        paye = champ('paye', obligatoire=False).lower()
+        if paye not in VALEURS_VRAIES | VALEURS_FAUSSES:
+            raise LigneInvalide(f"valeur de « paye » invalide : {paye!r}")
+
+        return Facture(
+            numero=numero,
+            date=date_facture,
+            montant_ht=montant_ht,
+            taux_tva=taux_tva,
+            montant_tva=montant_tva,
+            montant_ttc=montant_ttc,
+            client_id=client_id,
+            categorie_id=categorie_id,
+            paye=paye in VALEURS_VRAIES,
+        )
+
+    @staticmethod
+    def _montant(nom, valeur):
+        """Valide une valeur décimale avec le champ du modèle et la retourne en Decimal."""
+        return Facture._meta.get_field(nom).clean(valeur, None)
+
+    def _id_autres(self):
+        """Identifiant de la catégorie 'Autres', résolu une seule fois par import."""
+        if self.id_autres is None:
+            self.id_autres = self.categories.get('Autres')
+            if self.id_autres is None and not self.dry_run:
+                self.id_autres = Categorie.objects.id_autres()
+        return self.id_autres
+
+    def _rejeter_doublons(self, lot, ecrivain):
+        """
+        Retire du lot les lignes dont le numéro est déjà utilisé : une requête
+        sur l'index unique de Facture.numero. En --dry-run, les lots précédents
+        n'étant pas insérés, seuls les doublons du lot et de la base sont vus.
+        """
+        numeros = [facture.numero for _, facture in lot if facture.numero]
+        pris = set(Facture.objects.filter(numero__in=numeros).values_list('numero', flat=True)) if numeros else set()
+        conserves = []
+        for numero_ligne, facture in lot:
+            if facture.numero:
+                if facture.numero in pris:
+                    self.doublons += 1
+                    self.stderr.write(f"Ligne {numero_ligne} : numéro déjà utilisé : {facture.numero!r}")
+                    if ecrivain:
+                        ecrivain.writerow([numero_ligne, f"numéro déjà utilisé : {facture.numero!r}"])
+                    continue
+                pris.add(facture.numero)
+            conserves.append((numero_ligne, facture))
+        return conserves
+
+    def _inserer(self, lot):
+        """
+        Insère un lot de factures et leurs logs. FactureQuerySet.bulk_create()
+        met à jour les compteurs et l'index de recherche du lot. Les numéros
+        manquants sont réservés dans la même transaction, une requête par année.
+        """
+        if self.dry_run or not lot:
+            return len(lot)
+
+        factures = [facture for _, facture in lot]
+        with transaction.atomic():
+            # Numéros fournis : les séquences repartent au-delà
+            SequenceFacture.objects.recaler(facture.numero for facture in factures if facture.numero)
+            sans_numero = {}
+            for facture in factures:
+                if not facture.numero:
+                    sans_numero.setdefault(facture.date.year, []).append(facture)
+            for annee, a_numeroter in sans_numero.items():
+                numeros = SequenceFacture.objects.numeros(PREFIXE_NUMERO_PAR_DEFAUT, annee, len(a_numeroter))
+                for facture, numero in zip(a_numeroter, numeros):
+                    facture.numero = numero
+            Facture.objects.bulk_create(factures)
+            LogCreationFacture.objects.bulk_create([
+                LogCreationFacture(
+                    facture=facture,
+                    ip_utilisateur='127.0.0.1',
+                    user_agent='',
+                    methode_creation='import',
+                    details_supplementaires={'fichier': self.source, 'ligne': numero_ligne},
+                )
+                for numero_ligne, facture in lot
+            ])
+        factures_creees.incrementer('import', montant=len(lot))
+        return len(lot)
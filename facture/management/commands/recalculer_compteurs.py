@@ -0,0 +1,44 @@
+"""
+Commande de maintenance des compteurs dénormalisés des clients et catégories.
+
+Usage :
+    python manage.py recalculer_compteurs             # reconstruit tous les compteurs
+    python manage.py recalculer_compteurs --verifier  # signale les écarts sans corriger
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from facture.models import Categorie, Client
+
+
+class Command(BaseCommand):
+    help = "Reconstruit ou vérifie les compteurs de factures des clients et catégories."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verifier',
+            action='store_true',
+            help="Vérifie les compteurs sans les modifier ; échoue en cas d'écart.",
+        )
+
+    def handle(self, *args, **options):
+        modeles = ((Client, "client(s)"), (Categorie, "catégorie(s)"))
+
+        if options['verifier']:
+            ecarts = 0
+            for modele, libelle in modeles:
+                for objet in modele.objects.incoherents():
+                    ecarts += 1
+                    self.stdout.write(
+                        f"{modele._meta.verbose_name} #{objet.pk} « {objet} » : "
+                        f"nb_factures={objet.nb_factures} (attendu {objet.attendu_nb_factures}), "
+                        f"total_ttc={objet.total_ttc} (attendu {objet.attendu_total_ttc}), "
+                        f"total_impaye={objet.total_impaye} (attendu {objet.attendu_total_impaye})"
+                    )
+            if ecarts:
+                raise CommandError(f"{ecarts} compteur(s) incohérent(s).")
+            self.stdout.write(self.style.SUCCESS("Tous les compteurs sont cohérents."))
+            return
+
+        for modele, libelle in modeles:
+            lignes = modele.objects.recalculer_compteurs()
+            self.stdout.write(self.style.SUCCESS(f"{lignes} {libelle} recalculé(e)s."))
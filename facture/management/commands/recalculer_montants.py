@@ -0,0 +1,42 @@
+"""
+Recalcul ensembliste des montants de TVA et TTC des factures.
+
+Les montants sont recalculés en base par une requête UPDATE (voir
+FactureQuerySet.recalculer_montants) : aucune facture n'est chargée en Python.
+Utile après un changement de règle d'arrondi ou un import de données brutes.
+
+Usage :
+    python manage.py recalculer_montants                     # une seule requête UPDATE
+    python manage.py recalculer_montants --taille-lot 50000  # par tranches de clés primaires
+    python manage.py recalculer_montants --dry-run           # compte les factures à corriger
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from facture.models import Facture
+
+
+class Command(BaseCommand):
+    help = "Recalcule en base les montants de TVA et TTC des factures et indique le nombre de lignes modifiées."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--taille-lot', type=int,
+            help="Nombre de factures parcourues par transaction (par défaut : une seule requête).",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Compte les factures incohérentes sans rien modifier.",
+        )
+
+    def handle(self, *args, **options):
+        taille_lot = options['taille_lot']
+        if taille_lot is not None and taille_lot < 1:
+            raise CommandError("--taille-lot doit être strictement positif.")
+
+        if options['dry_run']:
+            lignes = Facture.objects.montants_incoherents().count()
+            self.stdout.write(f"{lignes} facture(s) à recalculer.")
+            return
+
+        lignes = Facture.objects.recalculer_montants(taille_lot=taille_lot)
+        self.stdout.write(self.style.SUCCESS(f"{lignes} facture(s) recalculée(s)."))
@@ -0,0 +1,29 @@
+"""
+Reconstruction de l'index plein texte des factures.
+
+Usage :
+    python manage.py reconstruire_index_recherche
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from facture.recherche import reconstruire_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte (FTS5) des factures."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help="Base de données à traiter (défaut : default).",
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if connections[using].vendor != 'sqlite':
+            raise CommandError("L'index de recherche plein texte n'existe que sur SQLite.")
+
+        with transaction.atomic(using=using):
+            nb_factures = reconstruire_index(using)
+        self.stdout.write(self.style.SUCCESS(f"{nb_factures} facture(s) indexée(s)."))
@@ -0,0 +1,43 @@
+"""
+Reconstruction des agrégats mensuels de factures (FactureRollupMensuel).
+
+Les agrégats sont maintenus par delta à chaque écriture ; cette commande les
+recalcule entièrement depuis les factures, par exemple après un chargement
+de données brutes (loaddata, SQL) qui ne déclenche pas les signaux.
+
+Usage :
+    python manage.py reconstruire_rollups             # reconstruit tous les agrégats
+    python manage.py reconstruire_rollups --verifier  # signale les écarts sans corriger
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from facture.cache_rapports import invalider_rapports
+from facture.models import FactureRollupMensuel
+
+
+class Command(BaseCommand):
+    help = "Reconstruit ou vérifie les agrégats mensuels de factures."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verifier',
+            action='store_true',
+            help="Vérifie les agrégats sans les modifier ; échoue en cas d'écart.",
+        )
+
+    def handle(self, *args, **options):
+        if options['verifier']:
+            ecarts = FactureRollupMensuel.objects.ecarts()
+            for (mois, client_id, categorie_id, taux_tva, paye), stocke, attendu in ecarts:
+                self.stdout.write(
+                    f"{mois:%Y-%m} client #{client_id} catégorie #{categorie_id} "
+                    f"TVA {taux_tva} payée={paye} : {stocke} (attendu {attendu})"
+                )
+            if ecarts:
+                raise CommandError(f"{len(ecarts)} agrégat(s) incohérent(s).")
+            self.stdout.write(self.style.SUCCESS("Tous les agrégats mensuels sont cohérents."))
+            return
+
+        lignes = FactureRollupMensuel.objects.reconstruire()
+        invalider_rapports()
+        self.stdout.write(self.style.SUCCESS(f"{lignes} agrégat(s) mensuel(s) reconstruit(s)."))
@@ -0,0 +1,435 @@
+"""
+Métriques de l'application au format texte de Prometheus.
+
+La vue /metrics expose :
+    - facture_requetes_http_duree_secondes : histogramme de la durée des
+      requêtes HTTP, par nom d'URL (facture/urls.py) et statut ;
+    - facture_requetes_sql_total, facture_requetes_sql_duree_secondes_total :
+      nombre de requêtes SQL et temps passé en base, par nom d'URL ;
+    - facture_factures_creees_total : factures créées, par methode_creation
+      de LogCreationFacture (formulaire_web, import) ;
+    - facture_log_creation_delai_secondes : délai entre la mise en tampon d'un
+      LogCreationFacture et son écriture en base ;
+    - facture_cache_requetes_total, facture_cache_taux_succes : lectures du
+      cache des rapports, des valeurs et des fragments, et taux de succès.
+
+Les mesures HTTP et SQL sont relevées par InstrumentationSqlMiddleware.
+
+Registre : chaque thread incrémente son propre dictionnaire de valeurs, sans
+verrou ; ils ne sont additionnés qu'à la lecture. Avec plusieurs processus
+(gunicorn, uvicorn --workers), chacun écrit au plus toutes les
+INTERVALLE_ECRITURE secondes un instantané de ses valeurs dans REPERTOIRE,
+un répertoire partagé ; /metrics additionne les instantanés de tous les
+processus, y compris ceux qui se sont arrêtés, pour que les compteurs ne
+diminuent pas. Les instantanés des processus arrêtés sont fusionnés dans un
+seul fichier, NOM_ARCHIVE, à la lecture suivante : le répertoire ne grossit
+pas à chaque redémarrage. Les processus sont reconnus par leur pid : le
+répertoire doit être propre à la machine.
+
+Configuration (settings.METRIQUES) :
+    ACTIVE              : False désactive les mesures HTTP et l'endpoint
+    REPERTOIRE          : répertoire partagé entre processus (None : processus seul)
+    INTERVALLE_ECRITURE : délai minimal entre deux instantanés (secondes)
+    JETON               : si défini, /metrics exige "Authorization: Bearer <jeton>"
+    JETON_OBLIGATOIRE   : True refuse de démarrer sans JETON (profil de production)
+"""
+import atexit
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import fcntl
+except ImportError:
+    # Windows : pas de verrou de fichier, les instantanés ne sont pas fusionnés
+    fcntl = None
+
+
+CONFIGURATION_PAR_DEFAUT = {
+    'ACTIVE': True,
+    'REPERTOIRE': None,
+    'INTERVALLE_ECRITURE': 1.0,
+    'JETON': None,
+    'JETON_OBLIGATOIRE': False,
+}
+
+TYPE_CONTENU = 'text/plain; version=0.0.4; charset=utf-8'
+
+# metriques_<pid>_<horodatage de démarrage>.json
+NOM_INSTANTANE = re.compile(r'^metriques_(?P<pid>\d+)_\d+\.json$')
+# {"fusionnes": [noms des instantanés fusionnés], "valeurs": [[nom, étiquettes, valeur]]}
+NOM_ARCHIVE = 'metriques_archive.json'
+NOM_VERROU = '.metriques.verrou'
+
+BORNES_DUREE_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BORNES_DELAI_LOGS = (0.01, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+
+
+def configuration_metriques():
+    """Retourne la configuration des métriques."""
+    return {**CONFIGURATION_PAR_DEFAUT, **getattr(settings, 'METRIQUES', {})}
+
+
+def verifier_configuration():
+    """Lève ImproperlyConfigured si /metrics est actif sans le jeton exigé."""
+    config = configuration_metriques()
+    if config['ACTIVE'] and config['JETON_OBLIGATOIRE'] and not config['JETON']:
+        raise ImproperlyConfigured(
+            "METRIQUES['JETON'] est obligatoire : définissez DJANGO_JETON_METRIQUES "
+            "ou désactivez les métriques (METRIQUES['ACTIVE'] = False)."
+        )
+
+
+class Compteur:
+    """Compteur croissant, par combinaison de valeurs d'étiquettes."""
+    type = 'counter'
+
+    def __init__(self, registre, nom, aide, etiquettes=()):
+        self.registre = registre
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+
+    def incrementer(self, *valeurs, montant=1.0):
+        """Ajoute montant au compteur des étiquettes valeurs (dans l'ordre déclaré)."""
+        fragment = self.registre.fragment()
+        cle = (self.nom, valeurs)
+        fragment[cle] = fragment.get(cle, 0.0) + montant
+
+    def echantillons(self, valeurs):
+        for etiquettes, valeur in sorted(valeurs.get(self.nom, {}).items()):
+            yield self.nom, dict(zip(self.etiquettes, etiquettes)), valeur
+
+
+class Histogramme:
+    """
+    Histogramme à bornes fixes. Chaque série est une liste : un seau par
+    borne, le seau +Inf, puis la somme des valeurs observées.
+    """
+    type = 'histogram'
+
+    def __init__(self, registre, nom, aide, etiquettes=(), bornes=BORNES_DUREE_HTTP):
+        self.registre = registre
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+        self.bornes = tuple(bornes)
+
+    def observer(self, valeur, *valeurs):
+        """Enregistre une observation pour les étiquettes valeurs."""
+        fragment = self.registre.fragment()
+        cle = (self.nom, valeurs)
+        serie = fragment.get(cle)
+        if serie is None:
+            serie = fragment[cle] = [0.0] * (len(self.bornes) + 2)
+        serie[bisect_left(self.bornes, valeur)] += 1
+        serie[-1] += valeur
+
+    def echantillons(self, valeurs):
+        for etiquettes, serie in sorted(valeurs.get(self.nom, {}).items()):
+            base = dict(zip(self.etiquettes, etiquettes))
+            cumul = 0.0
+            for borne, nombre in zip((*self.bornes, float('inf')), serie):
+                cumul += nombre
+                yield f'{self.nom}_bucket', {**base, 'le': _nombre(borne)}, cumul
+            yield f'{self.nom}_sum', base, serie[-1]
+            yield f'{self.nom}_count', base, cumul
+
+
+class JaugeCalculee:
+    """Jauge calculée à l'exposition à partir des valeurs agrégées."""
+    type = 'gauge'
+
+    def __init__(self, registre, nom, aide, etiquettes, calcul):
+        self.registre = registre
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+        self.calcul = calcul
+
+    def echantillons(self, valeurs):
+        for etiquettes, valeur in sorted(self.calcul(valeurs).items()):
+            yield self.nom, dict(zip(self.etiquettes, etiquettes)), valeur
+
+
+class Registre:
+    """
+    Registre des métriques d'un processus.
+
+    Les valeurs sont réparties en un dictionnaire par thread ({(nom,
+    étiquettes): valeur}), modifié uniquement par son thread : une mesure ne
+    prend aucun verrou. Le verrou ne sert qu'à l'apparition d'un thread.
+    """
+
+    def __init__(self):
+        self.metriques = []
+        self._reinitialiser_processus()
+        os.register_at_fork(after_in_child=self._reinitialiser_processus)
+
+    def _reinitialiser_processus(self):
+        # Un processus enfant repart de zéro, sous sa propre identité
+        self._verrou = threading.Lock()
+        self._local = threading.local()
+        self._fragments = []
+        self._derniere_ecriture = 0.0
+        self.identite = f'{os.getpid()}_{time.time_ns()}'
+
+    def compteur(self, nom, aide, etiquettes=()):
+        return self._declarer(Compteur(self, nom, aide, etiquettes))
+
+    def histogramme(self, nom, aide, etiquettes=(), bornes=BORNES_DUREE_HTTP):
+        return self._declarer(Histogramme(self, nom, aide, etiquettes, bornes))
+
+    def jauge_calculee(self, nom, aide, etiquettes, calcul):
+        return self._declarer(JaugeCalculee(self, nom, aide, etiquettes, calcul))
+
+    def _declarer(self, metrique):
+        self.metriques.append(metrique)
+        return metrique
+
+    def fragment(self):
+        """Dictionnaire des valeurs du thread courant."""
+        try:
+            return self._local.valeurs
+        except AttributeError:
+            valeurs = self._local.valeurs = {}
+            with self._verrou:
+                self._fragments.append(valeurs)
+            return valeurs
+
+    def reinitialiser(self):
+        """Remet à zéro les valeurs du processus (tests)."""
+        with self._verrou:
+            for fragment in self._fragments:
+                fragment.clear()
+
+    def valeurs_locales(self):
+        """Valeurs du processus, tous threads confondus : [(nom, étiquettes, valeur)]."""
+        with self._verrou:
+            fragments = list(self._fragments)
+        valeurs = {}
+        for fragment in fragments:
+            # Copie atomique sous le GIL : le thread propriétaire peut écrire en même temps
+            for cle, valeur in fragment.copy().items():
+                _ajouter(valeurs, cle, valeur)
+        return [(nom, list(etiquettes), valeur) for (nom, etiquettes), valeur in valeurs.items()]
+
+    def ecrire_instantane(self, repertoire):
+        """Écrit les valeurs du processus dans le répertoire partagé (remplacement atomique)."""
+        os.makedirs(repertoire, exist_ok=True)
+        _ecrire_json(repertoire, f'metriques_{self.identite}.json', self.valeurs_locales())
+        self._derniere_ecriture = time.monotonic()
+
+    def ecrire_si_necessaire(self, config):
+        """Écrit un instantané si le précédent date de plus de INTERVALLE_ECRITURE secondes."""
+        if config['REPERTOIRE'] and time.monotonic() - self._derniere_ecriture >= config['INTERVALLE_ECRITURE']:
+            self.ecrire_instantane(config['REPERTOIRE'])
+
+    def archiver_arretes(self, repertoire):
+        """
+        Fusionne dans NOM_ARCHIVE les instantanés des processus arrêtés, puis
+        les supprime. Retourne le nombre d'instantanés fusionnés.
+        """
+        if fcntl is None or not any(_instantane_arrete(nom) for nom in os.listdir(repertoire)):
+            return 0
+        with open(os.path.join(repertoire, NOM_VERROU), 'a') as verrou:
+            # Un seul processus fusionne à la fois ; les autres relisent ensuite le répertoire
+            fcntl.flock(verrou, fcntl.LOCK_EX)
+            try:
+                archive = _lire_archive(repertoire)
+                fusionnes = set(archive['fusionnes'])
+                nouveaux = [
+                    nom for nom in os.listdir(repertoire)
+                    if _instantane_arrete(nom) and nom not in fusionnes
+                ]
+                valeurs = {}
+                for nom, etiquettes, valeur in archive['valeurs']:
+                    _ajouter(valeurs, (nom, tuple(etiquettes)), valeur)
+                for nom in nouveaux:
+                    for metrique, etiquettes, valeur in _lire_json(os.path.join(repertoire, nom)) or []:
+                        _ajouter(valeurs, (metrique, tuple(etiquettes)), valeur)
+                # Les noms fusionnés sont conservés jusqu'à la suppression de leur
+                # fichier : un arrêt entre les deux ne les compte pas deux fois.
+                presents = fusionnes | set(nouveaux)
+                lignes = [[nom, list(etiquettes), valeur] for (nom, etiquettes), valeur in valeurs.items()]
+                _ecrire_json(repertoire, NOM_ARCHIVE, {'fusionnes': sorted(presents), 'valeurs': lignes})
+                for nom in presents:
+                    try:
+                        os.remove(os.path.join(repertoire, nom))
+                    except FileNotFoundError:
+                        pass
+                _ecrire_json(repertoire, NOM_ARCHIVE, {'fusionnes': [], 'valeurs': lignes})
+            finally:
+                fcntl.flock(verrou, fcntl.LOCK_UN)
+        return len(nouveaux)
+
+    def collecter(self, repertoire=None):
+        """
+        Valeurs agrégées {nom: {étiquettes: valeur}} : celles du processus et,
+        si repertoire est donné, les instantanés des autres processus et
+        l'archive des processus arrêtés.
+        """
+        lignes = list(self.valeurs_locales())
+        if repertoire and os.path.isdir(repertoire):
+            self.archiver_arretes(repertoire)
+            propre = f'metriques_{self.identite}.json'
+            instantanes = {}
+            for nom in os.listdir(repertoire):
+                if nom != propre and NOM_INSTANTANE.match(nom):
+                    instantanes[nom] = _lire_json(os.path.join(repertoire, nom))
+            # Archive lue après les instantanés : un instantané fusionné entre-temps
+            # figure dans sa liste et n'est pas compté deux fois
+            archive = _lire_archive(repertoire)
+            lignes.extend(archive['valeurs'])
+            for nom, contenu in instantanes.items():
+                if contenu and nom not in archive['fusionnes']:
+                    lignes.extend(contenu)
+        valeurs = {}
+        for nom, etiquettes, valeur in lignes:
+            _ajouter(valeurs, (nom, tuple(etiquettes)), valeur)
+        agregees = {}
+        for (nom, etiquettes), valeur in valeurs.items():
+            agregees.setdefault(nom, {})[etiquettes] = valeur
+        return agregees
+
+    def exposer(self, repertoire=None):
+        """Texte de l'exposition Prometheus (format 0.0.4)."""
+        valeurs = self.collecter(repertoire)
+        lignes = []
+        for metrique in self.metriques:
+            lignes.append(f'# HELP {metrique.nom} {metrique.aide}')
+            lignes.append(f'# TYPE {metrique.nom} {metrique.type}')
+            for nom, etiquettes, valeur in metrique.echantillons(valeurs):
+                if etiquettes:
+                    texte = ','.join(f'{cle}="{_echapper(str(v))}"' for cle, v in etiquettes.items())
+                    lignes.append(f'{nom}{{{texte}}} {_nombre(valeur)}')
+                else:
+                    lignes.append(f'{nom} {_nombre(valeur)}')
+        return '\n'.join(lignes) + '\n'
+
+
+def _processus_actif(pid):
+    """Indique si le processus pid existe sur cette machine."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Processus d'un autre utilisateur
+        return True
+    return True
+
+
+def _instantane_arrete(nom):
+    correspondance = NOM_INSTANTANE.match(nom)
+    return correspondance is not None and not _processus_actif(int(correspondance['pid']))
+
+
+def _lire_json(chemin):
+    """Contenu d'un fichier JSON, ou None s'il a été supprimé ou est illisible."""
+    try:
+        with open(chemin) as fichier:
+            return json.load(fichier)
+    except (OSError, ValueError):
+        return None
+
+
+def _lire_archive(repertoire):
+    archive = _lire_json(os.path.join(repertoire, NOM_ARCHIVE))
+    return archive if isinstance(archive, dict) else {'fusionnes': [], 'valeurs': []}
+
+
+def _ecrire_json(repertoire, nom, contenu):
+    """Écrit un fichier JSON du répertoire par remplacement atomique."""
+    descripteur, temporaire = tempfile.mkstemp(dir=repertoire, prefix='.metriques_', suffix='.tmp')
+    try:
+        with os.fdopen(descripteur, 'w') as fichier:
+            json.dump(contenu, fichier)
+        os.replace(temporaire, os.path.join(repertoire, nom))
+    except BaseException:
+        os.unlink(temporaire)
+        raise
+
+
+def _ajouter(valeurs, cle, valeur):
+    """Additionne une valeur de compteur ou une série d'histogramme."""
+    existante = valeurs.get(cle)
+    if existante is None:
+        valeurs[cle] = list(valeur) if isinstance(valeur, list) else valeur
+    elif isinstance(existante, list):
+        if len(existante) != len(valeur):
+            # Instantané écrit avec d'autres bornes (avant un déploiement) : ignoré
+            return
+        for indice, nombre in enumerate(valeur):
+            existante[indice] += nombre
+    else:
+        valeurs[cle] = existante + valeur
+
+
+def _echapper(texte):
+    return texte.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _nombre(valeur):
+    if valeur == float('inf'):
+        return '+Inf'
+    return repr(float(valeur))
+
+
+def _taux_succes_cache(valeurs):
+    """Taux de succès par cache, à partir de facture_cache_requetes_total."""
+    totaux = {}
+    for (cache, resultat), nombre in valeurs.get('facture_cache_requetes_total', {}).items():
+        succes, total = totaux.get((cache,), (0.0, 0.0))
+        totaux[(cache,)] = (succes + (nombre if resultat == 'succes' else 0.0), total + nombre)
+    return {cache: succes / total for cache, (succes, total) in totaux.items() if total}
+
+
+registre = Registre()
+
+duree_requetes = registre.histogramme(
+    'facture_requetes_http_duree_secondes', "Durée des requêtes HTTP.", ('vue', 'statut'),
+)
+requetes_sql = registre.compteur(
+    'facture_requetes_sql_total', "Requêtes SQL exécutées.", ('vue',),
+)
+duree_sql = registre.compteur(
+    'facture_requetes_sql_duree_secondes_total', "Temps passé en base.", ('vue',),
+)
+factures_creees = registre.compteur(
+    'facture_factures_creees_total', "Factures créées, par méthode de création.", ('methode_creation',),
+)
+delai_logs = registre.histogramme(
+    'facture_log_creation_delai_secondes',
+    "Délai entre la mise en tampon d'un log de création et son écriture en base.",
+    bornes=BORNES_DELAI_LOGS,
+)
+lectures_cache = registre.compteur(
+    'facture_cache_requetes_total', "Lectures du cache, par cache et résultat (succes, echec).",
+    ('cache', 'resultat'),
+)
+registre.jauge_calculee(
+    'facture_cache_taux_succes', "Part des lectures du cache servies depuis le cache.", ('cache',),
+    _taux_succes_cache,
+)
+
+
+def compter_lecture_cache(cache, succes):
+    """Compte une lecture du cache nommé (rapports, valeurs, fragments)."""
+    lectures_cache.incrementer(cache, 'succes' if succes else 'echec')
+
+
+def _ecrire_a_l_arret():
+    repertoire = configuration_metriques()['REPERTOIRE']
+    if repertoire:
+        registre.ecrire_instantane(repertoire)
+
+
+atexit.register(_ecrire_a_l_arret)
@@ -1,11 +1,346 @@
 """
-Middleware pour enregistrer les logs de création de factures.
+Middlewares de l'application facture.
 
-Ce middleware intercepte uniquement les requêtes POST vers les vues de création de factures
+EpinglagePrimaireMiddleware épingle la base primaire pour les requêtes
+d'écriture et pour les requêtes qui suivent de près une écriture
+(voir facture/routeurs.py).
+
+InstrumentationSqlMiddleware compte les requêtes SQL de chaque requête HTTP
+et leur durée cumulée, les renvoie dans l'en-tête Server-Timing et journalise
+les requêtes qui dépassent les seuils configurés. Il alimente aussi les
+métriques de durée et de requêtes SQL par URL exposées sur /metrics (voir
+facture/metriques.py).
+
+ProfilageMiddleware profile à la demande un échantillon des requêtes (voir
+facture/profilage.py).
+
+LogCreationFactureMiddleware enregistre les logs de création de factures.
+
+Ce middleware intercepte uniquement les réponses aux créations de factures réussies
 et enregistre automatiquement un log en base de données.
+
+La vue de création indique directement l'identifiant de la facture créée via
+l'attribut ``request.facture_creee_pk`` : aucune requête de recherche n'est nécessaire.
+Les logs sont placés dans un tampon en mémoire, borné, vidé par lots avec
+bulk_create lorsque sa taille ou son ancienneté dépasse un seuil, ainsi qu'à
+l'arrêt du processus.
 """
+import atexit
+import cProfile
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, connection, connections, transaction
 from django.utils.deprecation import MiddlewareMixin
-from .models import LogCreationFacture, Facture
+from . import metriques
+from .metriques import configuration_metriques
+from .models import LogCreationFacture
+from .profilage import configuration_profilage, enregistrer_profil, taux_demande
+from .routeurs import configuration_routage, demarrer_requete
+
+
+logger = logging.getLogger(__name__)
+
+# Configuration par défaut, surchargeable via settings.LOG_CREATION_FACTURE
+CONFIGURATION_PAR_DEFAUT = {
+    'TAMPON': True,        # False : écriture synchrone à chaque création
+    'TAILLE_LOT': 50,      # Vidage dès que le tampon atteint cette taille
+    'DELAI_MAX': 2.0,      # Vidage au plus tard après ce délai (secondes)
+    'CAPACITE_MAX': 1000,  # Au-delà, les logs sont écrits de manière synchrone
+}
+
+
+def configuration_logs():
+    """Retourne la configuration du tampon de logs."""
+    return {**CONFIGURATION_PAR_DEFAUT, **getattr(settings, 'LOG_CREATION_FACTURE', {})}
+
+
+class TamponLogs:
+    """
+    Tampon en mémoire des logs de création de factures.
+
+    Les logs sont insérés par lots avec bulk_create, soit quand le tampon atteint
+    TAILLE_LOT, soit par un thread de fond toutes les DELAI_MAX secondes.
+    """
+
+    def __init__(self):
+        self._logs = []
+        self._verrou = threading.Lock()
+        self._thread = None
+        self._reveil = threading.Event()
+
+    def __len__(self):
+        return len(self._logs)
+
+    def ajouter(self, log):
+        """
+        Ajoute un log au tampon, ou l'écrit immédiatement si le tampon est plein.
+        Retourne True si le log a été mis en tampon.
+        """
+        config = configuration_logs()
+        with self._verrou:
+            if len(self._logs) >= config['CAPACITE_MAX']:
+                plein = True
+            else:
+                plein = False
+                # Horodatage de mise en tampon : délai d'écriture mesuré par vider()
+                log._mis_en_tampon = time.monotonic()
+                self._logs.append(log)
+                a_vider = len(self._logs) >= config['TAILLE_LOT']
+
+        if plein:
+            # Repli synchrone : le tampon ne grossit jamais au-delà de sa capacité
+            log.save()
+            return False
+
+        self._demarrer_thread(config['DELAI_MAX'])
+        if a_vider:
+            self.vider()
+        return True
+
+    def vider(self):
+        """
+        Écrit en base, en une requête, tous les logs en attente.
+
+        Si le lot est refusé, ses logs sont réécrits un par un : ceux que la base
+        rejette (facture supprimée entre-temps...) sont abandonnés et journalisés,
+        au lieu de bloquer indéfiniment le lot.
+        """
+        with self._verrou:
+            logs, self._logs = self._logs, []
+        if not logs:
+            return 0
+        try:
+            LogCreationFacture.objects.bulk_create(logs)
+            ecrits = logs
+        except Exception:
+            logger.warning(
+                "Échec de l'écriture groupée de %d log(s) de création de factures, écriture un par un",
+                len(logs), exc_info=True,
+            )
+            ecrits = self._ecrire_un_par_un(logs)
+        ecriture = time.monotonic()
+        for log in ecrits:
+            metriques.delai_logs.observer(ecriture - log._mis_en_tampon)
+        return len(ecrits)
+
+    def _ecrire_un_par_un(self, logs):
+        """
+        Insère les logs un par un et retourne ceux qui ont été écrits.
+        Si la base est indisponible, les logs restants sont remis en tampon.
+        """
+        ecrits = []
+        for rang, log in enumerate(logs):
+            log.pk = None
+            try:
+                with transaction.atomic():
+                    log.save(force_insert=True)
+            except (OperationalError, InterfaceError):
+                logger.exception("Base indisponible, %d log(s) remis en tampon", len(logs) - rang)
+                with self._verrou:
+                    place = configuration_logs()['CAPACITE_MAX'] - len(self._logs)
+                    self._logs[:0] = logs[rang:rang + max(place, 0)]
+                break
+            except Exception:
+                logger.exception("Log de création de la facture %s abandonné", log.facture_id)
+            else:
+                ecrits.append(log)
+        return ecrits
+
+    def _demarrer_thread(self, delai):
+        """Démarre, si besoin, le thread de vidage périodique."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._verrou:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._boucle, args=(delai,), name='tampon-logs-factures', daemon=True
+            )
+            self._thread.start()
+
+    def _boucle(self, delai):
+        """Vide le tampon périodiquement tant que le processus tourne."""
+        while not self._reveil.wait(delai):
+            try:
+                self.vider()
+            finally:
+                # Le thread possède sa propre connexion : la libérer entre deux vidages
+                connection.close()
+
+
+tampon_logs = TamponLogs()
+atexit.register(tampon_logs.vider)
+
+
+class EpinglagePrimaireMiddleware(MiddlewareMixin):
+    """
+    Middleware qui initialise le routage primaire / réplicas de chaque requête.
+    Les requêtes d'écriture, et celles d'un client ayant écrit dans les
+    DELAI_EPINGLAGE dernières secondes (cookie), lisent sur la base primaire.
+    """
+
+    METHODES_LECTURE = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def process_request(self, request):
+        config = configuration_routage()
+        request.etat_routage = demarrer_requete(
+            epingle=request.method not in self.METHODES_LECTURE or config['COOKIE'] in request.COOKIES
+        )
+
+    def process_response(self, request, response):
+        config = configuration_routage()
+        etat = getattr(request, 'etat_routage', None)
+        if etat is not None and etat.ecriture and config['REPLICAS']:
+            # Le client lit sur la primaire le temps que les réplicas rattrapent l'écriture
+            response.set_cookie(
+                config['COOKIE'], '1', max_age=config['DELAI_EPINGLAGE'], httponly=True, samesite='Lax',
+            )
+        return response
+
+
+# Configuration par défaut, surchargeable via settings.INSTRUMENTATION_SQL
+CONFIGURATION_INSTRUMENTATION_PAR_DEFAUT = {
+    'ACTIVE': True,
+    'SERVER_TIMING': True,       # En-tête Server-Timing sur chaque réponse
+    'SEUIL_REQUETES': 50,        # Journalise au-delà de ce nombre de requêtes SQL
+    'SEUIL_DUREE_MS': 500,       # ... ou de cette durée totale (millisecondes)
+    'SEUIL_DUREE_SQL_MS': 200,   # ... ou de cette durée cumulée en base (millisecondes)
+}
+
+
+def configuration_instrumentation():
+    """Retourne la configuration de l'instrumentation SQL des requêtes."""
+    return {**CONFIGURATION_INSTRUMENTATION_PAR_DEFAUT, **getattr(settings, 'INSTRUMENTATION_SQL', {})}
+
+
+class CompteurSql:
+    """
+    Enveloppe d'exécution (connection.execute_wrapper) qui compte les
+    requêtes SQL et cumule leur durée.
+    """
+    __slots__ = ('nombre', 'duree')
+
+    def __init__(self):
+        self.nombre = 0
+        self.duree = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duree += time.perf_counter() - debut
+            self.nombre += 1
+
+
+class InstrumentationSqlMiddleware:
+    """
+    Middleware qui mesure, pour chaque requête HTTP, le nombre de requêtes SQL
+    et le temps passé en base, sur toutes les bases configurées.
+
+    Seules les requêtes SQL exécutées dans le thread de la requête sont
+    comptées : pas celles lancées en parallèle par en_parallele(), ni celles
+    d'une réponse en flux, exécutées après le retour du middleware.
+    Le coût est celui d'un appel de fonction par requête SQL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = configuration_instrumentation()
+        config_metriques = configuration_metriques()
+        if not (config['ACTIVE'] or config_metriques['ACTIVE']):
+            return self.get_response(request)
+
+        compteur = CompteurSql()
+        debut = time.perf_counter()
+        with ExitStack() as enveloppes:
+            for connexion in connections.all():
+                enveloppes.enter_context(connexion.execute_wrapper(compteur))
+            response = self.get_response(request)
+        duree = time.perf_counter() - debut
+        nom_url = getattr(request.resolver_match, 'view_name', None) or '-'
+
+        if config_metriques['ACTIVE']:
+            self._enregistrer_metriques(config_metriques, nom_url, response.status_code, duree, compteur)
+        if not config['ACTIVE']:
+            return response
+
+        if config['SERVER_TIMING']:
+            mesures = f'db;dur={compteur.duree * 1000:.1f};desc="{compteur.nombre} SQL", app;dur={duree * 1000:.1f}'
+            existantes = response.get('Server-Timing')
+            response['Server-Timing'] = f'{existantes}, {mesures}' if existantes else mesures
+
+        if (
+            compteur.nombre > config['SEUIL_REQUETES']
+            or duree * 1000 > config['SEUIL_DUREE_MS']
+            or compteur.duree * 1000 > config['SEUIL_DUREE_SQL_MS']
+        ):
+            logger.warning(
+                "Requête coûteuse %s %s [%s] : %d requête(s) SQL, %.1f ms dont %.1f ms en base",
+                request.method, request.path, nom_url, compteur.nombre, duree * 1000, compteur.duree * 1000,
+                extra={
+                    'nom_url': nom_url,
+                    'requetes_sql': compteur.nombre,
+                    'duree_ms': duree * 1000,
+                    'duree_sql_ms': compteur.duree * 1000,
+                    'statut': response.status_code,
+                },
+            )
+        return response
+
+    @staticmethod
+    def _enregistrer_metriques(config, nom_url, statut, duree, compteur):
+        """Alimente les métriques exposées sur /metrics (voir facture/metriques.py)."""
+        metriques.duree_requetes.observer(duree, nom_url, str(statut))
+        metriques.requetes_sql.incrementer(nom_url, montant=compteur.nombre)
+        metriques.duree_sql.incrementer(nom_url, montant=compteur.duree)
+        try:
+            metriques.registre.ecrire_si_necessaire(config)
+        except OSError:
+            # Le répertoire partagé ne doit jamais faire échouer la requête
+            logger.exception("Impossible d'écrire l'instantané des métriques")
+
+
+class ProfilageMiddleware:
+    """
+    Middleware qui exécute cProfile autour de la vue et du rendu de son
+    template, pour un échantillon des requêtes du staff (?profilage) ou
+    portant l'en-tête X-Profilage signé. Le nom du fichier .prof écrit est
+    renvoyé dans l'en-tête X-Profil de la réponse.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = configuration_profilage()
+        taux = taux_demande(request, config) if config['ACTIVE'] else None
+        if taux is None or random.random() * 100 >= taux:
+            return self.get_response(request)
+
+        profil = cProfile.Profile()
+        debut = time.perf_counter()
+        profil.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profil.disable()
+        duree = time.perf_counter() - debut
+
+        nom_url = getattr(request.resolver_match, 'view_name', None) or 'introuvable'
+        try:
+            response['X-Profil'] = enregistrer_profil(profil, nom_url, duree, config)
+        except OSError:
+            # Le profilage ne doit jamais faire échouer la requête
+            logger.exception("Impossible d'enregistrer le profil de %s", request.path)
+        return response
 
 
 class LogCreationFactureMiddleware(MiddlewareMixin):
@@ -18,30 +353,29 @@ class LogCreationFactureMiddleware(MiddlewareMixin):
         Traite la réponse sortante.
         Vérifie si une facture a été créée et enregistre le log si nécessaire.
         """
-        # Vérifier si c'est une requête POST vers une vue de création de facture
-        if (request.method == 'POST' and
-            '/factures/creer/' in request.path and
-            response.status_code == 302):  # Succès = redirection
+        facture_pk = getattr(request, 'facture_creee_pk', None)
 
+        # Vérifier si c'est une création de facture réussie (redirection 302)
+        if facture_pk is not None and response.status_code == 302:
             try:
-                # Récupérer la facture la plus récemment créée
-                facture = Facture.objects.latest('id')
-
-                # Créer le log de création
-                LogCreationFacture.objects.create(
-                    facture=facture,
+                log = LogCreationFacture(
+                    facture_id=facture_pk,
                     ip_utilisateur=self._get_client_ip(request),
                     user_agent=request.META.get('HTTP_USER_AGENT', ''),
                     methode_creation='formulaire_web',
                     details_supplementaires={}
                 )
+                # Dans une transaction ouverte, la facture n'est pas encore visible
+                # des autres connexions : le log est alors écrit de manière synchrone.
+                if configuration_logs()['TAMPON'] and not transaction.get_connection().in_atomic_block:
+                    tampon_logs.ajouter(log)
+                else:
+                    log.save()
+                metriques.factures_creees.incrementer(log.methode_creation)
 
-            except Facture.DoesNotExist:
-                # Aucune facture trouvée, ne pas créer de log
-                pass
-            except Exception as e:
+            except Exception:
                 # En cas d'erreur, ne pas bloquer la réponse
-                pass
+                logger.exception("Impossible d'enregistrer le log de création de la facture %s", facture_pk)
 
         return response
 
@@ -55,5 +389,3 @@ class LogCreationFactureMiddleware(MiddlewareMixin):
         else:
             ip = request.META.get('REMOTE_ADDR')
         return ip
-
-
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:11
+
+from django.db import migrations, models
+
+
+def fusionner_categories_autres(apps, schema_editor):
+    """
+    Fusionne les éventuels doublons de la catégorie 'Autres' dans la plus ancienne
+    avant de poser la contrainte d'unicité.
+    """
+    Categorie = apps.get_model('facture', 'Categorie')
+    Facture = apps.get_model('facture', 'Facture')
+
+    ids = list(Categorie.objects.filter(nom='Autres').order_by('id').values_list('id', flat=True))
+    if len(ids) < 2:
+        return
+    conservee, doublons = ids[0], ids[1:]
+    Facture.objects.filter(categorie_id__in=doublons).update(categorie_id=conservee)
+    Categorie.objects.filter(id__in=doublons).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facture', '0003_alter_categorie_options_alter_client_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionner_categories_autres, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='categorie',
+            constraint=models.UniqueConstraint(condition=models.Q(('nom', 'Autres')), fields=('nom',), name='categorie_autres_unique'),
+        ),
+    ]
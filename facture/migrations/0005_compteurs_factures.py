@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:13
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def initialiser_compteurs(apps, schema_editor):
+    """Calcule les compteurs des clients et catégories existants."""
+    Facture = apps.get_model('facture', 'Facture')
+    montant = models.DecimalField(max_digits=14, decimal_places=2)
+
+    for nom_modele, champ in (('Client', 'client'), ('Categorie', 'categorie')):
+        factures = Facture.objects.filter(**{champ: OuterRef('pk')}).order_by().values(champ)
+        apps.get_model('facture', nom_modele).objects.update(
+            nb_factures=Coalesce(Subquery(factures.annotate(n=Count('id')).values('n')), 0),
+            total_ttc=Coalesce(
+                Subquery(factures.annotate(t=Sum('montant_ttc')).values('t')),
+                Decimal('0.00'), output_field=montant,
+            ),
+            total_impaye=Coalesce(
+                Subquery(factures.filter(paye=False).annotate(t=Sum('montant_ttc')).values('t')),
+                Decimal('0.00'), output_field=montant,
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facture', '0004_categorie_autres_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categorie',
+            name='nb_factures',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Nombre de factures'),
+        ),
+        migrations.AddField(
+            model_name='categorie',
+            name='total_impaye',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=14, verbose_name='Total impayé'),
+        ),
+        migrations.AddField(
+            model_name='categorie',
+            name='total_ttc',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=14, verbose_name='Total TTC'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='nb_factures',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Nombre de factures'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='total_impaye',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=14, verbose_name='Total impayé'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='total_ttc',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=14, verbose_name='Total TTC'),
+        ),
+        migrations.AddIndex(
+            model_name='categorie',
+            index=models.Index(fields=['-total_ttc'], name='categorie_total_ttc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['-total_ttc'], name='client_total_ttc_idx'),
+        ),
+        migrations.RunPython(initialiser_compteurs, migrations.RunPython.noop),
+    ]
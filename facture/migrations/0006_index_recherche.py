@@ -0,0 +1,47 @@
+from django.db import migrations
+
+
+# Table FTS5 (tokenizer trigram : recherche de sous-chaînes insensible à la casse)
+# indexant le numéro de chaque facture ainsi que le nom et l'email de son client.
+# Le rowid de la table est l'identifiant de la facture. L'index est maintenu
+# depuis Python (signaux et FactureQuerySet), voir facture/recherche.py.
+SQL_CREATION = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS facture_recherche USING fts5(
+        numero, client_nom, client_email, tokenize = 'trigram'
+    )
+    """,
+    """
+    INSERT INTO facture_recherche (rowid, numero, client_nom, client_email)
+    SELECT f.id, f.numero, c.nom, COALESCE(c.email, '')
+    FROM facture_facture f JOIN facture_client c ON c.id = f.client_id
+    """,
+]
+
+SQL_SUPPRESSION = [
+    "DROP TABLE IF EXISTS facture_recherche",
+]
+
+
+def creer_index(apps, schema_editor):
+    """Crée l'index sur SQLite uniquement ; les autres bases gardent la recherche icontains."""
+    if schema_editor.connection.vendor == 'sqlite':
+        for requete in SQL_CREATION:
+            schema_editor.execute(requete)
+
+
+def supprimer_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for requete in SQL_SUPPRESSION:
+            schema_editor.execute(requete)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facture', '0005_compteurs_factures'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index, supprimer_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facture', '0006_index_recherche'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['date', 'id'], name='facture_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['client', 'date', 'id'], name='facture_client_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['categorie', 'date', 'id'], name='facture_categorie_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(condition=models.Q(('paye', False)), fields=['date', 'id'], name='facture_impayees_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(condition=models.Q(('paye', False)), fields=['client', 'date'], name='facture_impayees_client_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def initialiser_rollups(apps, schema_editor):
+    """Calcule les agrégats mensuels des factures existantes."""
+    Facture = apps.get_model('facture', 'Facture')
+    FactureRollupMensuel = apps.get_model('facture', 'FactureRollupMensuel')
+    agregats = (
+        Facture.objects.order_by()
+        .annotate(debut_mois=TruncMonth('date'))
+        .values('debut_mois', 'client_id', 'categorie_id', 'taux_tva', 'paye')
+        .annotate(nb=Count('id'), somme_ht=Sum('montant_ht'),
+                  somme_tva=Sum('montant_tva'), somme_ttc=Sum('montant_ttc'))
+    )
+    FactureRollupMensuel.objects.bulk_create([
+        FactureRollupMensuel(
+            mois=ligne['debut_mois'], client_id=ligne['client_id'], categorie_id=ligne['categorie_id'],
+            taux_tva=ligne['taux_tva'], paye=ligne['paye'], nombre=ligne['nb'],
+            montant_ht=ligne['somme_ht'], montant_tva=ligne['somme_tva'], montant_ttc=ligne['somme_ttc'],
+        )
+        for ligne in agregats
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facture', '0008_index_composites_factures'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FactureRollupMensuel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mois', models.DateField(verbose_name='Mois')),
+                ('taux_tva', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='Taux TVA (%)')),
+                ('paye', models.BooleanField(verbose_name='Payée')),
+                ('nombre', models.IntegerField(default=0, verbose_name='Nombre de factures')),
+                ('montant_ht', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Montant HT')),
+                ('montant_tva', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Montant TVA')),
+                ('montant_ttc', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Montant TTC')),
+                ('categorie', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='facture.categorie', verbose_name='Catégorie')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='facture.client', verbose_name='Client')),
+            ],
+            options={
+                'verbose_name': 'Agrégat mensuel de factures',
+                'verbose_name_plural': 'Agrégats mensuels de factures',
+                'ordering': ['mois'],
+                'indexes': [models.Index(fields=['mois', 'client'], name='rollup_mensuel_mois_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('categorie__isnull', False)), fields=('mois', 'client', 'categorie', 'taux_tva', 'paye'), name='rollup_mensuel_unique'), models.UniqueConstraint(condition=models.Q(('categorie__isnull', True)), fields=('mois', 'client', 'taux_tva', 'paye'), name='rollup_mensuel_sans_categorie_unique')],
+            },
+        ),
+        migrations.RunPython(initialiser_rollups, migrations.RunPython.noop),
+    ]
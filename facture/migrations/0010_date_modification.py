@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facture', '0009_rollup_mensuel_factures'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categorie',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True, verbose_name='Date de modification'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True, verbose_name='Date de modification'),
+        ),
+        migrations.AddField(
+            model_name='facture',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True, verbose_name='Date de modification'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['date_modification'], name='client_date_modif_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['date_modification'], name='facture_date_modif_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['client', 'date_modification'], name='facture_client_modif_idx'),
+        ),
+    ]
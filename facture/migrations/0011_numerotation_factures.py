@@ -0,0 +1,131 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:52
+
+import re
+
+from django.db import migrations, models
+
+
+# Copies figées de facture/recherche.py et de facture.models.analyser_numero() :
+# la migration ne doit pas dépendre du code de l'application, qui évoluera.
+SQL_REINDEXATION = [
+    "DELETE FROM facture_recherche WHERE rowid IN ({marqueurs})",
+    """
+    INSERT INTO facture_recherche (rowid, numero, client_nom, client_email)
+    SELECT f.id, f.numero, c.nom, COALESCE(c.email, '')
+    FROM facture_facture f JOIN facture_client c ON c.id = f.client_id
+    WHERE f.id IN ({marqueurs})
+    """,
+]
+
+NUMERO_SEQUENCE = re.compile(r'^(?P<prefixe>.+)-(?P<annee>\d{4})-(?P<valeur>\d+)$')
+LONGUEUR_MAX_PREFIXE = 20
+LONGUEUR_MAX_NUMERO = 255
+CHIFFRES_NUMERO = 6
+
+
+def reindexer_factures(connexion, ids):
+    """Réindexe dans facture_recherche (SQLite uniquement) les factures données."""
+    if not ids or connexion.vendor != 'sqlite':
+        return
+    marqueurs = ', '.join(['%s'] * len(ids))
+    with connexion.cursor() as cursor:
+        for requete in SQL_REINDEXATION:
+            cursor.execute(requete.format(marqueurs=marqueurs), ids)
+
+
+def analyser_numero(numero):
+    """Retourne (prefixe, annee, valeur) si numero a la forme PREFIXE-AAAA-NNNNNN, None sinon."""
+    correspondance = NUMERO_SEQUENCE.match(numero)
+    if correspondance is None:
+        return None
+    prefixe, annee, valeur = correspondance['prefixe'], int(correspondance['annee']), int(correspondance['valeur'])
+    if len(prefixe) > LONGUEUR_MAX_PREFIXE:
+        return None
+    if f"{prefixe}-{annee}-{valeur:0{CHIFFRES_NUMERO}d}" != numero:
+        return None
+    return prefixe, annee, valeur
+
+
+def numero_libre(factures, numero, pk):
+    """
+    Retourne "<numero>-<pk>", ou "<numero>-<pk>-2", "-3"... si ce numéro est
+    déjà pris, le numéro d'origine étant tronqué pour tenir dans la colonne.
+    """
+    rang = 1
+    while True:
+        suffixe = f"-{pk}" if rang == 1 else f"-{pk}-{rang}"
+        candidat = numero[:LONGUEUR_MAX_NUMERO - len(suffixe)] + suffixe
+        if not factures.filter(numero=candidat).exists():
+            return candidat
+        rang += 1
+
+
+def renommer_numeros_en_double(apps, schema_editor):
+    """
+    Avant de poser l'index unique sur Facture.numero, suffixe les numéros en
+    double par l'identifiant de la facture, la plus ancienne gardant le sien.
+    Le suffixe évite les numéros déjà pris et la longueur maximale.
+    """
+    Facture = apps.get_model('facture', 'Facture')
+    base = schema_editor.connection.alias
+    doublons = (
+        Facture.objects.using(base).order_by().values('numero')
+        .annotate(nombre=models.Count('id')).filter(nombre__gt=1).values_list('numero', flat=True)
+    )
+    renommees = []
+    for numero in list(doublons):
+        ids = list(Facture.objects.using(base).filter(numero=numero).order_by('id').values_list('id', flat=True))
+        for pk in ids[1:]:
+            nouveau = numero_libre(Facture.objects.using(base), numero, pk)
+            Facture.objects.using(base).filter(pk=pk).update(numero=nouveau)
+            renommees.append(pk)
+    reindexer_factures(schema_editor.connection, renommees)
+
+
+def initialiser_sequences(apps, schema_editor):
+    """Fait démarrer chaque séquence après les numéros existants qui en ont la forme."""
+    Facture = apps.get_model('facture', 'Facture')
+    SequenceFacture = apps.get_model('facture', 'SequenceFacture')
+    base = schema_editor.connection.alias
+    maximums = {}
+    for numero in Facture.objects.using(base).values_list('numero', flat=True).iterator():
+        analyse = analyser_numero(numero)
+        if analyse is not None:
+            prefixe, annee, valeur = analyse
+            maximums[(prefixe, annee)] = max(valeur, maximums.get((prefixe, annee), 0))
+    SequenceFacture.objects.using(base).bulk_create([
+        SequenceFacture(prefixe=prefixe, annee=annee, dernier=valeur)
+        for (prefixe, annee), valeur in maximums.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facture', '0010_date_modification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SequenceFacture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefixe', models.CharField(max_length=20, verbose_name='Préfixe')),
+                ('annee', models.PositiveSmallIntegerField(verbose_name='Année')),
+                ('dernier', models.PositiveBigIntegerField(default=0, verbose_name='Dernière valeur attribuée')),
+            ],
+            options={
+                'verbose_name': 'Séquence de numérotation',
+                'verbose_name_plural': 'Séquences de numérotation',
+                'ordering': ['prefixe', 'annee'],
+                'constraints': [models.UniqueConstraint(fields=('prefixe', 'annee'), name='sequence_facture_unique')],
+            },
+        ),
+        migrations.RunPython(renommer_numeros_en_double, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='facture',
+            name='numero',
+            field=models.CharField(max_length=255, unique=True, verbose_name='Numéro de facture'),
+        ),
+        migrations.RunPython(initialiser_sequences, migrations.RunPython.noop),
+    ]
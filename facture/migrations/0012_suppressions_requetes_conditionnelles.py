@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facture', '0011_numerotation_factures'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DerniereSuppression',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modele', models.CharField(max_length=100, unique=True, verbose_name='Modèle')),
+                ('date', models.DateTimeField(verbose_name='Date de la dernière suppression')),
+            ],
+            options={
+                'verbose_name': 'Dernière suppression',
+                'verbose_name_plural': 'Dernières suppressions',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='categorie',
+            index=models.Index(fields=['date_modification'], name='categorie_date_modif_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['categorie', 'date_modification'], name='facture_categorie_modif_idx'),
+        ),
+    ]
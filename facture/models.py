@@ -1,15 +1,162 @@
-from django.db import models
+import re
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.db import IntegrityError, connections, models, router, transaction
 from django.utils import timezone
-from django.db.models import Q, Sum, Count
-from decimal import Decimal
+from django.db.models import Q, Sum, Count, F, OuterRef, Subquery, Case, When, Value
+from django.db.models.expressions import ExpressionWrapper, RawSQL
+from django.db.models.functions import (
+    Cast, Coalesce, Greatest, Round, TruncDay, TruncMonth, TruncQuarter, TruncWeek, TruncYear,
+)
+from django.db.models.lookups import GreaterThanOrEqual
+from decimal import Decimal, ROUND_HALF_UP
+
+from .asynchrone import executer
+from .cache_rapports import configuration_cache, invalider_rapports, rapport_en_cache
+from .routeurs import choisir_replica, configuration_routage
+from .recherche import TABLE_RECHERCHE, expression_match, index_utilisable, indexer_factures
+
+
+CENTIME = Decimal('0.01')
+
+
+def calculer_montants(montant_ht, taux_tva):
+    """
+    Retourne le couple (montant_tva, montant_ttc) d'un montant HT.
+    La TVA est arrondie au centime, demi-centime arrondi à l'opposé de zéro.
+    """
+    montant_ht, taux_tva = Decimal(str(montant_ht)), Decimal(str(taux_tva))
+    montant_tva = (montant_ht * taux_tva / 100).quantize(CENTIME, rounding=ROUND_HALF_UP)
+    return montant_tva, montant_ht + montant_tva
 
 
-class FactureQuerySet(models.QuerySet):
+def expressions_montants():
+    """
+    Retourne les expressions SQL (montant_tva, montant_ttc) équivalentes à
+    calculer_montants(). Le calcul est fait en entiers (centimes × centièmes
+    de pour cent) pour que l'arrondi soit exact, y compris sur SQLite qui
+    stocke les décimaux en virgule flottante.
+    """
+    entier = models.IntegerField()
+    centimes_ht = Cast(Round(F('montant_ht') * 100), entier)
+    # TVA en millionièmes d'euro : produit exact de deux entiers
+    produit = ExpressionWrapper(
+        centimes_ht * Cast(Round(F('taux_tva') * 100), entier), output_field=entier
+    )
+    centimes_tva = Case(
+        When(GreaterThanOrEqual(produit, 0), then=(produit + 5000) / 10000),
+        default=(produit - 5000) / 10000,
+        output_field=entier,
+    )
+    decimal = models.DecimalField(max_digits=10, decimal_places=2)
+    return (
+        ExpressionWrapper(centimes_tva / Value(100.0), output_field=decimal),
+        ExpressionWrapper((centimes_ht + centimes_tva) / Value(100.0), output_field=decimal),
+    )
+
+
+def debut_mois(jour):
+    """Premier jour du mois d'une date (date, datetime ou chaîne AAAA-MM-JJ)."""
+    if isinstance(jour, str):
+        jour = date.fromisoformat(jour[:10])
+    elif isinstance(jour, datetime):
+        jour = jour.date()
+    return jour.replace(day=1)
+
+
+def _debut_mois_suivant(jour, mois):
+    """Premier jour du mois situé `mois` mois après celui de `jour`."""
+    index = jour.year * 12 + jour.month - 1 + mois
+    return jour.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+# Granularités de statistiques_par_periode :
+# (fonction de troncature SQL, début de période, début de la période suivante)
+GRANULARITES = {
+    'jour': (TruncDay, lambda d: d, lambda d: d + timedelta(days=1)),
+    'semaine': (TruncWeek, lambda d: d - timedelta(days=d.weekday()), lambda d: d + timedelta(weeks=1)),
+    'mois': (TruncMonth, lambda d: d.replace(day=1), lambda d: _debut_mois_suivant(d, 1)),
+    'trimestre': (
+        TruncQuarter,
+        lambda d: d.replace(month=(d.month - 1) // 3 * 3 + 1, day=1),
+        lambda d: _debut_mois_suivant(d, 3),
+    ),
+    'annee': (TruncYear, lambda d: d.replace(month=1, day=1), lambda d: d.replace(year=d.year + 1)),
+}
+
+# Ventilations combinables avec statistiques_par_periode : champs groupés
+VENTILATIONS = {
+    'client': ('client_id', 'client__nom'),
+    'categorie': ('categorie_id', 'categorie__nom'),
+}
+
+
+# Catégorie de repli assignée aux factures sans catégorie
+NOM_CATEGORIE_AUTRES = 'Autres'
+COULEUR_CATEGORIE_AUTRES = '#6c757d'
+
+
+class InvalidationRapportsQuerySet(models.QuerySet):
+    """
+    QuerySet des modèles lus par les rapports de factures : les modifications
+    en masse, qui ne déclenchent pas les signaux, invalident le cache des rapports
+    et mettent à jour date_modification.
+    """
+
+    def update(self, **kwargs):
+        # auto_now n'est pas appliqué par update() : les requêtes conditionnelles
+        # (ETag / Last-Modified) doivent pourtant voir ces modifications
+        kwargs.setdefault('date_modification', timezone.now())
+        # Comme QuerySet.update() : self.db désigne alors la base d'écriture
+        self._for_write = True
+        lignes = super().update(**kwargs)
+        if lignes:
+            invalider_rapports(self.db)
+        return lignes
+
+    def delete(self):
+        self._for_write = True
+        resultat = super().delete()
+        if resultat[0]:
+            invalider_rapports(self.db)
+        return resultat
+
+
+class FactureQuerySet(InvalidationRapportsQuerySet):
     """
     QuerySet personnalisé pour le modèle Facture.
     Fournit des méthodes de filtrage et d'analyse avancées.
+    Les méthodes de rapport peuvent être mises en cache avec en_cache().
     """
 
+    # Durée de vie en cache des rapports ; None : cache désactivé
+    _timeout_cache = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._timeout_cache = self._timeout_cache
+        return clone
+
+    def en_cache(self, timeout=None):
+        """
+        Retourne une copie du QuerySet dont les rapports (totaux, statistiques,
+        classements) sont servis par le cache versionné (voir cache_rapports.py).
+        timeout : durée de vie des entrées, TTL configuré par défaut.
+        """
+        clone = self._chain()
+        clone._timeout_cache = configuration_cache()['TTL'] if timeout is None else timeout
+        return clone
+
+    def depuis_primaire(self):
+        """Force la lecture sur la base primaire (données tout juste écrites)."""
+        return self.using(configuration_routage()['PRIMAIRE'])
+
+    def depuis_replica(self):
+        """Force la lecture sur un réplica, même si la primaire est épinglée."""
+        return self.using(choisir_replica())
+
     def payees(self):
         """Retourne toutes les factures payées."""
         return self.filter(paye=True)
@@ -26,22 +173,107 @@ class FactureQuerySet(models.QuerySet):
         """Retourne toutes les factures d'une catégorie spécifique."""
         return self.filter(categorie_id=categorie_id)
 
+    def par_numero(self, numero):
+        """Retourne la facture de ce numéro (recherche exacte sur l'index unique)."""
+        return self.filter(numero=numero)
+
     def par_periode(self, date_debut, date_fin):
         """Retourne les factures dans une période donnée."""
         return self.filter(date__range=[date_debut, date_fin])
 
+    def filtrer(self, client=None, categorie=None, date_debut=None, date_fin=None):
+        """
+        Applique les filtres communs aux listes et exports de factures.
+        Les paramètres vides sont ignorés ; une période peut n'avoir qu'une borne.
+        """
+        queryset = self
+        if client:
+            queryset = queryset.par_client(client)
+        if categorie:
+            queryset = queryset.par_categorie(categorie)
+        if date_debut and date_fin:
+            queryset = queryset.par_periode(date_debut, date_fin)
+        elif date_debut:
+            queryset = queryset.filter(date__gte=date_debut)
+        elif date_fin:
+            queryset = queryset.filter(date__lte=date_fin)
+        return queryset
+
+    def apres_curseur(self, date, pk):
+        """Retourne les factures situées après (date, pk) dans l'ordre (-date, -id)."""
+        return self.filter(Q(date__lt=date) | Q(date=date, id__lt=pk))
+
+    def avant_curseur(self, date, pk):
+        """Retourne les factures situées avant (date, pk) dans l'ordre (-date, -id)."""
+        return self.filter(Q(date__gt=date) | Q(date=date, id__gt=pk))
+
+    def _rollups_equivalents(self, granularite='mois', date_debut=None, date_fin=None):
+        """
+        Retourne le QuerySet des agrégats mensuels (FactureRollupMensuel) qui
+        donne le même rapport que ce QuerySet, ou None s'il faut lire les
+        factures : QuerySet filtré, granularité plus fine que le mois ou
+        bornes de dates non alignées sur des mois entiers.
+        """
+        requete = self.query
+        if requete.where or requete.is_sliced or requete.combinator or requete.distinct:
+            return None
+        if granularite not in ('mois', 'trimestre', 'annee'):
+            return None
+        if date_debut is not None and date_debut != debut_mois(date_debut):
+            return None
+        if date_fin is not None and (date_fin + timedelta(days=1)).day != 1:
+            return None
+        return FactureRollupMensuel.objects.using(self.db).filtrer(date_debut=date_debut, date_fin=date_fin)
+
+    def _somme(self, champ):
+        """Somme d'un montant, lue dans les agrégats mensuels si possible."""
+        rollups = self._rollups_equivalents()
+        source = self if rollups is None else rollups
+        return source.aggregate(total=Sum(champ))['total'] or Decimal('0.00')
+
+    @rapport_en_cache
     def montant_total(self):
         """Calcule le montant total TTC de toutes les factures."""
-        return self.aggregate(total=Sum('montant_ttc'))['total'] or Decimal('0.00')
+        return self._somme('montant_ttc')
 
+    @rapport_en_cache
     def montant_ht_total(self):
         """Calcule le montant total HT de toutes les factures."""
-        return self.aggregate(total=Sum('montant_ht'))['total'] or Decimal('0.00')
+        return self._somme('montant_ht')
 
+    @rapport_en_cache
     def montant_tva_total(self):
         """Calcule le montant total de TVA de toutes les factures."""
-        return self.aggregate(total=Sum('montant_tva'))['total'] or Decimal('0.00')
+        return self._somme('montant_tva')
+
+    @rapport_en_cache
+    def tableau_de_bord(self):
+        """
+        Calcule en une seule requête les indicateurs du tableau de bord :
+        nombre de factures (total, payées, non payées), totaux TTC/HT/TVA
+        et solde restant dû. Sans filtre, lit les agrégats mensuels.
+        """
+        rollups = self._rollups_equivalents()
+        if rollups is None:
+            source, compter = self, lambda **filtre: Count('id', **filtre)
+        else:
+            source, compter = rollups, lambda **filtre: Sum('nombre', **filtre)
+        resultat = source.aggregate(
+            total_factures=compter(),
+            factures_payees=compter(filter=Q(paye=True)),
+            factures_non_payees=compter(filter=Q(paye=False)),
+            total_ttc=Sum('montant_ttc'),
+            total_ht=Sum('montant_ht'),
+            total_tva=Sum('montant_tva'),
+            solde_impaye=Sum('montant_ttc', filter=Q(paye=False)),
+        )
+        for cle in ('total_factures', 'factures_payees', 'factures_non_payees'):
+            resultat[cle] = resultat[cle] or 0
+        for cle in ('total_ttc', 'total_ht', 'total_tva', 'solde_impaye'):
+            resultat[cle] = resultat[cle] or Decimal('0.00')
+        return resultat
 
+    @rapport_en_cache
     def statistiques_par_categorie(self):
         """Retourne les statistiques groupées par catégorie."""
         return self.values('categorie__nom').annotate(
@@ -50,6 +282,7 @@ class FactureQuerySet(models.QuerySet):
             total_ttc=Sum('montant_ttc')
         ).order_by('-total_ttc')
 
+    @rapport_en_cache
     def statistiques_par_client(self):
         """Retourne les statistiques groupées par client."""
         return self.values('client__nom').annotate(
@@ -58,14 +291,267 @@ class FactureQuerySet(models.QuerySet):
             total_ttc=Sum('montant_ttc')
         ).order_by('-total_ttc')
 
+    @rapport_en_cache
+    def top_clients(self, limite=5):
+        """
+        Retourne les clients au plus gros chiffre d'affaires TTC parmi les
+        factures du QuerySet (client__nom, nombre, total_ttc).
+        Sans filtre, Facture.objects.top_clients() lit les compteurs dénormalisés.
+        """
+        return self.values('client__nom').annotate(
+            nombre=Count('id'),
+            total_ttc=Sum('montant_ttc')
+        ).order_by('-total_ttc')[:limite]
+
+    @rapport_en_cache
+    def top_categories(self, limite=5):
+        """
+        Retourne les catégories au plus gros chiffre d'affaires TTC parmi les
+        factures du QuerySet (categorie__nom, nombre, total_ttc).
+        Sans filtre, Facture.objects.top_categories() lit les compteurs dénormalisés.
+        """
+        return self.values('categorie__nom').annotate(
+            nombre=Count('id'),
+            total_ttc=Sum('montant_ttc')
+        ).order_by('-total_ttc')[:limite]
+
+    @rapport_en_cache
+    def statistiques_par_periode(self, granularite='mois', par=(), date_debut=None, date_fin=None):
+        """
+        Retourne, en une seule requête groupée, les statistiques par période
+        (granularite : 'jour', 'semaine', 'mois', 'trimestre' ou 'annee') :
+        nombre de factures et totaux HT, TVA, TTC, payé et impayé.
+
+        par ventile en plus les périodes par 'client' et/ou 'categorie'.
+        Les périodes sans facture sont complétées en Python avec des totaux
+        nuls, de date_debut à date_fin si elles sont fournies (ce qui filtre
+        aussi les factures), sinon de la première à la dernière période trouvée.
+        Sans autre filtre, les granularités mensuelles et plus larges sont lues
+        dans les agrégats mensuels plutôt que dans les factures.
+
+        Retourne une liste de dictionnaires triée par période puis ventilation.
+        """
+        if granularite not in GRANULARITES:
+            raise ValueError(f"Granularité inconnue : {granularite!r}")
+        if isinstance(par, str):
+            par = (par,)
+        inconnues = set(par) - VENTILATIONS.keys()
+        if inconnues:
+            raise ValueError(f"Ventilation inconnue : {', '.join(sorted(inconnues))}")
+
+        tronquer, debut_periode, periode_suivante = GRANULARITES[granularite]
+        champs = [champ for cle in par for champ in VENTILATIONS[cle]]
+
+        rollups = self._rollups_equivalents(granularite, date_debut, date_fin)
+        if rollups is None:
+            source = self.filtrer(date_debut=date_debut, date_fin=date_fin).annotate(periode=tronquer('date'))
+            nombre = Count('id')
+        else:
+            source = rollups.annotate(periode=tronquer('mois'))
+            nombre = Sum('nombre')
+        lignes = list(
+            source.values('periode', *champs)
+            .annotate(
+                nombre=nombre,
+                total_ht=Sum('montant_ht'),
+                total_tva=Sum('montant_tva'),
+                total_ttc=Sum('montant_ttc'),
+                total_paye=Sum('montant_ttc', filter=Q(paye=True)),
+                total_impaye=Sum('montant_ttc', filter=Q(paye=False)),
+            )
+            .order_by('periode', *champs)
+        )
+
+        # Remplissage dense : chaque ventilation reçoit toutes les périodes de l'intervalle
+        totaux = ('total_ht', 'total_tva', 'total_ttc', 'total_paye', 'total_impaye')
+        trouvees = {}
+        for ligne in lignes:
+            for cle in totaux:
+                ligne[cle] = ligne[cle] or Decimal('0.00')
+            trouvees[(ligne['periode'],) + tuple(ligne[champ] for champ in champs)] = ligne
+        if not trouvees and (par or date_debut is None or date_fin is None):
+            return []
+
+        premiere = debut_periode(date_debut) if date_debut else lignes[0]['periode']
+        derniere = debut_periode(date_fin) if date_fin else lignes[-1]['periode']
+        # Tri par nom (client, catégorie), les catégories vides en dernier
+        ventilations = sorted(
+            {cle[1:] for cle in trouvees},
+            key=lambda valeurs: [(v is None, str(v)) for v in valeurs[1::2] + valeurs[::2]],
+        ) or [()]
+
+        resultat = []
+        periode = premiere
+        while periode <= derniere:
+            for valeurs in ventilations:
+                ligne = trouvees.get((periode,) + valeurs)
+                if ligne is None:
+                    ligne = {'periode': periode, **dict(zip(champs, valeurs)), 'nombre': 0}
+                    ligne.update(dict.fromkeys(totaux, Decimal('0.00')))
+                resultat.append(ligne)
+            periode = periode_suivante(periode)
+        return resultat
+
+    # Variantes asynchrones des rapports : chacune s'exécute dans son propre
+    # thread (voir facture/asynchrone.py), et plusieurs rapports attendus avec
+    # asyncio.gather() sont calculés simultanément.
+    async def amontant_total(self):
+        return await executer(self.montant_total)
+
+    async def amontant_ht_total(self):
+        return await executer(self.montant_ht_total)
+
+    async def amontant_tva_total(self):
+        return await executer(self.montant_tva_total)
+
+    async def atableau_de_bord(self):
+        return await executer(self.tableau_de_bord)
+
+    async def astatistiques_par_categorie(self):
+        return await executer(self.statistiques_par_categorie)
+
+    async def astatistiques_par_client(self):
+        return await executer(self.statistiques_par_client)
+
+    async def astatistiques_par_periode(self, granularite='mois', **options):
+        return await executer(lambda: self.statistiques_par_periode(granularite, **options))
+
+    async def atop_clients(self, limite=5):
+        return await executer(lambda: self.top_clients(limite))
+
+    async def atop_categories(self, limite=5):
+        return await executer(lambda: self.top_categories(limite))
+
     def recherche_avancee(self, terme):
-        """Recherche avancée dans les numéros et noms de clients."""
-        return self.filter(
-            Q(numero__icontains=terme) |
-            Q(client__nom__icontains=terme) |
-            Q(client__email__icontains=terme)
+        """
+        Recherche avancée dans les numéros, noms et emails de clients.
+        Utilise l'index plein texte lorsque c'est possible : les résultats sont
+        alors classés par pertinence (bm25), puis par date décroissante.
+        """
+        terme = terme.strip()
+        if not index_utilisable(self.db, terme):
+            return self.filter(
+                Q(numero__icontains=terme) |
+                Q(client__nom__icontains=terme) |
+                Q(client__email__icontains=terme)
+            )
+
+        match = expression_match(terme)
+        correspondances = RawSQL(
+            f"SELECT rowid FROM {TABLE_RECHERCHE} WHERE {TABLE_RECHERCHE} MATCH %s", [match]
+        )
+        rang = RawSQL(
+            f"SELECT bm25({TABLE_RECHERCHE}) FROM {TABLE_RECHERCHE} "
+            f"WHERE {TABLE_RECHERCHE} MATCH %s AND rowid = facture_facture.id",
+            [match],
+            output_field=models.FloatField(),
+        )
+        return (
+            self.filter(id__in=correspondances)
+            .annotate(rang_recherche=rang)
+            .order_by('rang_recherche', '-date', '-id')
         )
 
+    # Champs dont la modification en masse impacte les compteurs dénormalisés
+    CHAMPS_MAJ_COMPTEURS = {
+        'client', 'client_id', 'categorie', 'categorie_id',
+        'montant_ht', 'taux_tva', 'montant_ttc', 'paye',
+    }
+
+    # Champs indexés par la recherche plein texte (voir recherche.py)
+    CHAMPS_MAJ_RECHERCHE = {'numero', 'client', 'client_id'}
+
+    # Champs dont la modification en masse impacte les agrégats mensuels
+    CHAMPS_MAJ_ROLLUP = CHAMPS_MAJ_COMPTEURS | {'date', 'montant_tva'}
+
+    def update(self, **kwargs):
+        """
+        Surcharge de update() pour maintenir les compteurs des clients et catégories
+        touchés (par exemple update(paye=True) depuis les actions d'administration)
+        et les agrégats mensuels : les totaux des lignes modifiées sont groupés en
+        base avant et après la mise à jour, sans charger les factures, et leur
+        différence est appliquée par delta. Les factures dont le numéro ou le
+        client change sont réindexées.
+        """
+        maj_compteurs = bool(self.CHAMPS_MAJ_COMPTEURS & kwargs.keys())
+        maj_recherche = bool(self.CHAMPS_MAJ_RECHERCHE & kwargs.keys())
+        maj_rollup = bool(self.CHAMPS_MAJ_ROLLUP & kwargs.keys())
+        if not (maj_compteurs or maj_recherche or maj_rollup):
+            return super().update(**kwargs)
+
+        self._for_write = True
+
+        with transaction.atomic(using=self.db):
+            ids = list(self.order_by().values_list('pk', flat=True))
+            # CHAMPS_MAJ_ROLLUP contient CHAMPS_MAJ_COMPTEURS
+            if maj_rollup:
+                avant = contributions_en_base(ids, self.db)
+            lignes = super().update(**kwargs)
+
+            if maj_rollup:
+                apres = contributions_en_base(ids, self.db)
+                FactureRollupMensuel.objects.db_manager(self.db).appliquer_contributions(apres, avant)
+            if maj_compteurs:
+                Client.objects.db_manager(self.db).appliquer_contributions(apres, avant)
+                Categorie.objects.db_manager(self.db).appliquer_contributions(apres, avant)
+            if maj_recherche:
+                indexer_factures(ids, using=self.db)
+        return lignes
+
+    def montants_incoherents(self):
+        """Retourne les factures dont la TVA ou le TTC stockés ne correspondent pas au HT."""
+        tva, ttc = expressions_montants()
+        return self.exclude(montant_tva=tva, montant_ttc=ttc)
+
+    def recalculer_montants(self, taille_lot=None):
+        """
+        Recalcule montant_tva et montant_ttc en base, en une requête UPDATE,
+        sans charger les factures. Seules les lignes incohérentes sont écrites ;
+        retourne leur nombre.
+
+        Avec taille_lot, la table est parcourue par tranches de clés primaires,
+        une transaction par tranche, pour ne pas verrouiller longtemps les très
+        grandes tables.
+        """
+        tva, ttc = expressions_montants()
+        if taille_lot is None:
+            return self.montants_incoherents().update(montant_tva=tva, montant_ttc=ttc)
+
+        cles = self.order_by('pk').values_list('pk', flat=True)
+        lignes, dernier = 0, None
+        while True:
+            tranche = self.montants_incoherents()
+            restantes = cles
+            if dernier is not None:
+                tranche = tranche.filter(pk__gt=dernier)
+                restantes = cles.filter(pk__gt=dernier)
+            # Dernière clé de la tranche, ou None pour la tranche finale
+            borne = restantes[taille_lot - 1:taille_lot].first()
+            if borne is not None:
+                tranche = tranche.filter(pk__lte=borne)
+            lignes += tranche.update(montant_tva=tva, montant_ttc=ttc)
+            if borne is None:
+                return lignes
+            dernier = borne
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Surcharge de bulk_create(), qui ne déclenche pas les signaux : les totaux
+        des factures créées, groupés en Python, sont ajoutés aux compteurs des
+        clients et catégories et aux agrégats mensuels, et les factures sont
+        indexées pour la recherche.
+        """
+        self._for_write = True
+        with transaction.atomic(using=self.db):
+            factures = super().bulk_create(objs, *args, **kwargs)
+            contributions = contributions_factures(factures)
+            Client.objects.db_manager(self.db).appliquer_contributions(contributions)
+            Categorie.objects.db_manager(self.db).appliquer_contributions(contributions)
+            FactureRollupMensuel.objects.db_manager(self.db).appliquer_contributions(contributions)
+            indexer_factures([f.pk for f in factures], using=self.db)
+            invalider_rapports(self.db)
+        return factures
+
 
 class FactureManager(models.Manager):
     """
@@ -78,6 +564,12 @@ class FactureManager(models.Manager):
         return FactureQuerySet(self.model, using=self._db)
 
     # Méthodes du QuerySet accessibles via le Manager
+    def depuis_primaire(self):
+        return self.get_queryset().depuis_primaire()
+
+    def depuis_replica(self):
+        return self.get_queryset().depuis_replica()
+
     def payees(self):
         return self.get_queryset().payees()
 
@@ -90,6 +582,9 @@ class FactureManager(models.Manager):
     def par_categorie(self, categorie_id):
         return self.get_queryset().par_categorie(categorie_id)
 
+    def par_numero(self, numero):
+        return self.get_queryset().par_numero(numero)
+
     def montant_total(self):
         return self.get_queryset().montant_total()
 
@@ -102,18 +597,32 @@ class FactureManager(models.Manager):
     def recherche_avancee(self, terme):
         return self.get_queryset().recherche_avancee(terme)
 
+    def filtrer(self, **filtres):
+        return self.get_queryset().filtrer(**filtres)
+
+    def tableau_de_bord(self):
+        return self.get_queryset().tableau_de_bord()
+
+    def en_cache(self, timeout=None):
+        return self.get_queryset().en_cache(timeout)
+
+    def statistiques_par_periode(self, granularite='mois', **options):
+        return self.get_queryset().statistiques_par_periode(granularite, **options)
+
+    def montants_incoherents(self):
+        return self.get_queryset().montants_incoherents()
+
+    def recalculer_montants(self, taille_lot=None):
+        return self.get_queryset().recalculer_montants(taille_lot=taille_lot)
+
     def creer_avec_categorie_autres(self, **kwargs):
         """
         Crée une facture en assignant automatiquement la catégorie 'Autres'
         si aucune catégorie n'est spécifiée.
         """
-        if 'categorie' not in kwargs or kwargs['categorie'] is None:
-            # Récupérer ou créer la catégorie 'Autres'
-            categorie, created = Categorie.objects.get_or_create(
-                nom='Autres',
-                defaults={'couleur': '#6c757d'}
-            )
-            kwargs['categorie'] = categorie
+        if kwargs.get('categorie') is None and kwargs.get('categorie_id') is None:
+            kwargs.pop('categorie', None)
+            kwargs['categorie_id'] = Categorie.objects.id_autres()
 
         return self.create(**kwargs)
 
@@ -136,15 +645,211 @@ class FactureManager(models.Manager):
         return self.get_queryset().par_periode(debut_annee, fin_annee)
 
     def top_clients(self, limite=5):
-        """Retourne les clients avec le plus de factures."""
-        return self.get_queryset().statistiques_par_client()[:limite]
+        """
+        Comme FactureQuerySet.top_clients() sur toutes les factures, mais lu
+        dans les compteurs dénormalisés de Client via un ORDER BY indexé.
+        """
+        return Client.objects.filter(nb_factures__gt=0).order_by('-total_ttc').values(
+            'total_ttc', client__nom=F('nom'), nombre=F('nb_factures'),
+        )[:limite]
 
     def top_categories(self, limite=5):
-        """Retourne les catégories avec le plus de factures."""
-        return self.get_queryset().statistiques_par_categorie()[:limite]
+        """
+        Comme FactureQuerySet.top_categories() sur toutes les factures, mais lu
+        dans les compteurs dénormalisés de Categorie via un ORDER BY indexé.
+        """
+        return Categorie.objects.filter(nb_factures__gt=0).order_by('-total_ttc').values(
+            'total_ttc', categorie__nom=F('nom'), nombre=F('nb_factures'),
+        )[:limite]
+
+    def amontant_total(self):
+        return self.get_queryset().amontant_total()
+
+    def amontant_ht_total(self):
+        return self.get_queryset().amontant_ht_total()
+
+    def amontant_tva_total(self):
+        return self.get_queryset().amontant_tva_total()
+
+    def atableau_de_bord(self):
+        return self.get_queryset().atableau_de_bord()
+
+    def astatistiques_par_periode(self, granularite='mois', **options):
+        return self.get_queryset().astatistiques_par_periode(granularite, **options)
+
+    async def atop_clients(self, limite=5):
+        return await executer(lambda: self.top_clients(limite))
+
+    async def atop_categories(self, limite=5):
+        return await executer(lambda: self.top_categories(limite))
+
+
+class CompteursManagerMixin:
+    """
+    Méthodes de maintenance des compteurs dénormalisés (nb_factures, total_ttc,
+    total_impaye) pour les modèles référencés par Facture.
+    L'attribut champ_facture désigne la clé étrangère correspondante sur Facture.
+    """
+
+    champ_facture = None
+
+    # Position de la clé étrangère dans une clé de contribution (voir cle_rollup())
+    POSITIONS_CLE = {'client': 1, 'categorie': 2}
+
+    def appliquer_contributions(self, ajoutees, retirees=None):
+        """
+        Applique aux compteurs la différence entre deux contributions de
+        factures (voir contributions_factures()), par un UPDATE relatif avec
+        F() pour chaque ligne touchée.
+        """
+        position = self.POSITIONS_CLE[self.champ_facture]
+        deltas = defaultdict(lambda: [0, Decimal('0.00'), Decimal('0.00')])
+        for signe, contributions in ((1, ajoutees), (-1, retirees or {})):
+            for cle, (nombre, _, _, montant_ttc) in contributions.items():
+                if cle[position] is None:
+                    continue
+                delta = deltas[cle[position]]
+                delta[0] += signe * nombre
+                delta[1] += signe * montant_ttc
+                if not cle[4]:
+                    delta[2] += signe * montant_ttc
+        for pk, (nombre, total_ttc, total_impaye) in deltas.items():
+            if nombre or total_ttc or total_impaye:
+                self.filter(pk=pk).update(
+                    nb_factures=F('nb_factures') + nombre,
+                    total_ttc=F('total_ttc') + total_ttc,
+                    total_impaye=F('total_impaye') + total_impaye,
+                )
+
+    def _expressions_compteurs(self):
+        """Sous-requêtes calculant les compteurs attendus de chaque ligne."""
+        factures = (
+            Facture.objects.filter(**{self.champ_facture: OuterRef('pk')})
+            .order_by().values(self.champ_facture)
+        )
+        zero = Decimal('0.00')
+        return {
+            'nb_factures': Coalesce(Subquery(factures.annotate(n=Count('id')).values('n')), 0),
+            'total_ttc': Coalesce(
+                Subquery(factures.annotate(t=Sum('montant_ttc')).values('t')), zero,
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            ),
+            'total_impaye': Coalesce(
+                Subquery(factures.filter(paye=False).annotate(t=Sum('montant_ttc')).values('t')), zero,
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            ),
+        }
+
+    def recalculer_compteurs(self, ids=None):
+        """
+        Recalcule les compteurs en une seule requête UPDATE.
+        Si ids est fourni, seules ces lignes sont recalculées.
+        Retourne le nombre de lignes mises à jour.
+        """
+        queryset = self.get_queryset()
+        if ids is not None:
+            ids = [pk for pk in ids if pk is not None]
+            if not ids:
+                return 0
+            queryset = queryset.filter(pk__in=ids)
+        return queryset.update(**self._expressions_compteurs())
+
+    def incoherents(self):
+        """Retourne les lignes dont les compteurs stockés diffèrent des valeurs réelles."""
+        attendus = {f'attendu_{cle}': expr for cle, expr in self._expressions_compteurs().items()}
+        return self.get_queryset().annotate(**attendus).filter(
+            ~Q(nb_factures=F('attendu_nb_factures')) |
+            ~Q(total_ttc=F('attendu_total_ttc')) |
+            ~Q(total_impaye=F('attendu_total_impaye'))
+        )
 
 
-class Categorie(models.Model):
+class ClientManager(CompteursManagerMixin, models.Manager):
+    """Manager personnalisé pour le modèle Client."""
+
+    champ_facture = 'client'
+
+    def get_queryset(self):
+        return InvalidationRapportsQuerySet(self.model, using=self._db)
+
+
+class CategorieManager(CompteursManagerMixin, models.Manager):
+    """
+    Manager personnalisé pour le modèle Categorie.
+    Résout la catégorie de repli 'Autres' en gardant son identifiant en cache
+    dans le processus, pour éviter une requête à chaque enregistrement de facture.
+    """
+
+    champ_facture = 'categorie'
+    _id_autres = None
+    _verrou_autres = threading.Lock()
+
+    def get_queryset(self):
+        return InvalidationRapportsQuerySet(self.model, using=self._db)
+
+    def id_autres(self):
+        """
+        Retourne l'identifiant de la catégorie 'Autres', en la créant si besoin.
+        Le cache n'est alimenté qu'une fois la transaction courante validée,
+        pour ne jamais retenir l'identifiant d'une ligne annulée.
+        """
+        id_autres = CategorieManager._id_autres
+        if id_autres is not None:
+            return id_autres
+
+        with CategorieManager._verrou_autres:
+            if CategorieManager._id_autres is not None:
+                return CategorieManager._id_autres
+            # La contrainte d'unicité sur 'Autres' fait échouer l'INSERT concurrent,
+            # que get_or_create rattrape en relisant la ligne créée par l'autre processus.
+            categorie, created = self.get_or_create(
+                nom=NOM_CATEGORIE_AUTRES,
+                defaults={'couleur': COULEUR_CATEGORIE_AUTRES}
+            )
+            transaction.on_commit(
+                lambda: setattr(CategorieManager, '_id_autres', categorie.pk),
+                using=self.db,
+            )
+            return categorie.pk
+
+    def invalider_cache_autres(self):
+        """Oublie l'identifiant de la catégorie 'Autres' mis en cache."""
+        CategorieManager._id_autres = None
+
+
+class CompteursFactures(models.Model):
+    """
+    Compteurs dénormalisés des factures rattachées à un client ou une catégorie.
+    Maintenus de manière incrémentale par les signaux de Facture et par
+    FactureQuerySet.update() ; reconstructibles via `manage.py recalculer_compteurs`.
+    """
+    nb_factures = models.PositiveIntegerField(default=0, editable=False,
+                                              verbose_name="Nombre de factures")
+    total_ttc = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'),
+                                    editable=False, verbose_name="Total TTC")
+    total_impaye = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'),
+                                       editable=False, verbose_name="Total impayé")
+
+    CHAMPS_COMPTEURS = ('nb_factures', 'total_ttc', 'total_impaye')
+
+    def save(self, *args, **kwargs):
+        """
+        N'écrit jamais les compteurs lors de la mise à jour d'une ligne existante :
+        les valeurs en mémoire peuvent être périmées, seuls les signaux et
+        recalculer_compteurs() les modifient.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                champ.name for champ in self._meta.concrete_fields
+                if not champ.primary_key and champ.name not in self.CHAMPS_COMPTEURS
+            ]
+        super().save(*args, **kwargs)
+
+    class Meta:
+        abstract = True
+
+
+class Categorie(CompteursFactures):
     """
     Modèle représentant une catégorie de facture.
     Permet d'organiser les factures par type de service ou produit.
@@ -152,6 +857,10 @@ class Categorie(models.Model):
     nom = models.CharField(max_length=255, verbose_name="Nom de la catégorie")
     couleur = models.CharField(max_length=7, verbose_name="Couleur d'affichage",
                               help_text="Code couleur hexadécimal (ex: #FF5733)")
+    date_modification = models.DateTimeField(auto_now=True, verbose_name="Date de modification")
+
+    # Manager personnalisé
+    objects = CategorieManager()
 
     def __str__(self):
         return self.nom
@@ -160,9 +869,22 @@ class Categorie(models.Model):
         verbose_name = "Catégorie"
         verbose_name_plural = "Catégories"
         ordering = ['nom']
+        indexes = [
+            models.Index(fields=['-total_ttc'], name='categorie_total_ttc_idx'),
+            # max(date_modification) des requêtes conditionnelles (voir conditionnel.py)
+            models.Index(fields=['date_modification'], name='categorie_date_modif_idx'),
+        ]
+        constraints = [
+            # Une seule catégorie de repli, même sous créations concurrentes
+            models.UniqueConstraint(
+                fields=['nom'],
+                condition=Q(nom=NOM_CATEGORIE_AUTRES),
+                name='categorie_autres_unique',
+            ),
+        ]
 
 
-class Client(models.Model):
+class Client(CompteursFactures):
     """
     Modèle représentant un client.
     Stocke les informations de contact et de facturation.
@@ -172,6 +894,29 @@ class Client(models.Model):
     telephone = models.CharField(max_length=20, blank=True, null=True, verbose_name="Téléphone")
     adresse = models.TextField(blank=True, null=True, verbose_name="Adresse")
     date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    date_modification = models.DateTimeField(auto_now=True, verbose_name="Date de modification")
+
+    # Manager personnalisé
+    objects = ClientManager()
+
+    # Champs du client indexés avec ses factures pour la recherche plein texte
+    CHAMPS_RECHERCHE = ('nom', 'email')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Mémorise les champs indexés tels que chargés, pour ne réindexer
+        les factures du client que si l'un d'eux change.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._valeurs_recherche = instance.valeurs_recherche()
+        return instance
+
+    def valeurs_recherche(self):
+        """Retourne (nom, email), ou None si l'un de ces champs n'est pas chargé."""
+        if not all(champ in self.__dict__ for champ in self.CHAMPS_RECHERCHE):
+            return None
+        return tuple(getattr(self, champ) for champ in self.CHAMPS_RECHERCHE)
 
     def __str__(self):
         return self.nom
@@ -180,6 +925,11 @@ class Client(models.Model):
         verbose_name = "Client"
         verbose_name_plural = "Clients"
         ordering = ['nom']
+        indexes = [
+            models.Index(fields=['-total_ttc'], name='client_total_ttc_idx'),
+            # max(date_modification) des requêtes conditionnelles (voir conditionnel.py)
+            models.Index(fields=['date_modification'], name='client_date_modif_idx'),
+        ]
 
 
 class Facture(models.Model):
@@ -187,7 +937,8 @@ class Facture(models.Model):
     Modèle principal représentant une facture.
     Gère automatiquement les calculs de TVA et TTC.
     """
-    numero = models.CharField(max_length=255, verbose_name="Numéro de facture")
+    # Unique : recherche exacte par numéro sur l'index, numéros attribués par SequenceFacture
+    numero = models.CharField(max_length=255, unique=True, verbose_name="Numéro de facture")
     date = models.DateField(verbose_name="Date de facturation")
     montant_ht = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Montant HT")
     taux_tva = models.DecimalField(max_digits=5, decimal_places=2, default=20.00,
@@ -200,18 +951,57 @@ class Facture(models.Model):
     categorie = models.ForeignKey(Categorie, on_delete=models.CASCADE,
                                  null=True, blank=True, verbose_name="Catégorie")
     paye = models.BooleanField(default=False, verbose_name="Payée")
+    date_modification = models.DateTimeField(auto_now=True, verbose_name="Date de modification")
 
     # Manager personnalisé
     objects = FactureManager()
 
+    # Champs dont dépendent les compteurs dénormalisés de Client et Categorie
+    CHAMPS_COMPTEURS = ('client_id', 'categorie_id', 'montant_ttc', 'paye')
+
+    # Champs dont dépendent les agrégats mensuels (FactureRollupMensuel)
+    CHAMPS_ROLLUP = (
+        'date', 'client_id', 'categorie_id', 'taux_tva', 'paye',
+        'montant_ht', 'montant_tva', 'montant_ttc',
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Mémorise l'état chargé depuis la base, pour que les signaux puissent
+        calculer les deltas des compteurs sans relire la ligne.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._etat_compteurs = instance.etat_compteurs()
+        instance._etat_rollup = instance.etat_rollup()
+        return instance
+
+    def _etat(self, champs):
+        if not all(champ in self.__dict__ for champ in champs):
+            return None
+        return tuple(getattr(self, champ) for champ in champs)
+
+    def etat_compteurs(self):
+        """
+        Retourne (client_id, categorie_id, montant_ttc, paye),
+        ou None si l'un de ces champs n'est pas chargé.
+        """
+        return self._etat(self.CHAMPS_COMPTEURS)
+
+    def etat_rollup(self):
+        """
+        Retourne les valeurs de CHAMPS_ROLLUP,
+        ou None si l'un de ces champs n'est pas chargé.
+        """
+        return self._etat(self.CHAMPS_ROLLUP)
+
     def save(self, *args, **kwargs):
         """
         Surcharge de la méthode save pour calculer automatiquement
         la TVA et le TTC avant la sauvegarde.
         """
         # Calculer automatiquement la TVA et le TTC
-        self.montant_tva = (self.montant_ht * self.taux_tva) / 100
-        self.montant_ttc = self.montant_ht + self.montant_tva
+        self.montant_tva, self.montant_ttc = calculer_montants(self.montant_ht, self.taux_tva)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -221,6 +1011,463 @@ class Facture(models.Model):
         verbose_name = "Facture"
         verbose_name_plural = "Factures"
         ordering = ['-date', '-id']
+        indexes = [
+            # Tri par défaut et pagination par curseur (-date, -id), par_periode
+            models.Index(fields=['date', 'id'], name='facture_date_id_idx'),
+            # par_client / par_categorie triés par date, recalcul des compteurs
+            models.Index(fields=['client', 'date', 'id'], name='facture_client_date_idx'),
+            models.Index(fields=['categorie', 'date', 'id'], name='facture_categorie_date_idx'),
+            # non_payees() : index partiels limités aux factures impayées
+            models.Index(fields=['date', 'id'], condition=Q(paye=False),
+                         name='facture_impayees_date_idx'),
+            models.Index(fields=['client', 'date'], condition=Q(paye=False),
+                         name='facture_impayees_client_idx'),
+            # max(date_modification) des requêtes conditionnelles (voir conditionnel.py)
+            models.Index(fields=['date_modification'], name='facture_date_modif_idx'),
+            models.Index(fields=['client', 'date_modification'], name='facture_client_modif_idx'),
+            models.Index(fields=['categorie', 'date_modification'], name='facture_categorie_modif_idx'),
+        ]
+
+
+class FactureRollupMensuelQuerySet(models.QuerySet):
+    """QuerySet des agrégats mensuels de factures."""
+
+    def filtrer(self, client=None, categorie=None, date_debut=None, date_fin=None):
+        """
+        Applique les mêmes filtres que FactureQuerySet.filtrer(), les bornes de
+        dates étant ramenées aux mois qui les contiennent.
+        """
+        queryset = self
+        if client:
+            queryset = queryset.filter(client_id=client)
+        if categorie:
+            queryset = queryset.filter(categorie_id=categorie)
+        if date_debut:
+            queryset = queryset.filter(mois__gte=debut_mois(date_debut))
+        if date_fin:
+            queryset = queryset.filter(mois__lte=debut_mois(date_fin))
+        return queryset
+
+
+# Taille des tranches d'identifiants des requêtes pk__in (limite de paramètres SQLite)
+TAILLE_TRANCHE_IDS = 500
+
+
+def cle_rollup(jour, client_id, categorie_id, taux_tva, paye):
+    """Clé (mois, client_id, categorie_id, taux_tva, paye) de la ligne d'agrégat d'une facture."""
+    return (debut_mois(jour), client_id, categorie_id, Decimal(str(taux_tva)).quantize(CENTIME), bool(paye))
+
+
+def _contributions_vides():
+    return defaultdict(lambda: [0, Decimal('0.00'), Decimal('0.00'), Decimal('0.00')])
+
+
+def _ajouter_ligne(contributions, cle, nombre, *montants):
+    ligne = contributions[cle]
+    ligne[0] += nombre
+    for indice, montant in enumerate(montants, start=1):
+        # Arrondi au centime : SQLite somme les décimaux en virgule flottante
+        ligne[indice] += Decimal(str(montant)).quantize(CENTIME)
+
+
+def contributions_factures(factures):
+    """
+    Contributions de factures (instances) aux agrégats mensuels, calculées
+    en Python : {clé de rollup: [nombre, montant_ht, montant_tva, montant_ttc]}.
+    """
+    contributions = _contributions_vides()
+    for facture in factures:
+        _ajouter_ligne(
+            contributions,
+            cle_rollup(facture.date, facture.client_id, facture.categorie_id, facture.taux_tva, facture.paye),
+            1, facture.montant_ht, facture.montant_tva, facture.montant_ttc,
+        )
+    return contributions
+
+
+def contributions_en_base(ids, using):
+    """
+    Contributions des factures ids aux agrégats mensuels, agrégées en base
+    (GROUP BY, par tranches de TAILLE_TRANCHE_IDS identifiants).
+    """
+    contributions = _contributions_vides()
+    for debut in range(0, len(ids), TAILLE_TRANCHE_IDS):
+        lignes = (
+            Facture.objects.using(using).filter(pk__in=ids[debut:debut + TAILLE_TRANCHE_IDS]).order_by()
+            .annotate(debut_mois=TruncMonth('date'))
+            .values_list('debut_mois', 'client_id', 'categorie_id', 'taux_tva', 'paye')
+            .annotate(Count('id'), Sum('montant_ht'), Sum('montant_tva'), Sum('montant_ttc'))
+        )
+        for mois, client_id, categorie_id, taux_tva, paye, *totaux in lignes:
+            _ajouter_ligne(contributions, cle_rollup(mois, client_id, categorie_id, taux_tva, paye), *totaux)
+    return contributions
+
+
+class FactureRollupMensuelManager(models.Manager):
+    """
+    Manager des agrégats mensuels : application des deltas calculés par les
+    signaux et les opérations en masse de FactureQuerySet, et reconstruction
+    ensembliste depuis les factures (commande reconstruire_rollups).
+    """
+
+    def get_queryset(self):
+        return FactureRollupMensuelQuerySet(self.model, using=self._db)
+
+    def filtrer(self, **filtres):
+        return self.get_queryset().filtrer(**filtres)
+
+    def reconstruire(self, mois=None):
+        """
+        Reconstruit les agrégats depuis les factures : tous, ou seulement ceux
+        des mois donnés (premiers jours de mois). Retourne le nombre de lignes créées.
+        """
+        using = self._db or router.db_for_write(self.model)
+        factures = Facture.objects.using(using)
+        rollups = self.get_queryset().using(using)
+        if mois is not None:
+            mois = sorted({debut_mois(m) for m in mois if m})
+            if not mois:
+                return 0
+            periodes = Q()
+            for debut in mois:
+                periodes |= Q(date__gte=debut, date__lt=_debut_mois_suivant(debut, 1))
+            factures = factures.filter(periodes)
+            rollups = rollups.filter(mois__in=mois)
+
+        agregats = (
+            factures.order_by()
+            .annotate(debut_mois=TruncMonth('date'))
+            .values('debut_mois', 'client_id', 'categorie_id', 'taux_tva', 'paye')
+            .annotate(
+                nb=Count('id'), somme_ht=Sum('montant_ht'),
+                somme_tva=Sum('montant_tva'), somme_ttc=Sum('montant_ttc'),
+            )
+        )
+        with transaction.atomic(using=using):
+            rollups.delete()
+            lignes = self.db_manager(using).bulk_create([
+                self.model(
+                    mois=ligne['debut_mois'], client_id=ligne['client_id'],
+                    categorie_id=ligne['categorie_id'], taux_tva=ligne['taux_tva'],
+                    paye=ligne['paye'], nombre=ligne['nb'], montant_ht=ligne['somme_ht'],
+                    montant_tva=ligne['somme_tva'], montant_ttc=ligne['somme_ttc'],
+                )
+                for ligne in agregats
+            ], batch_size=1000)
+        return len(lignes)
+
+    def ecarts(self):
+        """
+        Compare les agrégats stockés à ceux recalculés depuis les factures.
+        Retourne la liste des (clé, stocké, attendu) qui diffèrent, où clé est
+        (mois, client_id, categorie_id, taux_tva, paye) et les valeurs
+        (nombre, montant_ht, montant_tva, montant_ttc) ou None si absentes.
+        """
+        cle = ('mois', 'client_id', 'categorie_id', 'taux_tva', 'paye')
+
+        def valeurs(ligne):
+            # Arrondi au centime : SQLite somme les décimaux en virgule flottante
+            return (ligne[5],) + tuple(Decimal(m).quantize(CENTIME) for m in ligne[6:])
+
+        stockes = {
+            ligne[:5]: valeurs(ligne)
+            for ligne in self.get_queryset().values_list(
+                *cle, 'nombre', 'montant_ht', 'montant_tva', 'montant_ttc'
+            )
+        }
+        attendus = {
+            ligne[:5]: valeurs(ligne)
+            for ligne in Facture.objects.using(self.db).order_by()
+            .annotate(debut_mois=TruncMonth('date'))
+            .values_list('debut_mois', *cle[1:])
+            .annotate(Count('id'), Sum('montant_ht'), Sum('montant_tva'), Sum('montant_ttc'))
+        }
+        return [
+            (cle, stockes.get(cle), attendus.get(cle))
+            for cle in sorted(stockes.keys() | attendus.keys(), key=str)
+            if stockes.get(cle) != attendus.get(cle)
+        ]
+
+    def appliquer_delta(self, cle, nombre, montant_ht, montant_tva, montant_ttc):
+        """
+        Ajoute un delta à la ligne d'agrégat identifiée par cle
+        (mois, client_id, categorie_id, taux_tva, paye), en la créant si besoin.
+        Les lignes retombées à zéro facture sont supprimées.
+        """
+        mois, client_id, categorie_id, taux_tva, paye = cle
+        ligne = self.filter(
+            mois=mois, client_id=client_id, categorie_id=categorie_id, taux_tva=taux_tva, paye=paye,
+        )
+        increments = dict(
+            nombre=F('nombre') + nombre,
+            montant_ht=F('montant_ht') + montant_ht,
+            montant_tva=F('montant_tva') + montant_tva,
+            montant_ttc=F('montant_ttc') + montant_ttc,
+        )
+        if ligne.update(**increments):
+            if nombre < 0:
+                ligne.filter(nombre__lte=0).delete()
+            return
+        if nombre <= 0:
+            # Ligne déjà supprimée (par exemple en cascade avec son client)
+            return
+        try:
+            with transaction.atomic(using=self.db):
+                self.create(
+                    mois=mois, client_id=client_id, categorie_id=categorie_id, taux_tva=taux_tva,
+                    paye=paye, nombre=nombre, montant_ht=montant_ht,
+                    montant_tva=montant_tva, montant_ttc=montant_ttc,
+                )
+        except IntegrityError:
+            # Ligne créée entre-temps par une transaction concurrente
+            ligne.update(**increments)
+
+    def appliquer_contributions(self, ajoutees, retirees=None):
+        """
+        Applique aux agrégats la différence entre deux contributions
+        ({clé: [nombre, montant_ht, montant_tva, montant_ttc]}), une ligne
+        d'agrégat à la fois avec appliquer_delta().
+        """
+        deltas = _contributions_vides()
+        for signe, contributions in ((1, ajoutees), (-1, retirees or {})):
+            for cle, valeurs in contributions.items():
+                for indice, valeur in enumerate(valeurs):
+                    deltas[cle][indice] += signe * valeur
+        # Retraits d'abord : une ligne vidée est supprimée avant d'éventuelles créations
+        for cle, delta in sorted(deltas.items(), key=lambda element: element[1][0]):
+            if any(delta):
+                self.appliquer_delta(cle, *delta)
+
+
+class FactureRollupMensuel(models.Model):
+    """
+    Agrégat mensuel des factures par client, catégorie, taux de TVA et statut
+    de paiement. Maintenu par delta à chaque écriture de facture (voir
+    signals.py), il permet aux rapports pluriannuels de lire quelques milliers
+    de lignes au lieu de l'ensemble des factures.
+    """
+    mois = models.DateField(verbose_name="Mois")
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, verbose_name="Client")
+    categorie = models.ForeignKey(Categorie, on_delete=models.CASCADE,
+                                  null=True, blank=True, verbose_name="Catégorie")
+    taux_tva = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="Taux TVA (%)")
+    paye = models.BooleanField(verbose_name="Payée")
+    nombre = models.IntegerField(default=0, verbose_name="Nombre de factures")
+    montant_ht = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Montant HT")
+    montant_tva = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Montant TVA")
+    montant_ttc = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Montant TTC")
+
+    objects = FactureRollupMensuelManager()
+
+    def __str__(self):
+        return f"{self.mois:%Y-%m} - {self.client_id} - {self.nombre} facture(s)"
+
+    class Meta:
+        verbose_name = "Agrégat mensuel de factures"
+        verbose_name_plural = "Agrégats mensuels de factures"
+        ordering = ['mois']
+        indexes = [
+            models.Index(fields=['mois', 'client'], name='rollup_mensuel_mois_idx'),
+        ]
+        constraints = [
+            # categorie est nullable : une contrainte par cas, NULL n'étant pas unique
+            models.UniqueConstraint(
+                fields=['mois', 'client', 'categorie', 'taux_tva', 'paye'],
+                condition=Q(categorie__isnull=False), name='rollup_mensuel_unique',
+            ),
+            models.UniqueConstraint(
+                fields=['mois', 'client', 'taux_tva', 'paye'],
+                condition=Q(categorie__isnull=True), name='rollup_mensuel_sans_categorie_unique',
+            ),
+        ]
+
+
+# Numérotation des factures : PREFIXE-AAAA-NNNNNN (voir SequenceFacture)
+PREFIXE_NUMERO_PAR_DEFAUT = 'FAC'
+CHIFFRES_NUMERO = 6
+NUMERO_SEQUENCE = re.compile(r'^(?P<prefixe>.+)-(?P<annee>\d{4})-(?P<valeur>\d+)$')
+
+
+def formater_numero(prefixe, annee, valeur):
+    """Numéro de facture de rang valeur dans la séquence (prefixe, annee)."""
+    return f"{prefixe}-{annee}-{valeur:0{CHIFFRES_NUMERO}d}"
+
+
+def analyser_numero(numero):
+    """
+    Retourne (prefixe, annee, valeur) si numero a exactement la forme produite
+    par formater_numero(), None sinon.
+    """
+    correspondance = NUMERO_SEQUENCE.match(numero)
+    if correspondance is None:
+        return None
+    prefixe, annee, valeur = correspondance['prefixe'], int(correspondance['annee']), int(correspondance['valeur'])
+    if len(prefixe) > SequenceFacture._meta.get_field('prefixe').max_length:
+        return None
+    if formater_numero(prefixe, annee, valeur) != numero:
+        return None
+    return prefixe, annee, valeur
+
+
+class SequenceFactureManager(models.Manager):
+    """
+    Attribution des numéros de factures, sans doublon ni trou.
+
+    Chaque réservation est un seul UPDATE ... RETURNING sur la ligne de la
+    séquence (UPDATE puis SELECT sous le même verrou sur les autres bases) :
+    le verrou de la ligne sérialise les réservations concurrentes, et il est
+    gardé jusqu'à la fin de la transaction appelante. Réserver dans la même
+    transaction que la création des factures garantit donc l'absence de trou :
+    une création annulée rend ses numéros.
+    """
+
+    def _base(self):
+        return self._db or router.db_for_write(self.model)
+
+    def reserver(self, prefixe, annee, nombre=1):
+        """
+        Réserve nombre valeurs consécutives de la séquence (prefixe, annee),
+        en une requête, et retourne leur range.
+        """
+        if nombre < 1:
+            raise ValueError("Le nombre de valeurs à réserver doit être strictement positif.")
+        base = self._base()
+        dernier = self._incrementer(base, prefixe, annee, nombre)
+        if dernier is None:
+            try:
+                with transaction.atomic(using=base):
+                    self.db_manager(base).create(prefixe=prefixe, annee=annee, dernier=nombre)
+                dernier = nombre
+            except IntegrityError:
+                # Séquence créée entre-temps par une transaction concurrente
+                dernier = self._incrementer(base, prefixe, annee, nombre)
+        return range(dernier - nombre + 1, dernier + 1)
+
+    def _incrementer(self, base, prefixe, annee, nombre):
+        """Ajoute nombre à la séquence et retourne sa nouvelle valeur, None si elle n'existe pas."""
+        connexion = connections[base]
+        if connexion.vendor == 'postgresql' or (
+            connexion.vendor == 'sqlite' and connexion.Database.sqlite_version_info >= (3, 35)
+        ):
+            table = connexion.ops.quote_name(self.model._meta.db_table)
+            with connexion.cursor() as curseur:
+                curseur.execute(
+                    f"UPDATE {table} SET dernier = dernier + %s WHERE prefixe = %s AND annee = %s RETURNING dernier",
+                    [nombre, prefixe, annee],
+                )
+                ligne = curseur.fetchone()
+            return ligne[0] if ligne else None
+        # UPDATE puis SELECT dans une transaction : la valeur lue est la nôtre, la ligne restant verrouillée
+        sequence = self.db_manager(base).filter(prefixe=prefixe, annee=annee)
+        with transaction.atomic(using=base):
+            if not sequence.update(dernier=F('dernier') + nombre):
+                return None
+            return sequence.values_list('dernier', flat=True).get()
+
+    def numeros(self, prefixe, annee, nombre=1):
+        """
+        Réserve et retourne nombre numéros de factures formatés. Les numéros
+        déjà portés par une facture (saisis à la main) sont sautés : une
+        requête sur l'index unique de Facture.numero le vérifie.
+        """
+        base = self._base()
+        resultat = []
+        with transaction.atomic(using=base):
+            while len(resultat) < nombre:
+                candidats = [
+                    formater_numero(prefixe, annee, valeur)
+                    for valeur in self.reserver(prefixe, annee, nombre - len(resultat))
+                ]
+                pris = set(Facture.objects.using(base).filter(numero__in=candidats).values_list('numero', flat=True))
+                resultat.extend(numero for numero in candidats if numero not in pris)
+        return resultat
+
+    def prochain_numero(self, annee=None, prefixe=PREFIXE_NUMERO_PAR_DEFAUT):
+        """Réserve et retourne le prochain numéro de facture de l'année (en cours par défaut)."""
+        if annee is None:
+            annee = timezone.now().year
+        return self.numeros(prefixe, annee)[0]
+
+    def recaler(self, numeros):
+        """
+        Avance les séquences au-delà des numéros donnés qui en ont la forme
+        (factures importées ou saisies avec leur numéro). Une requête par
+        séquence concernée.
+        """
+        maximums = {}
+        for numero in numeros:
+            analyse = analyser_numero(numero)
+            if analyse is not None:
+                prefixe, annee, valeur = analyse
+                maximums[(prefixe, annee)] = max(valeur, maximums.get((prefixe, annee), 0))
+        base = self._base()
+        for (prefixe, annee), valeur in maximums.items():
+            sequence = self.db_manager(base).filter(prefixe=prefixe, annee=annee)
+            if sequence.update(dernier=Greatest('dernier', Value(valeur))):
+                continue
+            try:
+                with transaction.atomic(using=base):
+                    self.db_manager(base).create(prefixe=prefixe, annee=annee, dernier=valeur)
+            except IntegrityError:
+                sequence.update(dernier=Greatest('dernier', Value(valeur)))
+
+
+class SequenceFacture(models.Model):
+    """
+    Compteur de numérotation des factures, par préfixe et par année : la
+    dernière valeur attribuée. Les numéros sont attribués par
+    SequenceFacture.objects.numeros() / prochain_numero(), sans parcourir
+    les factures existantes.
+    """
+    prefixe = models.CharField(max_length=20, verbose_name="Préfixe")
+    annee = models.PositiveSmallIntegerField(verbose_name="Année")
+    dernier = models.PositiveBigIntegerField(default=0, verbose_name="Dernière valeur attribuée")
+
+    objects = SequenceFactureManager()
+
+    def __str__(self):
+        return f"{self.prefixe}-{self.annee} : {self.dernier}"
+
+    class Meta:
+        verbose_name = "Séquence de numérotation"
+        verbose_name_plural = "Séquences de numérotation"
+        ordering = ['prefixe', 'annee']
+        constraints = [
+            models.UniqueConstraint(fields=['prefixe', 'annee'], name='sequence_facture_unique'),
+        ]
+
+
+class DerniereSuppressionManager(models.Manager):
+    """Manager des dates de dernière suppression."""
+
+    def marquer(self, modele):
+        """Enregistre qu'une ligne du modèle donné vient d'être supprimée."""
+        base = self._db or router.db_for_write(self.model)
+        date_suppression = timezone.now()
+        if not self.db_manager(base).filter(modele=modele._meta.label_lower).update(date=date_suppression):
+            self.db_manager(base).update_or_create(
+                modele=modele._meta.label_lower, defaults={'date': date_suppression},
+            )
+
+
+class DerniereSuppression(models.Model):
+    """
+    Date de la dernière suppression d'une ligne, par modèle : le max() de
+    date_modification des lignes restantes ne change pas lorsqu'une ligne
+    disparaît. Mise à jour par les signaux post_delete, lue par les requêtes
+    conditionnelles (voir conditionnel.py).
+    """
+    modele = models.CharField(max_length=100, unique=True, verbose_name="Modèle")
+    date = models.DateTimeField(verbose_name="Date de la dernière suppression")
+
+    objects = DerniereSuppressionManager()
+
+    def __str__(self):
+        return f"{self.modele} : {self.date}"
+
+    class Meta:
+        verbose_name = "Dernière suppression"
+        verbose_name_plural = "Dernières suppressions"
 
 
 class LogCreationFacture(models.Model):
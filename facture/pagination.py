@@ -0,0 +1,104 @@
+"""
+Pagination par curseur (keyset / seek) pour les listes de factures.
+
+Contrairement à la pagination par OFFSET, chaque page est obtenue en filtrant
+sur la clé de tri ``(-date, -id)`` à partir de la dernière facture affichée.
+Le coût d'une page profonde est donc identique à celui de la première page.
+"""
+import base64
+import binascii
+from datetime import date
+
+from django.http import Http404
+
+
+def encoder_curseur(date_facture, pk):
+    """Encode la position ``(date, id)`` d'une facture en curseur opaque."""
+    brut = f"{date_facture.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(brut).decode().rstrip('=')
+
+
+def decoder_curseur(curseur):
+    """
+    Décode un curseur opaque en tuple ``(date, id)``.
+    Lève ValueError si le curseur est invalide.
+    """
+    try:
+        rembourrage = '=' * (-len(curseur) % 4)
+        brut = base64.urlsafe_b64decode(curseur + rembourrage).decode()
+        date_iso, pk = brut.split('|')
+        return date.fromisoformat(date_iso), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Curseur invalide : {curseur!r}") from e
+
+
+class PageCurseur:
+    """
+    Page de résultats obtenue par pagination par curseur.
+    Expose une interface proche de ``django.core.paginator.Page``.
+    """
+
+    def __init__(self, object_list, curseur_suivant=None, curseur_precedent=None):
+        self.object_list = object_list
+        self.curseur_suivant = curseur_suivant
+        self.curseur_precedent = curseur_precedent
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.curseur_suivant is not None
+
+    def has_previous(self):
+        return self.curseur_precedent is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def paginer_par_curseur(queryset, taille_page, apres=None, avant=None):
+    """
+    Retourne une PageCurseur de ``taille_page`` factures triées par ``(-date, -id)``.
+
+    ``apres`` et ``avant`` sont des curseurs opaques désignant respectivement
+    la dernière facture de la page précédente et la première de la page suivante.
+    Une seule requête de ``taille_page + 1`` lignes est exécutée par page.
+    Lève Http404 si un curseur est invalide.
+    """
+    try:
+        position_apres = decoder_curseur(apres) if apres else None
+        position_avant = decoder_curseur(avant) if avant else None
+    except ValueError:
+        raise Http404("Page invalide.")
+
+    if position_avant is not None:
+        # Parcours à rebours : on lit les lignes situées avant le curseur
+        # dans l'ordre croissant, puis on les remet dans l'ordre d'affichage.
+        lignes = list(
+            queryset.avant_curseur(*position_avant)
+            .order_by('date', 'id')[:taille_page + 1]
+        )
+        plus_de_lignes = len(lignes) > taille_page
+        lignes = lignes[:taille_page][::-1]
+        a_precedent = plus_de_lignes
+        a_suivant = True
+    else:
+        if position_apres is not None:
+            queryset = queryset.apres_curseur(*position_apres)
+        lignes = list(queryset.order_by('-date', '-id')[:taille_page + 1])
+        a_suivant = len(lignes) > taille_page
+        lignes = lignes[:taille_page]
+        a_precedent = position_apres is not None
+
+    if not lignes:
+        return PageCurseur(lignes)
+
+    premiere, derniere = lignes[0], lignes[-1]
+    return PageCurseur(
+        lignes,
+        curseur_suivant=encoder_curseur(derniere.date, derniere.pk) if a_suivant else None,
+        curseur_precedent=encoder_curseur(premiere.date, premiere.pk) if a_precedent else None,
+    )
@@ -0,0 +1,142 @@
+"""
+Profilage à la demande des requêtes HTTP.
+
+ProfilageMiddleware (facture/middleware.py) exécute cProfile autour de la vue
+et du rendu de son template, pour une requête éligible :
+    - d'un membre du staff, avec le paramètre GET ?profilage ;
+    - portant l'en-tête X-Profilage signé, par exemple depuis un outil de
+      charge : la valeur signée est le pourcentage de requêtes à profiler.
+
+    python manage.py shell -c "from facture.profilage import entete_profilage; print(entete_profilage(5))"
+    curl -H "X-Profilage: <valeur>" http://localhost:8000/factures/?client=1
+
+Seul un échantillon des requêtes éligibles est profilé (TAUX %, ou le
+pourcentage de l'en-tête). Chaque profil est écrit dans un fichier .prof
+(pstats) nommé d'après sa date, le nom de l'URL et la durée de la requête,
+que la page /profils/ (staff) classe du plus lent au plus rapide. Le
+répertoire ne garde que les MAX_FICHIERS profils les plus récents.
+
+Configuration (settings.PROFILAGE_REQUETES) :
+    ACTIVE       : False désactive entièrement le profilage
+    REPERTOIRE   : répertoire des fichiers .prof
+    TAUX         : pourcentage des requêtes éligibles profilées (100)
+    MAX_FICHIERS : nombre de profils conservés (200)
+"""
+import io
+import os
+import pstats
+import re
+import tempfile
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+
+
+CONFIGURATION_PAR_DEFAUT = {
+    'ACTIVE': True,
+    'REPERTOIRE': os.path.join(tempfile.gettempdir(), 'facture_profils'),
+    'TAUX': 100,
+    'MAX_FICHIERS': 200,
+}
+
+PARAMETRE = 'profilage'
+ENTETE = 'X-Profilage'
+SEL_SIGNATURE = 'facture.profilage'
+
+# 20261018T140501.123456_liste_factures_153ms.prof
+NOM_FICHIER = re.compile(r'^(?P<date>\d{8}T\d{6}\.\d{6})_(?P<nom_url>[\w.-]+)_(?P<duree_ms>\d+)ms\.prof$')
+
+
+def configuration_profilage():
+    """Retourne la configuration du profilage des requêtes."""
+    return {**CONFIGURATION_PAR_DEFAUT, **getattr(settings, 'PROFILAGE_REQUETES', {})}
+
+
+def entete_profilage(taux=100):
+    """Valeur signée de l'en-tête X-Profilage, pour profiler taux % des requêtes."""
+    return signing.Signer(salt=SEL_SIGNATURE).sign(str(taux))
+
+
+def _pourcentage(valeur, defaut):
+    try:
+        return min(max(float(valeur), 0.0), 100.0) if valeur else defaut
+    except ValueError:
+        return None
+
+
+def taux_demande(request, config):
+    """
+    Retourne le pourcentage de chances de profiler la requête, ou None si
+    elle n'est pas éligible (ni en-tête valide, ni staff avec ?profilage).
+    """
+    entete = request.headers.get(ENTETE)
+    if entete:
+        try:
+            return _pourcentage(signing.Signer(salt=SEL_SIGNATURE).unsign(entete), config['TAUX'])
+        except signing.BadSignature:
+            return None
+    if PARAMETRE in request.GET:
+        utilisateur = getattr(request, 'user', None)
+        if utilisateur is not None and utilisateur.is_staff:
+            return _pourcentage(request.GET[PARAMETRE], config['TAUX'])
+    return None
+
+
+def enregistrer_profil(profil, nom_url, duree, config):
+    """Écrit un profil cProfile et retourne le nom du fichier créé."""
+    repertoire = config['REPERTOIRE']
+    os.makedirs(repertoire, exist_ok=True)
+    nom_url = re.sub(r'[^\w.-]', '-', nom_url)
+    nom = f"{datetime.now():%Y%m%dT%H%M%S.%f}_{nom_url}_{round(duree * 1000)}ms.prof"
+    profil.dump_stats(os.path.join(repertoire, nom))
+    _purger(repertoire, config['MAX_FICHIERS'])
+    return nom
+
+
+def _purger(repertoire, maximum):
+    """Supprime les profils les plus anciens au-delà de maximum."""
+    noms = sorted(nom for nom in os.listdir(repertoire) if NOM_FICHIER.match(nom))
+    for nom in noms[:max(len(noms) - maximum, 0)]:
+        try:
+            os.remove(os.path.join(repertoire, nom))
+        except FileNotFoundError:
+            # Déjà supprimé par un autre processus
+            pass
+
+
+def profils_enregistres():
+    """Retourne les profils enregistrés, du plus lent au plus rapide."""
+    repertoire = configuration_profilage()['REPERTOIRE']
+    if not os.path.isdir(repertoire):
+        return []
+    profils = []
+    for nom in os.listdir(repertoire):
+        correspondance = NOM_FICHIER.match(nom)
+        if correspondance:
+            profils.append({
+                'nom': nom,
+                'date': datetime.strptime(correspondance['date'], '%Y%m%dT%H%M%S.%f'),
+                'nom_url': correspondance['nom_url'],
+                'duree_ms': int(correspondance['duree_ms']),
+            })
+    profils.sort(key=lambda profil: (-profil['duree_ms'], profil['nom']))
+    return profils
+
+
+def chemin_profil(nom):
+    """Chemin du fichier d'un profil ; ValueError si le nom n'est pas celui d'un profil."""
+    if not NOM_FICHIER.match(nom):
+        raise ValueError(f"Nom de profil invalide : {nom!r}")
+    chemin = os.path.join(configuration_profilage()['REPERTOIRE'], nom)
+    if not os.path.isfile(chemin):
+        raise ValueError(f"Profil introuvable : {nom!r}")
+    return chemin
+
+
+def resume_profil(nom, limite=40):
+    """Résumé texte d'un profil : les fonctions les plus coûteuses en temps cumulé."""
+    sortie = io.StringIO()
+    statistiques = pstats.Stats(chemin_profil(nom), stream=sortie)
+    statistiques.strip_dirs().sort_stats('cumulative').print_stats(limite)
+    return sortie.getvalue()
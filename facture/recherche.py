@@ -0,0 +1,89 @@
+"""
+Index de recherche plein texte des factures.
+
+Sur SQLite, la table virtuelle FTS5 ``facture_recherche`` (tokenizer trigram)
+indexe le numéro de chaque facture ainsi que le nom et l'email de son client.
+Le rowid de la table est l'identifiant de la facture.
+
+L'index est maintenu depuis Python (signaux, FactureQuerySet.update() et
+bulk_create()) plutôt que par des déclencheurs SQL : les reconstructions de
+tables effectuées par les migrations SQLite échouent en présence de
+déclencheurs croisés entre facture_facture et facture_client.
+"""
+from django.db import connections
+
+
+TABLE_RECHERCHE = 'facture_recherche'
+
+# Le tokenizer trigram ne sait pas chercher de terme plus court que 3 caractères
+LONGUEUR_MIN_RECHERCHE = 3
+
+SQL_INDEXATION = f"""
+    INSERT INTO {TABLE_RECHERCHE} (rowid, numero, client_nom, client_email)
+    SELECT f.id, f.numero, c.nom, COALESCE(c.email, '')
+    FROM facture_facture f JOIN facture_client c ON c.id = f.client_id
+"""
+
+
+def index_disponible(using):
+    """Indique si la base dispose de l'index plein texte."""
+    return connections[using].vendor == 'sqlite'
+
+
+def index_utilisable(using, terme):
+    """Indique si l'index peut servir à rechercher ce terme sur cette base."""
+    return index_disponible(using) and len(terme) >= LONGUEUR_MIN_RECHERCHE
+
+
+def expression_match(terme):
+    """
+    Construit l'expression MATCH d'un terme : une phrase FTS5 échappée,
+    qui correspond à toute valeur contenant le terme (comme icontains).
+    """
+    return '"' + terme.replace('"', '""') + '"'
+
+
+def _marqueurs(ids):
+    return ', '.join(['%s'] * len(ids))
+
+
+def indexer_factures(ids, using='default'):
+    """(Ré)indexe les factures dont les identifiants sont donnés."""
+    ids = [pk for pk in ids if pk is not None]
+    if not ids or not index_disponible(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE_RECHERCHE} WHERE rowid IN ({_marqueurs(ids)})", ids)
+        cursor.execute(f"{SQL_INDEXATION} WHERE f.id IN ({_marqueurs(ids)})", ids)
+
+
+def desindexer_factures(ids, using='default'):
+    """Retire de l'index les factures dont les identifiants sont donnés."""
+    ids = [pk for pk in ids if pk is not None]
+    if not ids or not index_disponible(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE_RECHERCHE} WHERE rowid IN ({_marqueurs(ids)})", ids)
+
+
+def indexer_factures_client(client_id, using='default'):
+    """Réindexe toutes les factures d'un client (après changement de nom ou d'email)."""
+    if not index_disponible(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {TABLE_RECHERCHE} "
+            f"WHERE rowid IN (SELECT id FROM facture_facture WHERE client_id = %s)",
+            [client_id],
+        )
+        cursor.execute(f"{SQL_INDEXATION} WHERE f.client_id = %s", [client_id])
+
+
+def reconstruire_index(using='default'):
+    """Reconstruit entièrement l'index et retourne le nombre de factures indexées."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE_RECHERCHE}")
+        cursor.execute(SQL_INDEXATION)
+        cursor.execute(f"INSERT INTO {TABLE_RECHERCHE} ({TABLE_RECHERCHE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT COUNT(*) FROM {TABLE_RECHERCHE}")
+        return cursor.fetchone()[0]
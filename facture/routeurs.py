@@ -0,0 +1,131 @@
+"""
+Routage des requêtes SQL entre la base primaire et des réplicas en lecture.
+
+Les lectures sont envoyées à un réplica tiré au hasard, sauf lorsque la
+base primaire est « épinglée » pour le contexte courant :
+
+- pendant une requête HTTP d'écriture (POST, PUT, PATCH, DELETE) ;
+- dès qu'une écriture a eu lieu (lecture après écriture dans la même requête) ;
+- pendant DELAI_EPINGLAGE secondes après une écriture, pour le même client,
+  grâce à un cookie posé par EpinglagePrimaireMiddleware (le réplica peut
+  ne pas encore avoir reçu les données qui viennent d'être écrites) ;
+- à l'intérieur d'une transaction ouverte sur la base primaire.
+
+Un QuerySet peut aussi forcer sa base avec depuis_primaire() / depuis_replica().
+
+La table du cache en base de données (DatabaseCache) est toujours lue et
+écrite sur la primaire, sans épingler : une version des données lue sur un
+réplica en retard servirait des rapports périmés.
+
+Configuration (settings.ROUTAGE_BASES) :
+    PRIMAIRE        : alias de la base primaire ('default')
+    REPLICAS        : alias des réplicas en lecture ([] : tout va à la primaire)
+    DELAI_EPINGLAGE : durée d'épinglage après une écriture, en secondes (5)
+    COOKIE          : nom du cookie d'épinglage ('epingle_primaire')
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+
+
+CONFIGURATION_PAR_DEFAUT = {
+    'PRIMAIRE': 'default',
+    'REPLICAS': [],
+    'DELAI_EPINGLAGE': 5,
+    'COOKIE': 'epingle_primaire',
+}
+
+# app_label du modèle interne de DatabaseCache
+APP_CACHE = 'django_cache'
+
+
+def configuration_routage():
+    """Retourne la configuration du routage des bases de données."""
+    return {**CONFIGURATION_PAR_DEFAUT, **getattr(settings, 'ROUTAGE_BASES', {})}
+
+
+class EtatRoutage:
+    """
+    État de routage d'une requête HTTP (ou d'un thread hors requête).
+    Objet mutable : les threads lancés par sync_to_async partagent la même
+    instance que la requête qui les a lancés.
+    """
+
+    def __init__(self, epingle=False):
+        self.epingle = epingle
+        self.ecriture = False
+
+
+_etat_routage = ContextVar('etat_routage', default=None)
+
+
+def etat_routage():
+    """Retourne l'état de routage du contexte courant, en le créant si besoin."""
+    etat = _etat_routage.get()
+    if etat is None:
+        etat = EtatRoutage()
+        _etat_routage.set(etat)
+    return etat
+
+
+def demarrer_requete(epingle=False):
+    """Initialise l'état de routage d'une nouvelle requête HTTP."""
+    etat = EtatRoutage(epingle)
+    _etat_routage.set(etat)
+    return etat
+
+
+def primaire_epinglee():
+    """Indique si les lectures du contexte courant doivent aller à la base primaire."""
+    etat = etat_routage()
+    return etat.epingle or etat.ecriture
+
+
+@contextmanager
+def lecture_primaire():
+    """Épingle la base primaire le temps d'un bloc de code."""
+    etat = etat_routage()
+    precedent, etat.epingle = etat.epingle, True
+    try:
+        yield
+    finally:
+        etat.epingle = precedent
+
+
+def choisir_replica():
+    """Retourne l'alias d'un réplica, ou de la primaire s'il n'y en a pas."""
+    config = configuration_routage()
+    return random.choice(config['REPLICAS']) if config['REPLICAS'] else config['PRIMAIRE']
+
+
+class RouteurReplicas:
+    """
+    Routeur de bases de données : écritures sur la primaire, lectures sur
+    les réplicas hors épinglage. Tous les alias portent les mêmes données.
+    """
+
+    def db_for_read(self, model, **hints):
+        config = configuration_routage()
+        if model._meta.app_label == APP_CACHE:
+            return config['PRIMAIRE']
+        if not config['REPLICAS'] or primaire_epinglee():
+            return config['PRIMAIRE']
+        if transaction.get_connection(config['PRIMAIRE']).in_atomic_block:
+            # Une transaction ouverte doit relire ses propres écritures
+            return config['PRIMAIRE']
+        return random.choice(config['REPLICAS'])
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != APP_CACHE:
+            etat_routage().ecriture = True
+        return configuration_routage()['PRIMAIRE']
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Les réplicas reçoivent le schéma et les données par réplication
+        return db not in configuration_routage()['REPLICAS']
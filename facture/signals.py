@@ -0,0 +1,219 @@
+"""
+Signaux de l'application facture.
+
+Maintiennent la cohérence des caches applicatifs, des compteurs
+dénormalisés et de l'index de recherche lorsque les données sous-jacentes
+sont modifiées.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .cache_rapports import invalider_rapports
+from .models import (
+    Categorie, CategorieManager, Client, DerniereSuppression, Facture, FactureRollupMensuel,
+    NOM_CATEGORIE_AUTRES, cle_rollup,
+)
+from .recherche import desindexer_factures, indexer_factures, indexer_factures_client
+
+
+@receiver(post_save, sender=Categorie)
+def invalider_categorie_autres_renommee(sender, instance, **kwargs):
+    """Invalide le cache si la catégorie 'Autres' en cache a été renommée."""
+    if instance.pk == CategorieManager._id_autres and instance.nom != NOM_CATEGORIE_AUTRES:
+        Categorie.objects.invalider_cache_autres()
+
+
+@receiver(post_delete, sender=Categorie)
+def invalider_categorie_autres_supprimee(sender, instance, **kwargs):
+    """Invalide le cache si la catégorie 'Autres' en cache a été supprimée."""
+    if instance.pk == CategorieManager._id_autres:
+        Categorie.objects.invalider_cache_autres()
+
+
+# ===== CACHE DES RAPPORTS =====
+
+@receiver(post_save, sender=Facture)
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=Categorie)
+@receiver(post_delete, sender=Facture)
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Categorie)
+def invalider_cache_rapports(sender, using=None, **kwargs):
+    """Invalide les rapports en cache après toute écriture sur les données de facturation."""
+    invalider_rapports(using)
+
+
+# ===== REQUÊTES CONDITIONNELLES =====
+
+@receiver(post_delete, sender=Facture)
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Categorie)
+def marquer_suppression(sender, using=None, **kwargs):
+    """Date de dernière suppression, prise en compte par les ETag des pages (voir conditionnel.py)."""
+    DerniereSuppression.objects.db_manager(using).marquer(sender)
+
+
+# ===== COMPTEURS DÉNORMALISÉS =====
+
+def _ajouter_contribution(deltas, etat, signe):
+    """Ajoute (signe=1) ou retire (signe=-1) la contribution d'une facture aux deltas."""
+    if etat is None:
+        return
+    client_id, categorie_id, montant_ttc, paye = etat
+    # Même arrondi que celui appliqué par la base au stockage du montant
+    montant_ttc = Decimal(montant_ttc).quantize(Decimal('0.01'))
+    impaye = Decimal('0.00') if paye else montant_ttc
+    for modele, pk in ((Client, client_id), (Categorie, categorie_id)):
+        if pk is None:
+            continue
+        delta = deltas[(modele, pk)]
+        delta[0] += signe
+        delta[1] += signe * montant_ttc
+        delta[2] += signe * impaye
+
+
+def _appliquer_deltas(ancien, nouveau, using):
+    """Applique aux clients et catégories la différence entre deux états de facture."""
+    deltas = defaultdict(lambda: [0, Decimal('0.00'), Decimal('0.00')])
+    _ajouter_contribution(deltas, ancien, -1)
+    _ajouter_contribution(deltas, nouveau, 1)
+
+    for (modele, pk), (nb, ttc, impaye) in deltas.items():
+        if not (nb or ttc or impaye):
+            continue
+        modele.objects.using(using).filter(pk=pk).update(
+            nb_factures=F('nb_factures') + nb,
+            total_ttc=F('total_ttc') + ttc,
+            total_impaye=F('total_impaye') + impaye,
+        )
+
+
+def _lire_etat(pk, using):
+    """Lit en base l'état d'une facture pour les compteurs."""
+    return (
+        Facture.objects.using(using).filter(pk=pk)
+        .values_list(*Facture.CHAMPS_COMPTEURS).first()
+    )
+
+
+@receiver(pre_save, sender=Facture)
+def charger_etat_compteurs(sender, instance, raw=False, using=None, **kwargs):
+    """Relit l'état initial d'une facture existante chargée partiellement."""
+    if raw or instance._state.adding or getattr(instance, '_etat_compteurs', None) is not None:
+        return
+    instance._etat_compteurs = _lire_etat(instance.pk, using)
+
+
+@receiver(post_save, sender=Facture)
+def mettre_a_jour_compteurs(sender, instance, created, raw=False, using=None, **kwargs):
+    """Répercute la création ou la modification d'une facture sur les compteurs."""
+    if raw:
+        return
+    ancien = None if created else getattr(instance, '_etat_compteurs', None)
+    nouveau = instance.etat_compteurs() or _lire_etat(instance.pk, using)
+    _appliquer_deltas(ancien, nouveau, using)
+    instance._etat_compteurs = nouveau
+
+
+@receiver(pre_delete, sender=Facture)
+def charger_etat_avant_suppression(sender, instance, using=None, **kwargs):
+    """Relit l'état d'une facture chargée partiellement avant sa suppression."""
+    if getattr(instance, '_etat_compteurs', None) is None and instance.etat_compteurs() is None:
+        instance._etat_compteurs = _lire_etat(instance.pk, using)
+
+
+@receiver(post_delete, sender=Facture)
+def retirer_compteurs(sender, instance, using=None, **kwargs):
+    """Retire des compteurs la contribution d'une facture supprimée."""
+    etat = getattr(instance, '_etat_compteurs', None) or instance.etat_compteurs()
+    _appliquer_deltas(etat, None, using)
+
+
+# ===== AGRÉGATS MENSUELS =====
+
+def _contribution_rollup(etat):
+    """Contribution d'un état de facture (CHAMPS_ROLLUP) à son agrégat mensuel."""
+    if etat is None:
+        return {}
+    *cle, montant_ht, montant_tva, montant_ttc = etat
+    # Même arrondi que celui appliqué par la base au stockage des montants
+    montants = [Decimal(str(montant)).quantize(Decimal('0.01')) for montant in (montant_ht, montant_tva, montant_ttc)]
+    return {cle_rollup(*cle): [1, *montants]}
+
+
+def _appliquer_deltas_rollup(ancien, nouveau, using):
+    """Applique aux agrégats mensuels la différence entre deux états de facture."""
+    FactureRollupMensuel.objects.db_manager(using).appliquer_contributions(
+        _contribution_rollup(nouveau), _contribution_rollup(ancien),
+    )
+
+
+def _lire_etat_rollup(pk, using):
+    """Lit en base l'état d'une facture pour les agrégats mensuels."""
+    return (
+        Facture.objects.using(using).filter(pk=pk)
+        .values_list(*Facture.CHAMPS_ROLLUP).first()
+    )
+
+
+@receiver(pre_save, sender=Facture)
+def charger_etat_rollup(sender, instance, raw=False, using=None, **kwargs):
+    """Relit l'état initial d'une facture existante chargée partiellement."""
+    if raw or instance._state.adding or getattr(instance, '_etat_rollup', None) is not None:
+        return
+    instance._etat_rollup = _lire_etat_rollup(instance.pk, using)
+
+
+@receiver(post_save, sender=Facture)
+def mettre_a_jour_rollup(sender, instance, created, raw=False, using=None, **kwargs):
+    """Répercute la création ou la modification d'une facture sur les agrégats mensuels."""
+    if raw:
+        return
+    ancien = None if created else getattr(instance, '_etat_rollup', None)
+    nouveau = instance.etat_rollup() or _lire_etat_rollup(instance.pk, using)
+    _appliquer_deltas_rollup(ancien, nouveau, using)
+    instance._etat_rollup = nouveau
+
+
+@receiver(pre_delete, sender=Facture)
+def charger_etat_rollup_avant_suppression(sender, instance, using=None, **kwargs):
+    """Relit l'état d'une facture chargée partiellement avant sa suppression."""
+    if getattr(instance, '_etat_rollup', None) is None and instance.etat_rollup() is None:
+        instance._etat_rollup = _lire_etat_rollup(instance.pk, using)
+
+
+@receiver(post_delete, sender=Facture)
+def retirer_rollup(sender, instance, using=None, **kwargs):
+    """Retire des agrégats mensuels la contribution d'une facture supprimée."""
+    etat = getattr(instance, '_etat_rollup', None) or instance.etat_rollup()
+    _appliquer_deltas_rollup(etat, None, using)
+
+
+# ===== INDEX DE RECHERCHE =====
+
+@receiver(post_save, sender=Facture)
+def indexer_facture(sender, instance, raw=False, using=None, **kwargs):
+    """(Ré)indexe une facture créée ou modifiée."""
+    if not raw:
+        indexer_factures([instance.pk], using=using)
+
+
+@receiver(post_delete, sender=Facture)
+def desindexer_facture(sender, instance, using=None, **kwargs):
+    """Retire de l'index une facture supprimée."""
+    desindexer_factures([instance.pk], using=using)
+
+
+@receiver(post_save, sender=Client)
+def reindexer_factures_client(sender, instance, created, raw=False, using=None, **kwargs):
+    """Réindexe les factures d'un client dont le nom ou l'email a changé."""
+    if raw or created:
+        return
+    valeurs = instance.valeurs_recherche()
+    if valeurs is None or valeurs != getattr(instance, '_valeurs_recherche', None):
+        indexer_factures_client(instance.pk, using=using)
+    instance._valeurs_recherche = valeurs
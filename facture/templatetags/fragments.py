@@ -0,0 +1,76 @@
+"""
+Cache de fragments de templates indexé sur la version des données.
+
+    {% load fragments %}
+    {% cache_donnees liste_filtres client_selectionne %}
+        ... rendu coûteux ...
+    {% endcache_donnees %}
+
+Comme la balise {% cache %} de Django, le fragment est mis en cache sous son
+nom et les valeurs des variables qui le suivent ; la clé comprend en plus la
+version des données de facturation (voir facture/cache_rapports.py), qui
+change à chaque écriture sur Facture, Client ou Categorie. Le cache et la
+durée de vie sont ceux des rapports (settings.CACHE_RAPPORTS_FACTURES).
+
+Comme pour les rapports, le fragment est rendu sans passer par le cache dans
+une transaction qui a modifié des données, ou si le cache est propre à chaque
+processus alors que plusieurs processus servent l'application : la version
+n'y serait changée que dans le processus qui a écrit. Les lectures sont comptées
+dans les métriques du cache 'fragments' (voir facture/metriques.py).
+"""
+from django import template
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode
+
+from ..cache_rapports import cache_utilisable, configuration_cache, version_donnees
+from ..metriques import compter_lecture_cache
+
+
+register = template.Library()
+
+
+class _ValeurCalculee:
+    """Remplace une variable de template par une valeur calculée au rendu."""
+
+    def __init__(self, fonction):
+        self.fonction = fonction
+
+    def resolve(self, context):
+        return self.fonction()
+
+
+class CacheDonneesNode(CacheNode):
+
+    def render(self, context):
+        # Transaction qui a écrit, ou cache non partagé entre les processus
+        if not cache_utilisable():
+            return self.nodelist.render(context)
+        # Même clé que CacheNode.render(), avec le comptage des lectures
+        config = configuration_cache()
+        fragment_cache = caches[config['ALIAS']]
+        cle = make_template_fragment_key(self.fragment_name, [var.resolve(context) for var in self.vary_on])
+        valeur = fragment_cache.get(cle)
+        compter_lecture_cache('fragments', valeur is not None)
+        if valeur is None:
+            valeur = self.nodelist.render(context)
+            fragment_cache.set(cle, valeur, config['TTL'])
+        return valeur
+
+
+@register.tag('cache_donnees')
+def cache_donnees(parser, token):
+    """Met en cache un fragment jusqu'à la prochaine écriture sur les données."""
+    morceaux = token.split_contents()
+    if len(morceaux) < 2:
+        raise template.TemplateSyntaxError(f"'{morceaux[0]}' attend un nom de fragment.")
+    nodelist = parser.parse(('endcache_donnees',))
+    parser.delete_first_token()
+    # Durée de vie et cache sont lus dans la configuration au rendu
+    return CacheDonneesNode(
+        nodelist,
+        None,
+        morceaux[1],
+        [_ValeurCalculee(version_donnees), *(parser.compile_filter(morceau) for morceau in morceaux[2:])],
+        None,
+    )
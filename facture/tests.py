@@ -15,14 +15,16 @@ Les tests couvrent :
 - Validation des données
 - Navigation et interface utilisateur
 """
-from django.test import TestCase, RequestFactory
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
 from django.core.exceptions import ValidationError
 from django.http import HttpResponseRedirect
+import json
 from decimal import Decimal
 from django.utils import timezone
-from datetime import date
+from datetime import date, timedelta
 from .models import Facture, Client, Categorie, LogCreationFacture
 from .middleware import LogCreationFactureMiddleware
+from .views import ListeFacturesView
 
 class FactureModelTest(TestCase):
     """
@@ -308,10 +310,11 @@ class LogCreationFactureMiddlewareTest(TestCase):
             paye=False
         )
 
-        # Simuler une requête POST avec succès
+        # Simuler une requête POST avec succès, la vue transmettant la facture créée
         request = self.factory.post('/factures/creer/')
         request.META['REMOTE_ADDR'] = '127.0.0.1'
         request.META['HTTP_USER_AGENT'] = 'Test Browser'
+        request.facture_creee_pk = facture.pk
 
         # Simuler une réponse de succès (redirection 302)
         response = HttpResponseRedirect('/factures/')
@@ -328,6 +331,69 @@ class LogCreationFactureMiddlewareTest(TestCase):
         self.assertEqual(log.user_agent, 'Test Browser')
         self.assertEqual(log.methode_creation, 'formulaire_web')
 
+    def test_middleware_ignore_requete_sans_facture(self):
+        """Sans facture transmise par la vue, aucun log n'est créé ni recherché."""
+        middleware = self._create_middleware()
+        request = self.factory.post('/factures/creer/')
+        with self.assertNumQueries(0):
+            middleware.process_response(request, HttpResponseRedirect('/factures/'))
+        self.assertEqual(LogCreationFacture.objects.count(), 0)
+
+    def test_creation_via_vue_attribue_la_bonne_facture(self):
+        """Le log est rattaché à la facture créée par la requête, pas à la plus récente."""
+        from django.test import Client as ClientHTTP
+        ClientHTTP().post('/factures/creer/', {
+            'numero': 'FAC-MW-002', 'date': '2024-01-01', 'montant_ht': '10.00',
+            'taux_tva': '20.00', 'client': self.client.id, 'categorie': self.categorie.id,
+        })
+        facture = Facture.objects.get(numero='FAC-MW-002')
+        # Une facture plus récente, créée hors formulaire, ne doit pas recevoir le log
+        Facture.objects.create(
+            numero="FAC-MW-003", date="2024-01-02", montant_ht=Decimal("10.00"),
+            taux_tva=Decimal("20.00"), client=self.client, categorie=self.categorie,
+        )
+        self.assertEqual(list(LogCreationFacture.objects.values_list('facture_id', flat=True)), [facture.pk])
+
+    def test_tampon_vide_par_taille(self):
+        """Le tampon écrit ses logs en un seul bulk_create une fois TAILLE_LOT atteint."""
+        from django.test import override_settings
+        from .middleware import TamponLogs
+        facture = Facture.objects.create(
+            numero="FAC-MW-004", date="2024-01-01", montant_ht=Decimal("10.00"),
+            taux_tva=Decimal("20.00"), client=self.client, categorie=self.categorie,
+        )
+        tampon = TamponLogs()
+        nouveau_log = lambda: LogCreationFacture(
+            facture_id=facture.pk, ip_utilisateur='127.0.0.1', methode_creation='formulaire_web'
+        )
+        with override_settings(LOG_CREATION_FACTURE={'TAILLE_LOT': 3, 'DELAI_MAX': 3600}):
+            with self.assertNumQueries(0):
+                self.assertTrue(tampon.ajouter(nouveau_log()))
+                self.assertTrue(tampon.ajouter(nouveau_log()))
+            with self.assertNumQueries(1):
+                tampon.ajouter(nouveau_log())
+        self.assertEqual(len(tampon), 0)
+        self.assertEqual(LogCreationFacture.objects.filter(facture=facture).count(), 3)
+
+    def test_tampon_plein_repli_synchrone(self):
+        """Un tampon plein écrit les nouveaux logs immédiatement."""
+        from django.test import override_settings
+        from .middleware import TamponLogs
+        facture = Facture.objects.create(
+            numero="FAC-MW-005", date="2024-01-01", montant_ht=Decimal("10.00"),
+            taux_tva=Decimal("20.00"), client=self.client, categorie=self.categorie,
+        )
+        tampon = TamponLogs()
+        with override_settings(LOG_CREATION_FACTURE={'TAILLE_LOT': 10, 'CAPACITE_MAX': 1, 'DELAI_MAX': 3600}):
+            for _ in range(2):
+                tampon.ajouter(LogCreationFacture(
+                    facture_id=facture.pk, ip_utilisateur='127.0.0.1', methode_creation='formulaire_web'
+                ))
+        self.assertEqual(len(tampon), 1)
+        self.assertEqual(LogCreationFacture.objects.count(), 1)
+        tampon.vider()
+        self.assertEqual(LogCreationFacture.objects.count(), 2)
+
     def test_facture_sans_categorie(self):
         """Test de création d'une facture sans catégorie (sera assignée à 'Autres')"""
         facture = Facture.objects.create(
@@ -379,6 +445,515 @@ class LogCreationFactureMiddlewareTest(TestCase):
         self.assertEqual(str(facture), "FAC-2024-007 - Test Client")
 
 
+class TamponLogsEchecTest(TransactionTestCase):
+    """
+    Tests du repli de TamponLogs quand l'écriture groupée échoue.
+    Les clés étrangères SQLite n'étant vérifiées qu'au commit, ces tests
+    s'exécutent hors transaction de test.
+    """
+
+    def test_facture_supprimee_avant_vidage(self):
+        """Un log dont la facture a disparu est abandonné, les autres sont écrits."""
+        from .middleware import TamponLogs
+        client = Client.objects.create(nom="Client Tampon")
+        factures = [
+            Facture.objects.create(
+                numero=f"FAC-TP-{rang}", date="2024-01-01", montant_ht=Decimal("10.00"),
+                taux_tva=Decimal("20.00"), client=client,
+            )
+            for rang in range(3)
+        ]
+        tampon = TamponLogs()
+        with override_settings(LOG_CREATION_FACTURE={'TAILLE_LOT': 10, 'DELAI_MAX': 3600}):
+            for facture in factures:
+                tampon.ajouter(LogCreationFacture(
+                    facture_id=facture.pk, ip_utilisateur='127.0.0.1', methode_creation='formulaire_web'
+                ))
+            factures[1].delete()
+            with self.assertLogs('facture.middleware', 'ERROR'):
+                self.assertEqual(tampon.vider(), 2)
+        self.assertEqual(len(tampon), 0)
+        self.assertEqual(
+            sorted(LogCreationFacture.objects.values_list('facture_id', flat=True)),
+            [factures[0].pk, factures[2].pk],
+        )
+        self.assertEqual(tampon.vider(), 0)
+
+
+class InstrumentationSqlMiddlewareTest(TestCase):
+    """
+    Tests du middleware InstrumentationSqlMiddleware (Server-Timing et
+    journalisation des requêtes coûteuses).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        client = Client.objects.create(nom="Client Instrumenté")
+        cls.facture = Facture.objects.create(
+            numero="FAC-SQL", date="2024-01-01", montant_ht=Decimal("100.00"),
+            taux_tva=Decimal("20.00"), client=client,
+        )
+
+    def _mesures(self, response):
+        """Retourne {nom: paramètres} de l'en-tête Server-Timing."""
+        mesures = {}
+        for mesure in response['Server-Timing'].split(', '):
+            nom, *parametres = mesure.split(';')
+            mesures[nom] = dict(parametre.split('=', 1) for parametre in parametres)
+        return mesures
+
+    def test_server_timing(self):
+        """L'en-tête indique le nombre de requêtes SQL et les durées en base et totale."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(f'/factures/{self.facture.pk}/')
+        mesures = self._mesures(response)
+        self.assertEqual(mesures['db']['desc'], f'"{len(requetes)} SQL"')
+        self.assertLessEqual(float(mesures['db']['dur']), float(mesures['app']['dur']))
+
+    @override_settings(INSTRUMENTATION_SQL={'SEUIL_REQUETES': 1})
+    def test_journalisation_au_dela_du_seuil(self):
+        """Une page au-delà d'un seuil est journalisée avec le nom de son URL."""
+        with self.assertLogs('facture.middleware', 'WARNING') as journal:
+            self.client.get('/factures/')
+        self.assertIn('[liste_factures]', journal.output[0])
+        self.assertEqual(journal.records[0].nom_url, 'liste_factures')
+        self.assertGreater(journal.records[0].requetes_sql, 1)
+
+    def test_sans_journalisation_sous_les_seuils(self):
+        """Une page sous les seuils n'est pas journalisée."""
+        with self.assertNoLogs('facture.middleware', 'WARNING'):
+            self.client.get(f'/factures/{self.facture.pk}/')
+
+    @override_settings(INSTRUMENTATION_SQL={'ACTIVE': False})
+    def test_desactive(self):
+        """Désactivé, le middleware n'ajoute pas d'en-tête."""
+        response = self.client.get(f'/factures/{self.facture.pk}/')
+        self.assertNotIn('Server-Timing', response)
+
+
+class ProfilageMiddlewareTest(TestCase):
+    """
+    Tests du profilage à la demande (ProfilageMiddleware, facture/profilage.py)
+    et des pages de profils réservées au staff.
+    """
+
+    def setUp(self):
+        import tempfile
+        from django.contrib.auth.models import User
+        self.repertoire = tempfile.TemporaryDirectory()
+        self.addCleanup(self.repertoire.cleanup)
+        reglages = override_settings(PROFILAGE_REQUETES={'REPERTOIRE': self.repertoire.name, 'MAX_FICHIERS': 3})
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        self.utilisateur = User.objects.create_user('utilisateur', password='secret')
+
+    def _fichiers(self):
+        import os
+        return sorted(os.listdir(self.repertoire.name))
+
+    def test_staff_avec_parametre(self):
+        """Une page demandée par le staff avec ?profilage est profilée, fichier nommé d'après l'URL."""
+        self.client.force_login(self.staff)
+        self.assertNotIn('X-Profil', self.client.get('/factures/'))
+        response = self.client.get('/factures/?profilage')
+        self.assertEqual(self._fichiers(), [response['X-Profil']])
+        self.assertRegex(response['X-Profil'], r'_liste_factures_\d+ms\.prof$')
+
+    def test_non_staff_ignore(self):
+        """Le paramètre est sans effet pour un utilisateur qui n'est pas du staff."""
+        self.client.force_login(self.utilisateur)
+        self.assertNotIn('X-Profil', self.client.get('/factures/?profilage'))
+        self.assertEqual(self._fichiers(), [])
+
+    def test_entete_signe_et_echantillonnage(self):
+        """L'en-tête signé rend la requête éligible, au pourcentage qu'il indique."""
+        from .profilage import entete_profilage
+        self.assertIn('X-Profil', self.client.get('/factures/', HTTP_X_PROFILAGE=entete_profilage()))
+        self.assertNotIn('X-Profil', self.client.get('/factures/', HTTP_X_PROFILAGE=entete_profilage(0)))
+        self.assertNotIn('X-Profil', self.client.get('/factures/', HTTP_X_PROFILAGE='100:falsifie'))
+        self.assertEqual(len(self._fichiers()), 1)
+
+    def test_purge_des_plus_anciens(self):
+        """Seuls les MAX_FICHIERS profils les plus récents sont conservés."""
+        self.client.force_login(self.staff)
+        noms = [self.client.get('/factures/?profilage')['X-Profil'] for _ in range(5)]
+        self.assertEqual(self._fichiers(), noms[2:])
+
+    def test_pages_des_profils(self):
+        """Liste, détail et téléchargement sont réservés au staff."""
+        self.client.force_login(self.staff)
+        nom = self.client.get('/clients/?profilage')['X-Profil']
+
+        response = self.client.get('/profils/')
+        self.assertContains(response, 'liste_clients')
+        self.assertEqual(response.context['profils'][0]['nom'], nom)
+        self.assertContains(self.client.get(f'/profils/{nom}/'), 'cumulative')
+        telechargement = self.client.get(f'/profils/{nom}/telecharger/')
+        self.assertEqual(telechargement.status_code, 200)
+        self.assertIn('attachment', telechargement['Content-Disposition'])
+        self.assertEqual(self.client.get('/profils/..%2Fsecret.prof/').status_code, 404)
+
+        self.client.force_login(self.utilisateur)
+        self.assertEqual(self.client.get('/profils/').status_code, 302)
+
+
+class MetriquesTest(TestCase):
+    """
+    Tests du registre de métriques (facture/metriques.py) et de l'endpoint
+    /metrics au format Prometheus.
+    """
+
+    def setUp(self):
+        from .metriques import registre
+        registre.reinitialiser()
+        self.client_facture = Client.objects.create(nom="Client Métriques")
+        self.categorie = Categorie.objects.create(nom="Catégorie Métriques")
+
+    def _metriques(self, **entetes):
+        response = self.client.get('/metrics', **entetes)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_requetes_http_et_sql_par_url(self):
+        """Durée par URL et statut, et requêtes SQL par URL, relevées par le middleware."""
+        self.client.get('/factures/')
+        self.client.get('/factures/')
+        self.client.get('/factures/999999/')
+        texte = self._metriques()
+        self.assertIn('# TYPE facture_requetes_http_duree_secondes histogram', texte)
+        self.assertIn('facture_requetes_http_duree_secondes_count{vue="liste_factures",statut="200"} 2.0', texte)
+        self.assertIn('facture_requetes_http_duree_secondes_bucket{vue="liste_factures",statut="200",le="+Inf"} 2.0', texte)
+        self.assertIn('facture_requetes_http_duree_secondes_count{vue="detail_facture",statut="404"} 1.0', texte)
+        self.assertRegex(texte, r'facture_requetes_sql_total\{vue="liste_factures"\} [1-9]')
+        self.assertRegex(texte, r'facture_requetes_sql_duree_secondes_total\{vue="liste_factures"\} ')
+
+    def test_factures_creees_et_delai_des_logs(self):
+        """Créations comptées par methode_creation ; délai d'écriture des logs mis en tampon."""
+        from .middleware import TamponLogs
+        response = self.client.post('/factures/creer/', {
+            'numero': 'FAC-MET-001', 'date': '2024-01-01', 'montant_ht': '100.00', 'taux_tva': '20.00',
+            'client': self.client_facture.pk, 'categorie': self.categorie.pk,
+        })
+        self.assertEqual(response.status_code, 302)
+        facture = Facture.objects.get(numero='FAC-MET-001')
+
+        tampon = TamponLogs()
+        with override_settings(LOG_CREATION_FACTURE={'TAILLE_LOT': 10, 'DELAI_MAX': 3600}):
+            tampon.ajouter(LogCreationFacture(
+                facture=facture, ip_utilisateur='127.0.0.1', methode_creation='formulaire_web',
+            ))
+        tampon.vider()
+
+        texte = self._metriques()
+        self.assertIn('facture_factures_creees_total{methode_creation="formulaire_web"} 1.0', texte)
+        self.assertIn('facture_log_creation_delai_secondes_count 1.0', texte)
+        self.assertIn('facture_log_creation_delai_secondes_bucket{le="0.01"} 1.0', texte)
+
+    def test_taux_succes_du_cache(self):
+        """Le taux de succès est calculé à partir des lectures comptées."""
+        from .metriques import compter_lecture_cache
+        for succes in (True, True, True, False):
+            compter_lecture_cache('rapports', succes)
+        texte = self._metriques()
+        self.assertIn('facture_cache_requetes_total{cache="rapports",resultat="succes"} 3.0', texte)
+        self.assertIn('facture_cache_taux_succes{cache="rapports"} 0.75', texte)
+
+    def test_threads_sans_perte(self):
+        """Les incréments concurrents de plusieurs threads sont tous comptés."""
+        import threading
+        from .metriques import factures_creees, registre
+
+        def incrementer():
+            for _ in range(1000):
+                factures_creees.incrementer('test')
+
+        threads = [threading.Thread(target=incrementer) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(registre.collecter()['facture_factures_creees_total'][('test',)], 4000)
+
+    def test_agregation_entre_processus(self):
+        """Les instantanés des autres processus du répertoire partagé sont additionnés."""
+        import os
+        import tempfile
+        from .metriques import BORNES_DELAI_LOGS, Registre, factures_creees, registre
+        with tempfile.TemporaryDirectory() as repertoire:
+            autre = Registre()
+            autre.compteur('facture_factures_creees_total', "", ('methode_creation',)).incrementer('import', montant=5)
+            autre.histogramme('facture_log_creation_delai_secondes', "", bornes=BORNES_DELAI_LOGS).observer(0.5)
+            autre.ecrire_instantane(repertoire)
+            factures_creees.incrementer('import', montant=2)
+            registre.ecrire_instantane(repertoire)
+            self.assertEqual(len(os.listdir(repertoire)), 2)
+
+            factures_creees.incrementer('import')
+            with override_settings(METRIQUES={'REPERTOIRE': repertoire}):
+                texte = self._metriques()
+        # Valeurs courantes du processus (3) et instantané de l'autre (5)
+        self.assertIn('facture_factures_creees_total{methode_creation="import"} 8.0', texte)
+        self.assertIn('facture_log_creation_delai_secondes_bucket{le="0.5"} 1.0', texte)
+        self.assertIn('facture_log_creation_delai_secondes_count 1.0', texte)
+
+    def test_archivage_des_processus_arretes(self):
+        """Les instantanés des processus arrêtés sont fusionnés dans un seul fichier."""
+        import json
+        import os
+        import subprocess
+        import sys
+        import tempfile
+        from .metriques import NOM_ARCHIVE, Registre, factures_creees, registre
+        arrete = subprocess.Popen([sys.executable, '-c', ''])
+        arrete.wait()
+        with tempfile.TemporaryDirectory() as repertoire:
+            for rang, montant in enumerate([5, 4]):
+                autre = Registre()
+                autre.identite = f'{arrete.pid}_{rang}'
+                autre.compteur('facture_factures_creees_total', "", ('methode_creation',)).incrementer(
+                    'import', montant=montant
+                )
+                autre.ecrire_instantane(repertoire)
+            registre.ecrire_instantane(repertoire)
+            factures_creees.incrementer('import')
+
+            with override_settings(METRIQUES={'REPERTOIRE': repertoire}):
+                texte = self._metriques()
+                self.assertIn('facture_factures_creees_total{methode_creation="import"} 10.0', texte)
+                self.assertEqual(
+                    sorted(os.listdir(repertoire)),
+                    sorted(['.metriques.verrou', NOM_ARCHIVE, f'metriques_{registre.identite}.json']),
+                )
+
+                # Arrêt entre l'écriture de l'archive et la suppression d'un instantané fusionné
+                autre.ecrire_instantane(repertoire)
+                with open(os.path.join(repertoire, NOM_ARCHIVE)) as fichier:
+                    archive = json.load(fichier)
+                archive['fusionnes'] = [f'metriques_{autre.identite}.json']
+                with open(os.path.join(repertoire, NOM_ARCHIVE), 'w') as fichier:
+                    json.dump(archive, fichier)
+                texte = self._metriques()
+                self.assertIn('facture_factures_creees_total{methode_creation="import"} 10.0', texte)
+                self.assertNotIn(f'metriques_{autre.identite}.json', os.listdir(repertoire))
+
+    def test_jeton_obligatoire(self):
+        """Avec JETON_OBLIGATOIRE, une configuration sans jeton est refusée au démarrage."""
+        from django.core.exceptions import ImproperlyConfigured
+        from .metriques import verifier_configuration
+        with override_settings(METRIQUES={'JETON_OBLIGATOIRE': True}):
+            with self.assertRaises(ImproperlyConfigured):
+                verifier_configuration()
+        with override_settings(METRIQUES={'JETON_OBLIGATOIRE': True, 'JETON': 'secret'}):
+            verifier_configuration()
+        with override_settings(METRIQUES={'JETON_OBLIGATOIRE': True, 'ACTIVE': False}):
+            verifier_configuration()
+
+    def test_jeton_et_desactivation(self):
+        """Jeton Bearer exigé s'il est configuré ; endpoint absent si désactivé."""
+        with override_settings(METRIQUES={'JETON': 'secret'}):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer faux').status_code, 403)
+            self._metriques(HTTP_AUTHORIZATION='Bearer secret')
+        with override_settings(METRIQUES={'ACTIVE': False}):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+
+class SequenceFactureTest(TestCase):
+    """Tests de la numérotation des factures (SequenceFacture)."""
+
+    def setUp(self):
+        self.client_test = Client.objects.create(nom="Client Séquence")
+        self.categorie = Categorie.objects.create(nom="Catégorie Séquence")
+
+    def _creer(self, numero):
+        return Facture.objects.create(
+            numero=numero, date="2024-01-01", montant_ht=Decimal("10.00"),
+            taux_tva=Decimal("20.00"), client=self.client_test, categorie=self.categorie,
+        )
+
+    def test_reservation_par_plages(self):
+        """Plages consécutives par préfixe et année ; une requête par réservation."""
+        from .models import SequenceFacture
+        self.assertEqual(SequenceFacture.objects.reserver('FAC', 2024, 3), range(1, 4))
+        with self.assertNumQueries(1):
+            self.assertEqual(SequenceFacture.objects.reserver('FAC', 2024, 5000), range(4, 5004))
+        self.assertEqual(SequenceFacture.objects.reserver('FAC', 2025), range(1, 2))
+        self.assertEqual(SequenceFacture.objects.reserver('AVO', 2024), range(1, 2))
+        self.assertEqual(SequenceFacture.objects.get(prefixe='FAC', annee=2024).dernier, 5003)
+        with self.assertRaises(ValueError):
+            SequenceFacture.objects.reserver('FAC', 2024, 0)
+
+    def test_annulation_rend_les_numeros(self):
+        """Une réservation annulée avec sa transaction ne laisse pas de trou."""
+        from django.db import transaction
+        from .models import SequenceFacture
+        self.assertEqual(SequenceFacture.objects.prochain_numero(2024), 'FAC-2024-000001')
+        with transaction.atomic():
+            self.assertEqual(SequenceFacture.objects.numeros('FAC', 2024, 2), ['FAC-2024-000002', 'FAC-2024-000003'])
+            transaction.set_rollback(True)
+        self.assertEqual(SequenceFacture.objects.prochain_numero(2024), 'FAC-2024-000002')
+
+    def test_numeros_deja_utilises_sautes(self):
+        """Un numéro saisi à la main en avance sur la séquence n'est pas attribué une seconde fois."""
+        from .models import SequenceFacture
+        self._creer('FAC-2024-000002')
+        self.assertEqual(
+            SequenceFacture.objects.numeros('FAC', 2024, 3),
+            ['FAC-2024-000001', 'FAC-2024-000003', 'FAC-2024-000004'],
+        )
+
+    def test_recaler(self):
+        """Les séquences repartent au-delà des numéros fournis qui en ont la forme."""
+        from .models import SequenceFacture
+        SequenceFacture.objects.reserver('FAC', 2024, 10)
+        SequenceFacture.objects.recaler(['FAC-2024-000005', 'FAC-2024-000042', 'AVO-2023-000003', 'FAC-2024-7', 'libre'])
+        self.assertEqual(
+            list(SequenceFacture.objects.values_list('prefixe', 'annee', 'dernier')),
+            [('AVO', 2023, 3), ('FAC', 2024, 42)],
+        )
+
+    def test_numero_unique_et_recherche_par_index(self):
+        """Facture.numero est unique ; la recherche exacte passe par son index."""
+        from django.db import IntegrityError, connection, transaction
+        facture = self._creer('FAC-2024-000001')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self._creer('FAC-2024-000001')
+        self.assertEqual(list(Facture.objects.par_numero('FAC-2024-000001')), [facture])
+        sql, parametres = Facture.objects.par_numero('FAC-2024-000001').query.sql_with_params()
+        with connection.cursor() as curseur:
+            curseur.execute(f"EXPLAIN QUERY PLAN {sql}", parametres)
+            plan = ' '.join(str(ligne[-1]) for ligne in curseur.fetchall())
+        self.assertIn('USING INDEX', plan)
+        self.assertNotIn('SCAN', plan)
+
+    def test_creation_sans_numero(self):
+        """Un numéro laissé vide dans le formulaire est attribué dans l'année de la facture."""
+        donnees = {
+            'numero': '', 'date': '2024-06-01', 'montant_ht': '100.00', 'taux_tva': '20.00',
+            'client': self.client_test.pk, 'categorie': self.categorie.pk,
+        }
+        for _ in range(2):
+            self.assertEqual(self.client.post('/factures/creer/', donnees).status_code, 302)
+        self.assertEqual(
+            sorted(Facture.objects.values_list('numero', flat=True)), ['FAC-2024-000001', 'FAC-2024-000002'],
+        )
+        # Un numéro saisi déjà utilisé est refusé par le formulaire
+        response = self.client.post('/factures/creer/', {**donnees, 'numero': 'FAC-2024-000001'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Facture.objects.count(), 2)
+
+
+class NumerotationConcurrenteTest(TransactionTestCase):
+    """
+    Test de charge de la numérotation : plusieurs threads créent des factures
+    numérotées en parallèle, certaines transactions étant annulées. La base de
+    test en mémoire (cache partagé) refuse les écritures concurrentes : les
+    threads utilisent une base SQLite fichier, en transactions IMMEDIATE
+    comme le profil de production.
+    """
+
+    THREADS = 6
+    ITERATIONS = 20
+
+    def _dans_un_thread(self, fonction):
+        import threading
+        from django.db import connections
+        resultat, erreurs = [], []
+
+        def executer():
+            try:
+                resultat.append(fonction())
+            except Exception as exc:
+                erreurs.append(exc)
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=executer)
+        thread.start()
+        thread.join()
+        if erreurs:
+            raise erreurs[0]
+        return resultat[0]
+
+    def test_sans_doublon_ni_trou(self):
+        import sqlite3
+        import tempfile
+        import threading
+        from datetime import date as date_
+        from pathlib import Path
+        from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+        from .models import SequenceFacture, formater_numero
+
+        parametres = connections.settings[DEFAULT_DB_ALIAS]
+        origine = dict(parametres)
+        with tempfile.TemporaryDirectory() as repertoire:
+            # Seules les connexions ouvertes par de nouveaux threads utilisent la base fichier
+            parametres['NAME'] = str(Path(repertoire) / 'numerotation.sqlite3')
+            parametres['OPTIONS'] = {**origine.get('OPTIONS', {}), 'transaction_mode': 'IMMEDIATE', 'timeout': 60}
+            Categorie.objects.invalider_cache_autres()
+            try:
+                # Copie du schéma de la base de test, plus rapide qu'un migrate
+                connection.ensure_connection()
+                copie = sqlite3.connect(parametres['NAME'])
+                connection.connection.backup(copie)
+                copie.close()
+                client_id, categorie_id = self._dans_un_thread(lambda: (
+                    Client.objects.create(nom="Client Concurrent").pk,
+                    Categorie.objects.create(nom="Catégorie Concurrente").pk,
+                ))
+                erreurs = []
+
+                def ecrivain(rang):
+                    try:
+                        for iteration in range(self.ITERATIONS):
+                            with transaction.atomic():
+                                # 1 à 3 numéros par réservation
+                                numeros = SequenceFacture.objects.numeros('FAC', 2026, 1 + (rang + iteration) % 3)
+                                Facture.objects.bulk_create([
+                                    Facture(
+                                        numero=numero, date=date_(2026, 1, 1), montant_ht=Decimal('10.00'),
+                                        taux_tva=Decimal('20.00'), montant_tva=Decimal('2.00'),
+                                        montant_ttc=Decimal('12.00'), client_id=client_id, categorie_id=categorie_id,
+                                    )
+                                    for numero in numeros
+                                ])
+                                if iteration % 4 == 3:
+                                    transaction.set_rollback(True)
+                    except Exception as exc:
+                        erreurs.append(exc)
+                    finally:
+                        connections.close_all()
+
+                threads = [threading.Thread(target=ecrivain, args=(rang,)) for rang in range(self.THREADS)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                self.assertEqual(erreurs, [])
+
+                numeros, dernier = self._dans_un_thread(lambda: (
+                    list(Facture.objects.values_list('numero', flat=True)),
+                    SequenceFacture.objects.get(prefixe='FAC', annee=2026).dernier,
+                ))
+            finally:
+                parametres.clear()
+                parametres.update(origine)
+                Categorie.objects.invalider_cache_autres()
+
+        # Réservations validées : 1 à 3 numéros par itération, une sur quatre annulée
+        attendues = sum(
+            1 + (rang + iteration) % 3
+            for rang in range(self.THREADS) for iteration in range(self.ITERATIONS) if iteration % 4 != 3
+        )
+        self.assertEqual(len(numeros), attendues)
+        self.assertEqual(dernier, attendues)
+        self.assertEqual(sorted(numeros), [formater_numero('FAC', 2026, valeur) for valeur in range(1, attendues + 1)])
+
+
 class FactureQuerySetTest(TestCase):
     """
     Tests pour le QuerySet personnalisé du modèle Facture.
@@ -815,8 +1390,8 @@ class FactureViewsTest(TestCase):
     def test_creer_facture_post_invalide(self):
         """Test de création d'une facture avec des données invalides (POST)"""
         data = {
-            'numero': '',  # Numéro vide
-            'date': '2024-02-05',
+            'numero': 'FAC-2024-015',
+            'date': '',  # Date vide
             'montant_ht': '125.00',
             'taux_tva': '20.00',
             'client': self.client_test.id,
@@ -877,3 +1452,1799 @@ class FactureViewsTest(TestCase):
         self.assertEqual(facture_creee.montant_ht, Decimal('-25.00'))
         self.assertEqual(facture_creee.montant_tva, Decimal('-5.00'))
         self.assertEqual(facture_creee.montant_ttc, Decimal('-30.00'))
+
+
+class ListeFacturesPaginationTest(TestCase):
+    """
+    Tests de la pagination par curseur de la liste des factures.
+    Vérifie le parcours des pages, la conservation des filtres et les curseurs invalides.
+    """
+
+    def setUp(self):
+        """Création de plus d'une page de factures, dont plusieurs à la même date."""
+        self.client_a = Client.objects.create(nom="Client A")
+        self.client_b = Client.objects.create(nom="Client B")
+        self.categorie = Categorie.objects.create(nom="Services", couleur="#FF5733")
+        self.taille_page = ListeFacturesView.paginate_by
+
+        for i in range(self.taille_page + 5):
+            Facture.objects.create(
+                numero=f"PAG-{i:03d}",
+                date=date(2024, 1, 1 + i % 3),
+                montant_ht=Decimal("10.00"),
+                taux_tva=Decimal("20.00"),
+                client=self.client_a if i % 2 else self.client_b,
+                categorie=self.categorie,
+            )
+
+    def _parcourir(self, params):
+        """Parcourt toutes les pages en suivant les curseurs 'apres'."""
+        numeros = []
+        params = dict(params)
+        while True:
+            response = self.client.get('/factures/', params)
+            self.assertEqual(response.status_code, 200)
+            page = response.context['page_obj']
+            numeros.extend(f.numero for f in page)
+            if not page.has_next():
+                return numeros
+            params['apres'] = page.curseur_suivant
+
+    def test_parcours_complet_dans_l_ordre(self):
+        """Toutes les factures sont vues une seule fois, dans l'ordre (-date, -id)."""
+        numeros = self._parcourir({})
+        attendus = list(Facture.objects.order_by('-date', '-id').values_list('numero', flat=True))
+        self.assertEqual(numeros, attendus)
+
+    def test_premiere_page_limitee(self):
+        """La première page ne contient que paginate_by factures."""
+        response = self.client.get('/factures/')
+        self.assertEqual(len(response.context['factures']), self.taille_page)
+        self.assertTrue(response.context['is_paginated'])
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_page_precedente(self):
+        """Le curseur 'avant' ramène exactement à la page précédente."""
+        premiere = self.client.get('/factures/').context['page_obj']
+        seconde = self.client.get('/factures/', {'apres': premiere.curseur_suivant}).context['page_obj']
+        retour = self.client.get('/factures/', {'avant': seconde.curseur_precedent}).context['page_obj']
+        self.assertEqual([f.pk for f in retour], [f.pk for f in premiere])
+
+    def test_filtres_conserves(self):
+        """Les filtres client sont conservés dans les liens de pagination."""
+        numeros = self._parcourir({'client': self.client_a.id})
+        attendus = list(
+            Facture.objects.par_client(self.client_a.id)
+            .order_by('-date', '-id').values_list('numero', flat=True)
+        )
+        self.assertEqual(numeros, attendus)
+
+        response = self.client.get('/factures/', {'categorie': self.categorie.id})
+        self.assertContains(response, f'categorie={self.categorie.id}&amp;apres=')
+
+    def test_curseur_invalide(self):
+        """Un curseur illisible retourne une 404."""
+        response = self.client.get('/factures/', {'apres': 'pas-un-curseur'})
+        self.assertEqual(response.status_code, 404)
+
+
+class BudgetRequetesTest(TestCase):
+    """
+    Budget de requêtes SQL par vue.
+
+    Chaque URL est appelée avec un petit puis un grand jeu de données : le nombre
+    de requêtes doit rester identique (pas de N+1) et ne pas dépasser le budget fixé.
+    Toute régression fait échouer `python manage.py test`.
+    """
+
+    # Nombre maximal de requêtes autorisées par nom d'URL
+    BUDGETS = {
+        'index': 6,
+        'liste_clients': 1,
+        'creer_client': 0,
+        'detail_client': 3,       # + état des données pour l'ETag
+        'modifier_client': 1,
+        'supprimer_client': 1,
+        'liste_factures': 4,      # + état des données pour l'ETag
+        'creer_facture': 2,
+        'detail_facture': 2,      # + état des données pour l'ETag
+        'modifier_facture': 3,
+        'supprimer_facture': 1,
+        'liste_categories': 1,
+        'creer_categorie': 0,
+        'detail_categorie': 2,
+        'modifier_categorie': 1,
+        'supprimer_categorie': 1,
+        'test_middleware': 2,
+    }
+
+    # Changelists d'administration (inclut les requêtes de session et d'utilisateur)
+    BUDGETS_ADMIN = {
+        'admin:facture_client_changelist': 5,
+        'admin:facture_categorie_changelist': 6,
+        'admin:facture_facture_changelist': 9,
+        'admin:facture_logcreationfacture_changelist': 9,
+    }
+
+    def setUp(self):
+        """Création des objets de référence utilisés dans les URLs."""
+        self.client_ref = Client.objects.create(nom="Client Référence", email="ref@example.com")
+        self.categorie_ref = Categorie.objects.create(nom="Catégorie Référence", couleur="#123456")
+        self.facture_ref = self._creer_facture(self.client_ref, self.categorie_ref, 0)
+        self.nb_lignes = 0
+
+    def _creer_facture(self, client, categorie, i):
+        facture = Facture.objects.create(
+            numero=f"BUD-{i:04d}", date=date(2024, 1, 1 + i % 28),
+            montant_ht=Decimal("100.00"), taux_tva=Decimal("20.00"),
+            client=client, categorie=categorie, paye=bool(i % 2),
+        )
+        LogCreationFacture.objects.create(
+            facture=facture, ip_utilisateur="127.0.0.1", methode_creation="formulaire_web"
+        )
+        return facture
+
+    def _ajouter_lignes(self, n):
+        """Ajoute n clients, n catégories et n factures rattachées à chacun."""
+        for _ in range(n):
+            self.nb_lignes += 1
+            i = self.nb_lignes
+            client = Client.objects.create(nom=f"Client {i}")
+            categorie = Categorie.objects.create(nom=f"Catégorie {i}", couleur="#654321")
+            self._creer_facture(client, categorie, i)
+            self._creer_facture(self.client_ref, self.categorie_ref, 1000 + i)
+
+    def _urls(self):
+        """Associe chaque nom d'URL à son chemin."""
+        from django.urls import reverse
+        args = {
+            'client': [self.client_ref.pk],
+            'categorie': [self.categorie_ref.pk],
+            'facture': [self.facture_ref.pk],
+        }
+        urls = {}
+        for nom in self.BUDGETS:
+            cible = next((cle for cle in args if nom.endswith(cle) or nom.endswith(cle + 's')), None)
+            besoin_pk = nom.split('_')[0] in ('detail', 'modifier', 'supprimer')
+            urls[nom] = reverse(nom, args=args[cible] if besoin_pk else None)
+        for nom in self.BUDGETS_ADMIN:
+            urls[nom] = reverse(nom)
+        return urls
+
+    def _compter_requetes(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(requetes)
+
+    def _mesurer(self):
+        """Mesure les vues publiques en anonyme puis l'administration en superutilisateur."""
+        urls = self._urls()
+        self.client.logout()
+        mesures = {nom: self._compter_requetes(urls[nom]) for nom in self.BUDGETS}
+        self.client.force_login(self.admin)
+        mesures.update({nom: self._compter_requetes(urls[nom]) for nom in self.BUDGETS_ADMIN})
+        return mesures
+
+    def test_budget_constant(self):
+        """Le nombre de requêtes ne dépend pas du volume de données et respecte le budget."""
+        from django.contrib.auth.models import User
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "motdepasse")
+
+        self._ajouter_lignes(2)
+        petit = self._mesurer()
+        self._ajouter_lignes(20)
+        grand = self._mesurer()
+
+        budgets = {**self.BUDGETS, **self.BUDGETS_ADMIN}
+        for nom, budget in budgets.items():
+            with self.subTest(url=nom):
+                self.assertEqual(grand[nom], petit[nom],
+                                 f"{nom} : {petit[nom]} puis {grand[nom]} requêtes (N+1)")
+                self.assertLessEqual(grand[nom], budget,
+                                     f"{nom} : {grand[nom]} requêtes pour un budget de {budget}")
+
+
+class CategorieAutresCacheTest(TestCase):
+    """
+    Tests du cache en processus de la catégorie de repli 'Autres'.
+    """
+
+    def setUp(self):
+        Categorie.objects.invalider_cache_autres()
+        self.addCleanup(Categorie.objects.invalider_cache_autres)
+        self.client_test = Client.objects.create(nom="Client Cache")
+
+    def _resoudre(self):
+        """Résout l'identifiant en exécutant les callbacks on_commit."""
+        with self.captureOnCommitCallbacks(execute=True):
+            return Categorie.objects.id_autres()
+
+    def test_resolution_mise_en_cache(self):
+        """Une fois résolue, la catégorie 'Autres' ne coûte plus aucune requête."""
+        id_autres = self._resoudre()
+        with self.assertNumQueries(0):
+            self.assertEqual(Categorie.objects.id_autres(), id_autres)
+
+    def test_pas_de_cache_avant_validation(self):
+        """L'identifiant d'une transaction non validée n'est pas mis en cache."""
+        Categorie.objects.id_autres()
+        with self.assertNumQueries(1):
+            Categorie.objects.id_autres()
+
+    def test_invalidation_renommage(self):
+        """Renommer la catégorie 'Autres' invalide le cache et en crée une nouvelle."""
+        id_autres = self._resoudre()
+        categorie = Categorie.objects.get(pk=id_autres)
+        categorie.nom = "Divers"
+        categorie.save()
+
+        nouvel_id = self._resoudre()
+        self.assertNotEqual(nouvel_id, id_autres)
+        self.assertEqual(Categorie.objects.get(pk=nouvel_id).nom, "Autres")
+
+    def test_invalidation_suppression(self):
+        """Supprimer la catégorie 'Autres' invalide le cache."""
+        id_autres = self._resoudre()
+        Categorie.objects.filter(pk=id_autres).get().delete()
+
+        facture = Facture.objects.creer_avec_categorie_autres(
+            numero="FAC-CACHE-001", date="2024-01-01", montant_ht=Decimal("10.00"),
+            taux_tva=Decimal("20.00"), client=self.client_test,
+        )
+        self.assertEqual(facture.categorie.nom, "Autres")
+        self.assertNotEqual(facture.categorie_id, id_autres)
+
+    def test_unicite_autres(self):
+        """La base refuse une seconde catégorie 'Autres'."""
+        from django.db import IntegrityError, transaction
+        Categorie.objects.id_autres()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Categorie.objects.create(nom="Autres", couleur="#000000")
+
+
+class TableauDeBordTest(TestCase):
+    """
+    Tests de FactureQuerySet.tableau_de_bord() et de la page d'accueil.
+    """
+
+    def setUp(self):
+        self.client_test = Client.objects.create(nom="Client Tableau")
+        self.categorie = Categorie.objects.create(nom="Services", couleur="#FF5733")
+        for i, (montant, paye) in enumerate([("100.00", True), ("200.00", False), ("50.00", False)]):
+            Facture.objects.create(
+                numero=f"TDB-{i}", date="2024-03-01", montant_ht=Decimal(montant),
+                taux_tva=Decimal("20.00"), client=self.client_test,
+                categorie=self.categorie, paye=paye,
+            )
+
+    def test_indicateurs_en_une_requete(self):
+        """Tous les indicateurs sont calculés en une seule requête."""
+        with self.assertNumQueries(1):
+            stats = Facture.objects.tableau_de_bord()
+
+        self.assertEqual(stats['total_factures'], 3)
+        self.assertEqual(stats['factures_payees'], 1)
+        self.assertEqual(stats['factures_non_payees'], 2)
+        self.assertEqual(stats['total_ht'], Decimal("350.00"))
+        self.assertEqual(stats['total_tva'], Decimal("70.00"))
+        self.assertEqual(stats['total_ttc'], Decimal("420.00"))
+        self.assertEqual(stats['solde_impaye'], Decimal("300.00"))
+
+    def test_indicateurs_sans_facture(self):
+        """Les totaux valent zéro quand aucune facture ne correspond."""
+        stats = Facture.objects.filter(numero="inexistant").tableau_de_bord()
+        self.assertEqual(stats['total_factures'], 0)
+        self.assertEqual(stats['total_ttc'], Decimal("0.00"))
+        self.assertEqual(stats['solde_impaye'], Decimal("0.00"))
+
+    def test_accueil_apercus_bornes(self):
+        """La page d'accueil n'affiche que des aperçus bornés avec leur total."""
+        for i in range(5):
+            Client.objects.create(nom=f"Client {i}")
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['clients']), 3)
+        self.assertEqual(response.context['total_clients'], 6)
+        self.assertEqual(response.context['total_factures'], 3)
+        self.assertContains(response, "3 sur 6")
+
+
+class CompteursDenormalisesTest(TestCase):
+    """
+    Tests des compteurs dénormalisés nb_factures / total_ttc / total_impaye
+    de Client et Categorie.
+    """
+
+    def setUp(self):
+        self.client_a = Client.objects.create(nom="Client A")
+        self.client_b = Client.objects.create(nom="Client B")
+        self.categorie = Categorie.objects.create(nom="Services", couleur="#FF5733")
+        self.facture = Facture.objects.create(
+            numero="CPT-001", date="2024-01-01", montant_ht=Decimal("100.00"),
+            taux_tva=Decimal("20.00"), client=self.client_a, categorie=self.categorie,
+        )
+
+    def _verifier(self, objet, nb, ttc, impaye):
+        objet.refresh_from_db()
+        self.assertEqual(objet.nb_factures, nb)
+        self.assertEqual(objet.total_ttc, Decimal(ttc))
+        self.assertEqual(objet.total_impaye, Decimal(impaye))
+
+    def test_creation(self):
+        """La création d'une facture incrémente les compteurs."""
+        self._verifier(self.client_a, 1, "120.00", "120.00")
+        self._verifier(self.categorie, 1, "120.00", "120.00")
+
+    def test_modification_et_paiement(self):
+        """Modifier le montant puis payer une facture met à jour les totaux."""
+        facture = Facture.objects.get(pk=self.facture.pk)
+        facture.montant_ht = Decimal("200.00")
+        facture.save()
+        self._verifier(self.client_a, 1, "240.00", "240.00")
+
+        facture.paye = True
+        facture.save()
+        self._verifier(self.client_a, 1, "240.00", "0.00")
+
+    def test_changement_de_client(self):
+        """Réassigner une facture déplace sa contribution d'un client à l'autre."""
+        self.facture.client = self.client_b
+        self.facture.save()
+        self._verifier(self.client_a, 0, "0.00", "0.00")
+        self._verifier(self.client_b, 1, "120.00", "120.00")
+
+    def test_modification_par_le_formulaire(self):
+        """Modifier une facture depuis la vue applique ses deltas une seule fois."""
+        donnees = {
+            'numero': "CPT-001", 'date': "2024-01-01", 'montant_ht': "200.00", 'taux_tva': "20.00",
+            'client': self.client_a.pk, 'categorie': self.categorie.pk, 'paye': "on",
+        }
+        url = f'/factures/{self.facture.pk}/modifier/'
+        self.assertEqual(self.client.post(url, donnees).status_code, 302)
+        self._verifier(self.client_a, 1, "240.00", "0.00")
+        self._verifier(self.categorie, 1, "240.00", "0.00")
+
+        donnees['client'] = self.client_b.pk
+        self.assertEqual(self.client.post(url, donnees).status_code, 302)
+        self._verifier(self.client_a, 0, "0.00", "0.00")
+        self._verifier(self.client_b, 1, "240.00", "0.00")
+        self.assertEqual(list(Client.objects.incoherents()), [])
+        self.assertEqual(list(Categorie.objects.incoherents()), [])
+
+    def test_modification_instance_partielle(self):
+        """Une facture chargée avec only() est relue avant de calculer les deltas."""
+        facture = Facture.objects.only('id', 'numero', 'date', 'montant_ht', 'taux_tva').get(pk=self.facture.pk)
+        facture.client_id = self.client_b.pk
+        facture.save()
+        self._verifier(self.client_a, 0, "0.00", "0.00")
+        self._verifier(self.client_b, 1, "120.00", "120.00")
+
+    def test_enregistrement_client_perime(self):
+        """Enregistrer une instance de client périmée n'écrase pas ses compteurs."""
+        self.client_a.nom = "Client A renommé"
+        self.client_a.save()
+        self._verifier(self.client_a, 1, "120.00", "120.00")
+
+    def test_suppression(self):
+        """Supprimer une facture décrémente les compteurs."""
+        Facture.objects.filter(pk=self.facture.pk).delete()
+        self._verifier(self.client_a, 0, "0.00", "0.00")
+        self._verifier(self.categorie, 0, "0.00", "0.00")
+
+    def test_update_en_masse(self):
+        """update(paye=...) recalcule les compteurs des lignes touchées."""
+        Facture.objects.create(
+            numero="CPT-002", date="2024-01-02", montant_ht=Decimal("50.00"),
+            taux_tva=Decimal("20.00"), client=self.client_b, categorie=self.categorie,
+        )
+        Facture.objects.update(paye=True)
+        self._verifier(self.client_a, 1, "120.00", "0.00")
+        self._verifier(self.categorie, 2, "180.00", "0.00")
+
+        Facture.objects.filter(client=self.client_a).update(client=self.client_b)
+        self._verifier(self.client_a, 0, "0.00", "0.00")
+        self._verifier(self.client_b, 2, "180.00", "0.00")
+
+    def test_operations_en_masse_par_delta(self):
+        """bulk_create() et update() appliquent un delta sans tout réagréger."""
+        # Écart volontaire : un recalcul complet le ferait disparaître
+        Client.objects.filter(pk=self.client_a.pk).update(nb_factures=10)
+        Facture.objects.bulk_create([
+            Facture(numero=f"CPT-1{i}", date="2024-02-01", montant_ht=Decimal("50.00"),
+                    taux_tva=Decimal("20.00"), montant_tva=Decimal("10.00"), montant_ttc=Decimal("60.00"),
+                    client=self.client_a, categorie=self.categorie)
+            for i in range(2)
+        ])
+        self._verifier(self.client_a, 12, "240.00", "240.00")
+        self._verifier(self.categorie, 3, "240.00", "240.00")
+
+        Facture.objects.filter(numero__startswith="CPT-1").update(paye=True)
+        self._verifier(self.client_a, 12, "240.00", "120.00")
+
+        Facture.objects.filter(numero__startswith="CPT-1").update(client=self.client_b)
+        self._verifier(self.client_a, 10, "120.00", "120.00")
+        self._verifier(self.client_b, 2, "120.00", "0.00")
+        self._verifier(self.categorie, 3, "240.00", "120.00")
+
+    def test_action_admin_marquer_comme_paye(self):
+        """L'action d'administration marquer_comme_paye met à jour les compteurs."""
+        from django.contrib.auth.models import User
+        admin = User.objects.create_superuser("admin", "admin@example.com", "motdepasse")
+        self.client.force_login(admin)
+        self.client.post('/admin/facture/facture/', {
+            'action': 'marquer_comme_paye',
+            '_selected_action': [self.facture.pk],
+        })
+        self._verifier(self.client_a, 1, "120.00", "0.00")
+
+    def test_top_clients(self):
+        """top_clients() classe les clients par total TTC stocké."""
+        Facture.objects.create(
+            numero="CPT-003", date="2024-01-03", montant_ht=Decimal("500.00"),
+            taux_tva=Decimal("20.00"), client=self.client_b, categorie=self.categorie,
+        )
+        attendu = [
+            {'client__nom': "Client B", 'nombre': 1, 'total_ttc': Decimal("600.00")},
+            {'client__nom': "Client A", 'nombre': 1, 'total_ttc': Decimal("120.00")},
+        ]
+        with self.assertNumQueries(1):
+            self.assertEqual(list(Facture.objects.top_clients(5)), attendu)
+        # Même résultat par agrégation des factures
+        self.assertEqual(list(Facture.objects.filter(pk__gt=0).top_clients(5)), attendu)
+        self.assertEqual(
+            list(Facture.objects.top_categories(1)),
+            [{'categorie__nom': "Services", 'nombre': 2, 'total_ttc': Decimal("720.00")}],
+        )
+
+    def test_top_clients_filtre(self):
+        """Sur un QuerySet filtré, top_clients() agrège les seules factures retenues."""
+        Facture.objects.create(
+            numero="CPT-003", date="2025-01-03", montant_ht=Decimal("500.00"),
+            taux_tva=Decimal("20.00"), client=self.client_b, categorie=self.categorie,
+        )
+        self.assertEqual(
+            list(Facture.objects.filter(date__year=2024).top_clients(5)),
+            [{'client__nom': "Client A", 'nombre': 1, 'total_ttc': Decimal("120.00")}],
+        )
+        self.assertEqual(
+            list(Facture.objects.par_client(self.client_b.pk).top_categories(5)),
+            [{'categorie__nom': "Services", 'nombre': 1, 'total_ttc': Decimal("600.00")}],
+        )
+
+    def test_commande_recalculer_et_verifier(self):
+        """La commande détecte puis corrige des compteurs désynchronisés."""
+        from io import StringIO
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        Client.objects.filter(pk=self.client_a.pk).update(nb_factures=42)
+        with self.assertRaises(CommandError):
+            call_command('recalculer_compteurs', '--verifier', stdout=StringIO())
+
+        call_command('recalculer_compteurs', stdout=StringIO())
+        self._verifier(self.client_a, 1, "120.00", "120.00")
+        call_command('recalculer_compteurs', '--verifier', stdout=StringIO())
+
+
+class ImporterFacturesCommandTest(TestCase):
+    """
+    Tests de la commande importer_factures (import en masse CSV/JSONL).
+    """
+
+    def setUp(self):
+        import tempfile
+        self.client_test = Client.objects.create(nom="Client Import")
+        self.categorie = Categorie.objects.create(nom="Services", couleur="#FF5733")
+        self.dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dossier.cleanup)
+
+    def _fichier(self, nom, contenu):
+        import os
+        chemin = os.path.join(self.dossier.name, nom)
+        with open(chemin, 'w', encoding='utf-8') as f:
+            f.write(contenu)
+        return chemin
+
+    def _importer(self, *args):
+        from io import StringIO
+        from django.core.management import call_command
+        sortie, erreurs = StringIO(), StringIO()
+        call_command('importer_factures', *args, stdout=sortie, stderr=erreurs)
+        return sortie.getvalue(), erreurs.getvalue()
+
+    def test_import_csv_par_lots(self):
+        """Les lignes valides sont insérées par lots, avec montants, logs et compteurs."""
+        chemin = self._fichier('factures.csv', (
+            "numero,date,montant_ht,taux_tva,client,categorie,paye\n"
+            "IMP-001,2024-01-01,100.00,20.00,Client Import,Services,oui\n"
+            "IMP-002,2024-01-02,250.50,10.00,Client Import,,0\n"
+            "IMP-003,2024-01-03,10.00,20.00,Client Import,Services,non\n"
+        ))
+        sortie, _ = self._importer(chemin, '--taille-lot', '2')
+
+        self.assertIn("3 facture(s) importée(s)", sortie)
+        facture = Facture.objects.get(numero="IMP-002")
+        self.assertEqual(facture.montant_tva, Decimal("25.05"))
+        self.assertEqual(facture.montant_ttc, Decimal("275.55"))
+        self.assertEqual(facture.categorie.nom, "Autres")
+        self.assertTrue(Facture.objects.get(numero="IMP-001").paye)
+
+        self.assertEqual(LogCreationFacture.objects.filter(methode_creation='import').count(), 3)
+        self.client_test.refresh_from_db()
+        self.assertEqual(self.client_test.nb_factures, 3)
+        self.assertEqual(self.client_test.total_impaye, Decimal("287.55"))
+
+    def test_import_jsonl_avec_erreurs(self):
+        """Les lignes invalides sont rejetées et rapportées sans bloquer les autres."""
+        chemin = self._fichier('factures.jsonl', "\n".join([
+            json.dumps({"numero": "IMP-010", "date": "2024-02-01", "montant_ht": "100",
+                        "client": "Client Import", "categorie": "Services"}),
+            json.dumps({"numero": "IMP-011", "date": "pas une date", "montant_ht": "100",
+                        "client": "Client Import"}),
+            json.dumps({"numero": "IMP-012", "date": "2024-02-03", "montant_ht": "100",
+                        "client": "Inconnu"}),
+            "{ invalide",
+        ]))
+        rapport = self._fichier('rapport.csv', '')
+        sortie, erreurs = self._importer(chemin, '--rapport', rapport)
+
+        self.assertIn("1 facture(s) importée(s), 3 ligne(s) rejetée(s)", sortie)
+        self.assertIn("Ligne 2 : date invalide", erreurs)
+        self.assertIn("Ligne 3 : client inconnu", erreurs)
+        with open(rapport, encoding='utf-8') as f:
+            self.assertEqual(len(f.read().strip().splitlines()), 4)
+        self.assertEqual(Facture.objects.get(numero="IMP-010").montant_ttc, Decimal("120.00"))
+
+    def test_montants_non_finis_ou_hors_limites(self):
+        """NaN, Infinity et les montants trop grands pour les colonnes sont rejetés."""
+        chemin = self._fichier('factures.csv', (
+            "numero,date,montant_ht,taux_tva,client\n"
+            "IMP-030,2024-01-01,NaN,20.00,Client Import\n"
+            "IMP-031,2024-01-01,Infinity,20.00,Client Import\n"
+            "IMP-032,2024-01-01,1e12,20.00,Client Import\n"
+            "IMP-033,2024-01-01,100.00,-inf,Client Import\n"
+            "IMP-034,2024-01-01,100.001,20.00,Client Import\n"
+            "IMP-035,2024-01-01,99999999.99,20.00,Client Import\n"
+            "IMP-036,2024-01-01,100.00,20.00,Client Import\n"
+        ))
+        sortie, erreurs = self._importer(chemin)
+
+        self.assertIn("1 facture(s) importée(s), 6 ligne(s) rejetée(s)", sortie)
+        for ligne in range(2, 8):
+            self.assertIn(f"Ligne {ligne} : montant ou taux de TVA invalide", erreurs)
+        self.assertEqual(list(Facture.objects.values_list('numero', flat=True)), ["IMP-036"])
+
+    def test_numero_trop_long(self):
+        """Un numéro plus long que la colonne ne rejette que sa ligne."""
+        numero = "N" * 256
+        chemin = self._fichier('factures.csv', (
+            "numero,date,montant_ht,client\n"
+            f"{numero},2024-01-01,100.00,Client Import\n"
+            "IMP-040,2024-01-01,100.00,Client Import\n"
+        ))
+        sortie, erreurs = self._importer(chemin)
+
+        self.assertIn("1 facture(s) importée(s), 1 ligne(s) rejetée(s)", sortie)
+        self.assertIn(f"Ligne 2 : numéro invalide : {numero!r}", erreurs)
+        self.assertEqual(list(Facture.objects.values_list('numero', flat=True)), ["IMP-040"])
+
+    def test_dry_run(self):
+        """Le mode --dry-run valide le fichier sans rien écrire en base."""
+        chemin = self._fichier('factures.csv', (
+            "numero,date,montant_ht,client\n"
+            "IMP-020,2024-01-01,100.00,Client Import\n"
+        ))
+        sortie, _ = self._importer(chemin, '--dry-run')
+        self.assertIn("1 facture(s) validée(s)", sortie)
+        self.assertFalse(Facture.objects.exists())
+        self.assertFalse(Categorie.objects.filter(nom="Autres").exists())
+
+    def test_numeros_attribues_et_doublons(self):
+        """Numéros manquants réservés par année, à la suite des numéros fournis ; doublons rejetés."""
+        Facture.objects.create(
+            numero="IMP-030", date="2024-01-01", montant_ht=Decimal("10.00"),
+            taux_tva=Decimal("20.00"), client=self.client_test, categorie=self.categorie,
+        )
+        chemin = self._fichier('factures.csv', (
+            "numero,date,montant_ht,client\n"
+            ",2024-03-01,100.00,Client Import\n"
+            "FAC-2024-000007,2024-03-02,100.00,Client Import\n"
+            ",2024-03-03,100.00,Client Import\n"
+            ",2025-01-01,100.00,Client Import\n"
+            "IMP-030,2024-03-04,100.00,Client Import\n"
+            "FAC-2024-000007,2024-03-05,100.00,Client Import\n"
+        ))
+        sortie, erreurs = self._importer(chemin)
+
+        self.assertIn("4 facture(s) importée(s), 2 ligne(s) rejetée(s)", sortie)
+        self.assertIn("Ligne 6 : numéro déjà utilisé : 'IMP-030'", erreurs)
+        self.assertIn("Ligne 7 : numéro déjà utilisé : 'FAC-2024-000007'", erreurs)
+        self.assertEqual(
+            list(Facture.objects.filter(numero__startswith='FAC-').order_by('date').values_list('numero', flat=True)),
+            ['FAC-2024-000008', 'FAC-2024-000007', 'FAC-2024-000009', 'FAC-2025-000001'],
+        )
+
+
+class GenererDonneesCommandTest(TestCase):
+    """
+    Tests de la commande generer_donnees et des fonctions du banc d'essai (bench).
+    """
+
+    def _generer(self, *args):
+        from io import StringIO
+        from django.core.management import call_command
+        sortie = StringIO()
+        call_command('generer_donnees', *args, stdout=sortie)
+        return sortie.getvalue()
+
+    def test_donnees_desequilibrees_et_coherentes(self):
+        """Quelques clients concentrent les factures ; compteurs, agrégats et index sont à jour."""
+        from .models import FactureRollupMensuel
+        sortie = self._generer('--clients', '20', '--factures', '600', '--categories', '30', '--taille-lot', '250')
+        self.assertIn("600 facture(s) générée(s)", sortie)
+        self.assertEqual(Client.objects.count(), 20)
+        self.assertEqual(Categorie.objects.count(), 30)
+
+        volumes = list(Client.objects.order_by('-nb_factures').values_list('nb_factures', flat=True))
+        self.assertEqual(sum(volumes), 600)
+        self.assertGreater(volumes[0], 5 * volumes[10])
+        self.assertGreater(Facture.objects.dates('date', 'year').count(), 1)
+
+        self.assertFalse(Client.objects.incoherents().exists())
+        self.assertFalse(Categorie.objects.incoherents().exists())
+        self.assertEqual(FactureRollupMensuel.objects.ecarts(), [])
+        self.assertFalse(Facture.objects.montants_incoherents().exists())
+        facture = Facture.objects.select_related('client').first()
+        self.assertIn(facture, Facture.objects.recherche_avancee(facture.numero))
+
+    def test_graine_reproductible(self):
+        """Une même graine produit les mêmes données."""
+        champs = ('client__nom', 'categorie__nom', 'date', 'montant_ht', 'taux_tva', 'paye')
+        self._generer('--clients', '5', '--factures', '50', '--seed', '3')
+        premieres = list(Facture.objects.order_by('id').values_list(*champs))
+        Facture.objects.all().delete()
+        Client.objects.all().delete()
+        Categorie.objects.all().delete()
+        self._generer('--clients', '5', '--factures', '50', '--seed', '3')
+        self.assertEqual(list(Facture.objects.order_by('id').values_list(*champs)), premieres)
+
+    def test_comparaison_reference(self):
+        """Ralentissement au-delà du seuil et du plancher, ou requêtes en plus : régression."""
+        from .management.commands.bench import comparer
+
+        def resultats(**mesures):
+            return {'mesures': {'1000': {'methodes': {
+                nom: {'mediane_ms': duree, 'requetes': requetes} for nom, (duree, requetes) in mesures.items()
+            }}}}
+
+        reference = resultats(a=(10.0, 1), b=(10.0, 1), c=(0.5, 1), d=(10.0, 1))
+        actuels = resultats(a=(11.0, 1), b=(20.0, 1), c=(1.5, 1), d=(9.0, 2), e=(50.0, 9))
+        regressions = comparer(actuels, reference, seuil=0.25, plancher_ms=2.0)
+        self.assertEqual([cle for cle, *_ in regressions], ['1000 methodes b', '1000 methodes d'])
+
+    def test_urls_mesurees(self):
+        """Chaque route nommée de facture/urls.py sans paramètre autre que pk est mesurée."""
+        from .management.commands.bench import urls_mesurees
+        from .urls import urlpatterns
+        noms = {nom.split(' ')[0] for nom, _ in urls_mesurees()}
+        self.assertEqual(noms, {
+            motif.name for motif in urlpatterns if not set(motif.pattern.converters) - {'pk'}
+        })
+        self.assertIn('liste_profils', noms)
+        self.assertIn(('detail_client', '/clients/1/'), urls_mesurees())
+
+
+class ExportFacturesTest(TestCase):
+    """
+    Tests de l'export CSV en flux (vue et commande exporter_factures).
+    """
+
+    def setUp(self):
+        self.client_a = Client.objects.create(nom="Client A")
+        self.client_b = Client.objects.create(nom="Client B")
+        self.categorie = Categorie.objects.create(nom="Services", couleur="#FF5733")
+        for i, (client, jour) in enumerate([(self.client_a, 5), (self.client_b, 10), (self.client_a, 20)]):
+            Facture.objects.create(
+                numero=f"EXP-{i}", date=date(2024, 3, jour), montant_ht=Decimal("100.00"),
+                taux_tva=Decimal("20.00"), client=client, categorie=self.categorie,
+            )
+
+    def _lire_csv(self, contenu):
+        import csv
+        return list(csv.reader(contenu.splitlines()))
+
+    def test_export_streaming_filtre(self):
+        """La vue renvoie un flux CSV filtré par client et période."""
+        response = self.client.get('/factures/export/', {
+            'client': self.client_a.id, 'date_debut': '2024-03-01', 'date_fin': '2024-03-10',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lignes = self._lire_csv(b"".join(response.streaming_content).decode())
+        self.assertEqual(lignes[0][0], 'numero')
+        self.assertEqual(lignes[1], ['EXP-0', '2024-03-05', '100.00', '20.00', '20.00',
+                                     '120.00', 'Client A', 'Services', 'False'])
+        self.assertEqual(len(lignes), 2)
+
+    def test_export_date_invalide(self):
+        """Une date mal formée est refusée."""
+        response = self.client.get('/factures/export/', {'date_debut': '03/2024'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_commande_export(self):
+        """La commande exporte les factures dans l'ordre (-date, -id)."""
+        from io import StringIO
+        from django.core.management import call_command
+        sortie = StringIO()
+        call_command('exporter_factures', '--categorie', str(self.categorie.id), stdout=sortie)
+        lignes = self._lire_csv(sortie.getvalue())
+        self.assertEqual([ligne[0] for ligne in lignes[1:]], ['EXP-2', 'EXP-1', 'EXP-0'])
+
+
+class IndexRechercheTest(TestCase):
+    """
+    Tests de l'index plein texte utilisé par FactureQuerySet.recherche_avancee().
+    """
+
+    def setUp(self):
+        self.dupont = Client.objects.create(nom="Jean Dupont", email="jean@dupont.fr")
+        self.martin = Client.objects.create(nom="Marie Martin", email="marie@exemple.com")
+        self.categorie = Categorie.objects.create(nom="Services", couleur="#FF5733")
+        self.f1 = self._creer("FAC-2024-001", self.dupont)
+        self.f2 = self._creer("FAC-2024-002", self.martin)
+
+    def _creer(self, numero, client):
+        return Facture.objects.create(
+            numero=numero, date="2024-01-01", montant_ht=Decimal("10.00"),
+            taux_tva=Decimal("20.00"), client=client, categorie=self.categorie,
+        )
+
+    def _numeros(self, terme):
+        return sorted(Facture.objects.recherche_avancee(terme).values_list('numero', flat=True))
+
+    def test_recherche_sous_chaine(self):
+        """Numéro, nom et email sont trouvés par sous-chaîne, sans tenir compte de la casse."""
+        self.assertEqual(self._numeros("2024-002"), ["FAC-2024-002"])
+        self.assertEqual(self._numeros("upon"), ["FAC-2024-001"])
+        self.assertEqual(self._numeros("EXEMPLE.COM"), ["FAC-2024-002"])
+        self.assertEqual(self._numeros("FAC-2024"), ["FAC-2024-001", "FAC-2024-002"])
+
+    def test_synchronisation(self):
+        """L'index suit les modifications de factures et de clients."""
+        self.martin.nom = "Marie Durand"
+        self.martin.save()
+        self.assertEqual(self._numeros("Durand"), ["FAC-2024-002"])
+        self.assertEqual(self._numeros("Martin"), [])
+
+        Facture.objects.filter(pk=self.f1.pk).update(numero="AVOIR-77")
+        self.assertEqual(self._numeros("AVOIR"), ["AVOIR-77"])
+
+        self.f2.delete()
+        self.assertEqual(self._numeros("Durand"), [])
+
+        Facture.objects.bulk_create([Facture(
+            numero="BULK-1", date="2024-01-01", montant_ht=Decimal("1"), taux_tva=Decimal("0"),
+            montant_tva=Decimal("0"), montant_ttc=Decimal("1"), client=self.dupont,
+        )])
+        self.assertEqual(self._numeros("BULK"), ["BULK-1"])
+
+    def test_classement_par_pertinence(self):
+        """Les factures dont plusieurs champs correspondent sont classées en premier."""
+        client = Client.objects.create(nom="Martin SARL", email="contact@martin.fr")
+        facture = self._creer("FAC-2024-003", client)
+        resultats = list(Facture.objects.recherche_avancee("martin"))
+        self.assertEqual(resultats[0], facture)
+
+    def test_terme_court_et_guillemets(self):
+        """Les termes trop courts et les guillemets restent gérés."""
+        self.assertEqual(self._numeros("Ma"), ["FAC-2024-002"])
+        self.assertEqual(self._numeros('"FAC'), [])
+
+    def test_commande_reconstruction(self):
+        """La commande reconstruit l'index à partir des tables."""
+        from io import StringIO
+        from django.core.management import call_command
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM facture_recherche")
+        self.assertEqual(self._numeros("FAC-2024"), [])
+
+        sortie = StringIO()
+        call_command('reconstruire_index_recherche', stdout=sortie)
+        self.assertIn("2 facture(s) indexée(s)", sortie.getvalue())
+        self.assertEqual(self._numeros("FAC-2024"), ["FAC-2024-001", "FAC-2024-002"])
+
+    def test_recherche_admin(self):
+        """La recherche de l'administration passe par l'index."""
+        from django.contrib.auth.models import User
+        admin = User.objects.create_superuser("admin", "admin@example.com", "motdepasse")
+        self.client.force_login(admin)
+        response = self.client.get('/admin/facture/facture/', {'q': 'upon'})
+        self.assertContains(response, "FAC-2024-001")
+        self.assertNotContains(response, "FAC-2024-002")
+
+
+class ExpliquerRequetesTest(TestCase):
+    """
+    Audit des plans d'exécution : aucune méthode de FactureQuerySet / FactureManager
+    ne doit parcourir entièrement facture_facture sans que ce soit attendu.
+    """
+
+    def test_aucun_parcours_complet_inattendu(self):
+        """La commande réussit en mode strict avec les index composites et partiels."""
+        from io import StringIO
+        from django.core.management import call_command
+        sortie = StringIO()
+        call_command('expliquer_requetes', strict=True, stdout=sortie)
+        self.assertIn("facture_client_date_idx", sortie.getvalue())
+        self.assertIn("facture_impayees_client_idx", sortie.getvalue())
+        self.assertIn("aucun parcours complet inattendu", sortie.getvalue())
+
+    def test_parcours_complet_signale(self):
+        """Une requête sans index adapté fait échouer le mode strict."""
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from facture.management.commands import expliquer_requetes
+        catalogue = [('par_montant', lambda m: m.filter(montant_ht__gt=100), False)]
+        with mock.patch.object(expliquer_requetes, 'REQUETES_AUDITEES', catalogue):
+            with self.assertRaisesMessage(CommandError, "par_montant (facture_facture)"):
+                call_command('expliquer_requetes', strict=True, stdout=StringIO())
+
+
+class RecalculMontantsTest(TestCase):
+    """
+    Tests du recalcul ensembliste des montants de TVA et TTC.
+    """
+
+    def setUp(self):
+        self.client_test = Client.objects.create(nom="Client Test")
+        montants = [("100.00", "20.00"), ("10.05", "5.50"), ("0.01", "50.00"), ("-0.10", "5.00")]
+        self.factures = [
+            Facture.objects.create(
+                numero=f"FAC-{i}", date="2024-01-01", montant_ht=Decimal(ht),
+                taux_tva=Decimal(taux), client=self.client_test,
+            )
+            for i, (ht, taux) in enumerate(montants)
+        ]
+        self.attendus = list(Facture.objects.order_by('pk').values_list('montant_tva', 'montant_ttc'))
+
+    def _montants(self):
+        return list(Facture.objects.order_by('pk').values_list('montant_tva', 'montant_ttc'))
+
+    def test_arrondi_au_centime(self):
+        """save() et le calcul SQL arrondissent le demi-centime à l'opposé de zéro."""
+        self.assertEqual(self.attendus, [
+            (Decimal("20.00"), Decimal("120.00")),
+            (Decimal("0.55"), Decimal("10.60")),
+            (Decimal("0.01"), Decimal("0.02")),
+            (Decimal("-0.01"), Decimal("-0.11")),
+        ])
+        self.assertFalse(Facture.objects.montants_incoherents().exists())
+
+    def test_recalcul_en_une_requete(self):
+        """Les montants corrompus sont recalculés par un seul UPDATE, sans toucher aux autres."""
+        Facture.objects.filter(pk__in=[f.pk for f in self.factures[:2]]).update(
+            montant_tva=Decimal("0"), montant_ttc=Decimal("0")
+        )
+        self.assertEqual(Facture.objects.montants_incoherents().count(), 2)
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as capture:
+            self.assertEqual(Facture.objects.recalculer_montants(), 2)
+        mises_a_jour = [q for q in capture.captured_queries if q['sql'].startswith('UPDATE "facture_facture"')]
+        self.assertEqual(len(mises_a_jour), 1)
+
+        self.assertEqual(self._montants(), self.attendus)
+        self.assertEqual(Facture.objects.recalculer_montants(), 0)
+        self.client_test.refresh_from_db()
+        self.assertEqual(self.client_test.total_ttc, Decimal("130.51"))
+
+    def test_recalcul_par_tranches(self):
+        """Le mode par tranches donne le même résultat."""
+        Facture.objects.update(montant_tva=Decimal("0"), montant_ttc=Decimal("0"))
+        self.assertEqual(Facture.objects.recalculer_montants(taille_lot=3), 4)
+        self.assertEqual(self._montants(), self.attendus)
+
+    def test_commande(self):
+        """La commande indique le nombre de factures modifiées ; --dry-run ne modifie rien."""
+        from io import StringIO
+        from django.core.management import call_command
+        Facture.objects.filter(pk=self.factures[0].pk).update(montant_ttc=Decimal("1"))
+
+        sortie = StringIO()
+        call_command('recalculer_montants', dry_run=True, stdout=sortie)
+        self.assertIn("1 facture(s) à recalculer", sortie.getvalue())
+        self.assertEqual(Facture.objects.montants_incoherents().count(), 1)
+
+        sortie = StringIO()
+        call_command('recalculer_montants', taille_lot=2, stdout=sortie)
+        self.assertIn("1 facture(s) recalculée(s)", sortie.getvalue())
+        self.assertEqual(self._montants(), self.attendus)
+
+
+class StatistiquesParPeriodeTest(TestCase):
+    """
+    Tests de FactureQuerySet.statistiques_par_periode().
+    """
+
+    def setUp(self):
+        self.alpha = Client.objects.create(nom="Alpha")
+        self.beta = Client.objects.create(nom="Beta")
+        self.categorie = Categorie.objects.create(nom="Services", couleur="#FF5733")
+        for client, jour, paye in [
+            (self.alpha, "2024-01-15", True),
+            (self.alpha, "2024-03-02", False),
+            (self.beta, "2024-03-20", False),
+            (self.beta, "2024-07-01", True),
+        ]:
+            Facture.objects.create(
+                numero=f"FAC-{jour}", date=jour, montant_ht=Decimal("100.00"),
+                taux_tva=Decimal("20.00"), client=client, categorie=self.categorie, paye=paye,
+            )
+
+    def test_une_requete_et_remplissage_dense(self):
+        """Toutes les périodes de l'intervalle sont présentes, calculées en une requête."""
+        with self.assertNumQueries(1):
+            stats = Facture.objects.statistiques_par_periode('mois')
+        self.assertEqual([ligne['periode'] for ligne in stats],
+                         [date(2024, mois, 1) for mois in range(1, 8)])
+        mars = stats[2]
+        self.assertEqual(mars['nombre'], 2)
+        self.assertEqual(mars['total_ht'], Decimal("200.00"))
+        self.assertEqual(mars['total_tva'], Decimal("40.00"))
+        self.assertEqual(mars['total_impaye'], Decimal("240.00"))
+        self.assertEqual(mars['total_paye'], Decimal("0.00"))
+        self.assertEqual(stats[1]['nombre'], 0)
+        self.assertEqual(stats[1]['total_ttc'], Decimal("0.00"))
+
+    def test_granularites(self):
+        """Les périodes commencent au début de la semaine, du trimestre ou de l'année."""
+        semaines = Facture.objects.statistiques_par_periode('semaine')
+        self.assertEqual(semaines[0]['periode'], date(2024, 1, 15))
+        self.assertEqual(semaines[-1]['periode'], date(2024, 7, 1))
+        trimestres = Facture.objects.statistiques_par_periode('trimestre')
+        self.assertEqual([(l['periode'], l['nombre']) for l in trimestres],
+                         [(date(2024, 1, 1), 3), (date(2024, 4, 1), 0), (date(2024, 7, 1), 1)])
+        annees = Facture.objects.statistiques_par_periode('annee')
+        self.assertEqual([(l['periode'], l['nombre']) for l in annees], [(date(2024, 1, 1), 4)])
+        self.assertEqual(len(Facture.objects.statistiques_par_periode('jour')), 169)
+        with self.assertRaises(ValueError):
+            Facture.objects.statistiques_par_periode('siecle')
+
+    def test_ventilation_par_client(self):
+        """Chaque client reçoit toutes les périodes, triées par nom."""
+        stats = Facture.objects.statistiques_par_periode('trimestre', par=('client', 'categorie'))
+        self.assertEqual(
+            [(l['periode'], l['client__nom'], l['nombre']) for l in stats],
+            [
+                (date(2024, 1, 1), "Alpha", 2), (date(2024, 1, 1), "Beta", 1),
+                (date(2024, 4, 1), "Alpha", 0), (date(2024, 4, 1), "Beta", 0),
+                (date(2024, 7, 1), "Alpha", 0), (date(2024, 7, 1), "Beta", 1),
+            ],
+        )
+        self.assertTrue(all(l['categorie__nom'] == "Services" for l in stats))
+
+    def test_bornes(self):
+        """Les bornes filtrent les factures et délimitent les périodes complétées."""
+        stats = Facture.objects.statistiques_par_periode(
+            'mois', date_debut=date(2023, 12, 10), date_fin=date(2024, 2, 29)
+        )
+        self.assertEqual([(l['periode'], l['nombre']) for l in stats],
+                         [(date(2023, 12, 1), 0), (date(2024, 1, 1), 1), (date(2024, 2, 1), 0)])
+        self.assertEqual(Facture.objects.par_client(self.beta.pk).statistiques_par_periode('annee')[0]['nombre'], 2)
+
+
+class CacheRapportsTest(TransactionTestCase):
+    """
+    Tests du cache versionné des rapports (FactureQuerySet.en_cache()).
+    TransactionTestCase : la version des données n'est incrémentée qu'au commit.
+    """
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .cache_rapports import statistiques_cache
+        cache.clear()
+        statistiques_cache.reinitialiser()
+        self.statistiques = statistiques_cache
+        self.alpha = Client.objects.create(nom="Alpha")
+        self.beta = Client.objects.create(nom="Beta")
+        self.facture = self._creer(self.alpha, "100.00")
+        self._creer(self.beta, "50.00")
+
+    def _creer(self, client, montant_ht):
+        self.rang = getattr(self, 'rang', 0) + 1
+        return Facture.objects.create(
+            numero=f"FAC-{self.rang}", date="2024-01-01", montant_ht=Decimal(montant_ht),
+            taux_tva=Decimal("20.00"), client=client,
+        )
+
+    def test_succes_apres_premier_appel(self):
+        """Le second appel est servi par le cache, sans requête."""
+        with self.assertNumQueries(1):
+            premier = Facture.objects.en_cache().tableau_de_bord()
+        with self.assertNumQueries(0):
+            second = Facture.objects.en_cache().tableau_de_bord()
+        self.assertEqual(premier, second)
+        self.assertEqual(second['total_ttc'], Decimal("180.00"))
+        self.assertEqual(self.statistiques.en_dict(), {'succes': 1, 'echecs': 1, 'taux_succes': 0.5})
+
+    def test_cle_selon_filtres_et_arguments(self):
+        """Les filtres du QuerySet et les arguments font partie de la clé."""
+        self.assertEqual(Facture.objects.par_client(self.alpha.pk).en_cache().montant_total(), Decimal("120.00"))
+        self.assertEqual(Facture.objects.par_client(self.beta.pk).en_cache().montant_total(), Decimal("60.00"))
+        self.assertEqual(Facture.objects.filter(pk__in=[]).en_cache().montant_total(), Decimal("0.00"))
+        self.assertEqual(len(Facture.objects.en_cache().top_clients(1)), 1)
+        self.assertEqual(len(Facture.objects.en_cache().top_clients(2)), 2)
+        self.assertEqual(self.statistiques.en_dict()['succes'], 0)
+
+    def test_invalidation_apres_ecritures(self):
+        """Signaux, update() et delete() en masse invalident les rapports."""
+        rapport = lambda: Facture.objects.en_cache().montant_total()
+        self.assertEqual(rapport(), Decimal("180.00"))
+
+        self._creer(self.beta, "10.00")
+        self.assertEqual(rapport(), Decimal("192.00"))
+
+        Facture.objects.filter(pk=self.facture.pk).update(montant_ttc=Decimal("0.00"))
+        self.assertEqual(rapport(), Decimal("72.00"))
+
+        Facture.objects.filter(client=self.beta).delete()
+        self.assertEqual(rapport(), Decimal("0.00"))
+
+        Client.objects.filter(pk=self.alpha.pk).update(nom="Gamma")
+        stats = Facture.objects.en_cache().statistiques_par_client()
+        self.assertEqual([ligne['client__nom'] for ligne in stats], ["Gamma"])
+
+    def test_transaction_en_cours(self):
+        """Une transaction qui a écrit contourne le cache jusqu'à son commit."""
+        from django.db import transaction
+        self.assertEqual(Facture.objects.en_cache().montant_total(), Decimal("180.00"))
+        with transaction.atomic():
+            self._creer(self.alpha, "10.00")
+            self.assertEqual(Facture.objects.en_cache().montant_total(), Decimal("192.00"))
+        self.assertEqual(Facture.objects.en_cache().montant_total(), Decimal("192.00"))
+
+    def test_ttl(self):
+        """Une entrée expirée est recalculée."""
+        Facture.objects.en_cache(timeout=0).montant_total()
+        with self.assertNumQueries(1):
+            Facture.objects.en_cache(timeout=0).montant_total()
+
+    def test_sans_cache_par_defaut(self):
+        """Sans en_cache(), les rapports interrogent toujours la base."""
+        Facture.objects.montant_total()
+        with self.assertNumQueries(1):
+            Facture.objects.montant_total()
+        self.assertEqual(self.statistiques.en_dict()['echecs'], 0)
+
+    def test_cache_par_processus_refuse(self):
+        """Avec plusieurs processus, un LocMemCache ne sert pas les rapports."""
+        from .cache_rapports import _alias_refuses
+        _alias_refuses.clear()
+        with override_settings(CACHE_RAPPORTS_FACTURES={'PROCESSUS_MULTIPLES': True}):
+            with self.assertLogs('facture.cache_rapports', 'WARNING'):
+                Facture.objects.en_cache().montant_total()
+            with self.assertNumQueries(1):
+                self.assertEqual(Facture.objects.en_cache().montant_total(), Decimal("180.00"))
+        self.assertEqual(self.statistiques.en_dict()['succes'], 0)
+
+    def test_cache_en_base_partage(self):
+        """Le cache en base du profil de production sert et invalide les rapports."""
+        from django.core.management import call_command
+        from django.db import connection
+        caches_base = {'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'facture_cache_test',
+        }}
+        with override_settings(CACHES=caches_base, CACHE_RAPPORTS_FACTURES={'PROCESSUS_MULTIPLES': True}):
+            call_command('createcachetable', verbosity=0)
+            self.addCleanup(connection.cursor().execute, 'DROP TABLE facture_cache_test')
+            rapport = lambda: Facture.objects.en_cache().montant_total()
+            self.assertEqual(rapport(), Decimal("180.00"))
+            self.assertEqual(rapport(), Decimal("180.00"))
+            self.assertEqual(self.statistiques.en_dict()['succes'], 1)
+
+            self._creer(self.beta, "10.00")
+            self.assertEqual(rapport(), Decimal("192.00"))
+
+
+class FragmentsCacheTest(TransactionTestCase):
+    """
+    Tests des fragments de templates en cache ({% cache_donnees %}) des pages
+    d'accueil et de liste des factures.
+    TransactionTestCase : la version des données n'est incrémentée qu'au commit.
+    """
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.categorie = Categorie.objects.create(nom="Services", couleur="#123456")
+        self.clients = [Client.objects.create(nom=f"Client {i}") for i in range(20)]
+        for i, client in enumerate(self.clients):
+            Facture.objects.create(
+                numero=f"FAC-{i}", date="2024-01-01", montant_ht=Decimal("100.00"),
+                taux_tva=Decimal("20.00"), client=client, categorie=self.categorie,
+            )
+
+    def _compter(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(requetes)
+
+    def test_liste_servie_par_le_cache(self):
+        """Sans écriture, les noms des filtres ne sont plus lus en base."""
+        premiere, avant = self._compter('/factures/')
+        seconde, apres = self._compter('/factures/')
+        self.assertEqual(apres, avant - 2)
+        self.assertEqual(premiere.content, seconde.content)
+
+    def test_accueil_servi_par_le_cache(self):
+        """Sans écriture, les aperçus de la page d'accueil ne sont plus lus en base."""
+        premiere, avant = self._compter('/')
+        seconde, apres = self._compter('/')
+        # Indicateurs servis par le cache des rapports, aperçus par celui des fragments
+        self.assertEqual(avant, 6)
+        self.assertEqual(apres, 0)
+        self.assertEqual(premiere.content, seconde.content)
+
+    def test_cache_par_processus_refuse(self):
+        """Avec plusieurs processus, un LocMemCache ne sert pas les fragments."""
+        with override_settings(CACHE_RAPPORTS_FACTURES={'PROCESSUS_MULTIPLES': True}):
+            premiere, avant = self._compter('/')
+            seconde, apres = self._compter('/')
+        self.assertEqual(apres, avant)
+        self.assertEqual(premiere.content, seconde.content)
+
+    def test_invalidation_apres_ecriture(self):
+        """Une écriture sur un client ou une facture change les fragments affichés."""
+        self.client.get('/factures/')
+        self.client.get('/')
+        client = self.clients[0]
+        client.nom = "Alpha"
+        client.save()
+        self.assertContains(self.client.get('/factures/'), "Alpha")
+        self.assertContains(self.client.get('/'), "Alpha")
+
+        Facture.objects.filter(numero="FAC-19").update(paye=True)
+        response = self.client.get('/factures/')
+        self.assertContains(response, "Payée", count=1)
+
+    def test_badges_filtres(self):
+        """Les filtres actifs affichent le nom sélectionné, sans erreur pour un identifiant inconnu."""
+        client = self.clients[3]
+        response = self.client.get(f'/factures/?client={client.pk}&categorie={self.categorie.pk}')
+        self.assertContains(response, "Client: Client 3")
+        self.assertContains(response, "Catégorie: Services")
+        self.assertContains(response, f'<option value="{client.pk}" selected>', html=False)
+        # La sélection fait partie de la clé du fragment des filtres
+        response = self.client.get('/factures/')
+        self.assertNotContains(response, "selected>")
+
+        response = self.client.get('/factures/?client=999999')
+        self.assertNotContains(response, "Client:")
+        self.assertEqual(response.context['nom_client_selectionne'], None)
+
+
+class RollupMensuelTest(TestCase):
+    """
+    Tests des agrégats mensuels maintenus par delta (FactureRollupMensuel).
+    """
+
+    def setUp(self):
+        from .models import FactureRollupMensuel
+        self.Rollup = FactureRollupMensuel
+        self.alpha = Client.objects.create(nom="Alpha")
+        self.beta = Client.objects.create(nom="Beta")
+        self.services = Categorie.objects.create(nom="Services", couleur="#FF5733")
+        self.produits = Categorie.objects.create(nom="Produits", couleur="#33FF57")
+        self.f1 = self._creer(self.alpha, "2024-01-15", "100.00")
+        self.f2 = self._creer(self.alpha, "2024-01-20", "50.00")
+        self.f3 = self._creer(self.beta, "2024-02-03", "10.05", taux="5.50")
+
+    def _creer(self, client, jour, montant_ht, taux="20.00", categorie=None):
+        return Facture.objects.create(
+            numero=f"FAC-{jour}", date=jour, montant_ht=Decimal(montant_ht),
+            taux_tva=Decimal(taux), client=client, categorie=categorie or self.services,
+        )
+
+    def assertCoherent(self):
+        self.assertEqual(self.Rollup.objects.ecarts(), [])
+
+    def test_creation(self):
+        """Les factures d'un même mois, client, catégorie, taux et statut sont cumulées."""
+        self.assertEqual(self.Rollup.objects.count(), 2)
+        janvier = self.Rollup.objects.get(mois=date(2024, 1, 1))
+        self.assertEqual(janvier.nombre, 2)
+        self.assertEqual(janvier.montant_ht, Decimal("150.00"))
+        self.assertEqual(janvier.montant_ttc, Decimal("180.00"))
+        self.assertCoherent()
+
+    def test_modifications(self):
+        """Montant, client, catégorie, paiement et mois modifiés déplacent la contribution."""
+        self.f1.montant_ht = Decimal("200.00")
+        self.f1.save()
+        self.assertCoherent()
+
+        self.f2.client = self.beta
+        self.f2.categorie = self.produits
+        self.f2.save()
+        self.assertCoherent()
+
+        self.f3.paye = True
+        self.f3.date = date(2024, 3, 1)
+        self.f3.save()
+        self.assertCoherent()
+        self.assertFalse(self.Rollup.objects.filter(mois=date(2024, 2, 1)).exists())
+
+        partielle = Facture.objects.only('id', 'paye').get(pk=self.f1.pk)
+        partielle.paye = True
+        partielle.save(update_fields=['paye'])
+        self.assertCoherent()
+
+    def test_modification_par_le_formulaire(self):
+        """Une facture modifiée depuis la vue ne compte qu'une fois dans les agrégats."""
+        response = self.client.post(f'/factures/{self.f1.pk}/modifier/', {
+            'numero': self.f1.numero, 'date': "2024-02-10", 'montant_ht': "300.00", 'taux_tva': "20.00",
+            'client': self.beta.pk, 'categorie': self.produits.pk, 'paye': "on",
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertCoherent()
+        tableau = Facture.objects.tableau_de_bord()
+        self.assertEqual(tableau['total_factures'], 3)
+        self.assertEqual(tableau, Facture.objects.filter(pk__gt=0).tableau_de_bord())
+
+    def test_suppressions(self):
+        """Les lignes retombées à zéro facture disparaissent, y compris en cascade."""
+        self.f3.delete()
+        self.assertCoherent()
+        self.assertEqual(self.Rollup.objects.count(), 1)
+        self.alpha.delete()
+        self.assertEqual(self.Rollup.objects.count(), 0)
+
+    def test_operations_en_masse(self):
+        """update() et bulk_create() reconstruisent les mois touchés."""
+        Facture.objects.filter(client=self.alpha).update(paye=True)
+        self.assertCoherent()
+        Facture.objects.filter(pk=self.f3.pk).update(date=date(2023, 12, 31))
+        self.assertCoherent()
+        Facture.objects.bulk_create([Facture(
+            numero="BULK", date=date(2024, 5, 5), montant_ht=Decimal("1.00"), taux_tva=Decimal("20.00"),
+            montant_tva=Decimal("0.20"), montant_ttc=Decimal("1.20"), client=self.beta,
+        )])
+        self.assertCoherent()
+        Facture.objects.filter(pk=self.f1.pk).update(montant_ttc=Decimal("0"))
+        Facture.objects.recalculer_montants()
+        self.assertCoherent()
+
+    def test_operations_en_masse_par_delta(self):
+        """update() et bulk_create() n'écrivent que les lignes d'agrégat qu'ils touchent."""
+        # Ligne d'un autre client du même mois, volontairement faussée : jamais reconstruite
+        self.Rollup.objects.filter(mois=date(2024, 2, 1), client=self.beta).update(nombre=10)
+        Facture.objects.bulk_create([
+            Facture(
+                numero=f"BULK-{rang}", date=date(2024, 2, 10), montant_ht=Decimal("10.00"),
+                taux_tva=Decimal("20.00"), montant_tva=Decimal("2.00"), montant_ttc=Decimal("12.00"),
+                client=self.alpha, categorie=self.services, paye=rang % 2 == 0,
+            )
+            for rang in range(3)
+        ])
+        Facture.objects.filter(client=self.alpha, date__month=1).update(paye=True, date=date(2024, 2, 1))
+        Facture.objects.filter(numero="BULK-1").update(montant_ttc=Decimal("13.00"))
+
+        self.assertEqual(self.Rollup.objects.get(mois=date(2024, 2, 1), client=self.beta).nombre, 10)
+        self.assertEqual(self.Rollup.objects.ecarts(), [(
+            (date(2024, 2, 1), self.beta.pk, self.services.pk, Decimal("5.50"), False),
+            (10, Decimal("10.05"), Decimal("0.55"), Decimal("10.60")),
+            (1, Decimal("10.05"), Decimal("0.55"), Decimal("10.60")),
+        )])
+        self.assertFalse(self.Rollup.objects.filter(mois=date(2024, 1, 1)).exists())
+        payees = self.Rollup.objects.get(mois=date(2024, 2, 1), client=self.alpha, paye=True)
+        self.assertEqual((payees.nombre, payees.montant_ttc), (4, Decimal("204.00")))
+
+    def test_rapports_lus_dans_les_agregats(self):
+        """Sans filtre, les rapports lisent les agrégats ; filtrés, les factures."""
+        self.Rollup.objects.filter(mois=date(2024, 1, 1)).update(nombre=10)
+        self.assertEqual(Facture.objects.tableau_de_bord()['total_factures'], 11)
+        self.assertEqual(Facture.objects.statistiques_par_periode('annee')[0]['nombre'], 11)
+        self.assertEqual(Facture.objects.statistiques_par_periode('jour')[0]['nombre'], 1)
+        self.assertEqual(Facture.objects.par_client(self.alpha.pk).tableau_de_bord()['total_factures'], 2)
+        self.assertEqual(
+            Facture.objects.statistiques_par_periode('mois', date_debut=date(2024, 1, 10))[0]['nombre'], 2
+        )
+        self.assertEqual(Facture.objects.montant_total(), Decimal("190.60"))
+
+        self.Rollup.objects.reconstruire()
+        tableau = Facture.objects.tableau_de_bord()
+        self.assertEqual(tableau['total_factures'], 3)
+        self.assertEqual(tableau['total_tva'], Decimal("30.55"))
+        self.assertEqual(tableau, Facture.objects.filter(pk__gt=0).tableau_de_bord())
+
+    def test_commande(self):
+        """La commande détecte puis corrige les écarts."""
+        from io import StringIO
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        self.Rollup.objects.filter(mois=date(2024, 2, 1)).delete()
+        with self.assertRaisesMessage(CommandError, "1 agrégat(s) incohérent(s)"):
+            call_command('reconstruire_rollups', verifier=True, stdout=StringIO())
+
+        sortie = StringIO()
+        call_command('reconstruire_rollups', stdout=sortie)
+        self.assertIn("2 agrégat(s) mensuel(s) reconstruit(s)", sortie.getvalue())
+        call_command('reconstruire_rollups', verifier=True, stdout=StringIO())
+
+
+@override_settings(ROUTAGE_BASES={'PRIMAIRE': 'default', 'REPLICAS': ['replica_1'], 'DELAI_EPINGLAGE': 5})
+class RouteurReplicasTest(SimpleTestCase):
+    """
+    Tests du routage primaire / réplicas (facture/routeurs.py).
+    SimpleTestCase : hors transaction, seule la base choisie est vérifiée.
+    """
+
+    def setUp(self):
+        from .routeurs import demarrer_requete
+        demarrer_requete()
+
+    def test_lectures_sur_replica(self):
+        """Les lectures vont au réplica, les écritures à la primaire."""
+        from django.db import router
+        self.assertEqual(Facture.objects.all().db, 'replica_1')
+        self.assertEqual(Facture.objects.depuis_replica().db, 'replica_1')
+        self.assertEqual(router.db_for_write(Facture), 'default')
+
+    def test_lecture_apres_ecriture(self):
+        """Après une écriture, les lectures du même contexte restent sur la primaire."""
+        from django.db import router
+        router.db_for_write(Facture)
+        self.assertEqual(Facture.objects.all().db, 'default')
+        # Sauf demande explicite
+        self.assertEqual(Facture.objects.depuis_replica().db, 'replica_1')
+
+    def test_cache_en_base_sur_la_primaire(self):
+        """La table de DatabaseCache est lue sur la primaire, et y écrire n'épingle pas."""
+        from django.core.cache.backends.db import DatabaseCache
+        from django.db import router
+        modele_cache = DatabaseCache('facture_cache', {}).cache_model_class
+        self.assertEqual(router.db_for_read(modele_cache), 'default')
+        self.assertEqual(router.db_for_write(modele_cache), 'default')
+        self.assertEqual(Facture.objects.all().db, 'replica_1')
+
+    def test_epinglage_explicite(self):
+        """lecture_primaire() et depuis_primaire() forcent la base primaire."""
+        from .routeurs import lecture_primaire
+        self.assertEqual(Facture.objects.depuis_primaire().db, 'default')
+        with lecture_primaire():
+            self.assertEqual(Client.objects.all().db, 'default')
+        self.assertEqual(Client.objects.all().db, 'replica_1')
+
+    def test_sans_replica(self):
+        """Sans réplica configuré, tout va à la primaire."""
+        with self.settings(ROUTAGE_BASES={'REPLICAS': []}):
+            self.assertEqual(Facture.objects.all().db, 'default')
+
+    def test_middleware(self):
+        """Les requêtes d'écriture et celles qui suivent une écriture lisent sur la primaire."""
+        from django.db import router
+        from django.http import HttpResponse
+        from .middleware import EpinglagePrimaireMiddleware
+        factory = RequestFactory()
+        bases = []
+
+        def vue_ecriture(request):
+            bases.append(Facture.objects.all().db)
+            router.db_for_write(Facture)
+            return HttpResponse()
+
+        def vue_lecture(request):
+            bases.append(Facture.objects.all().db)
+            return HttpResponse()
+
+        reponse = EpinglagePrimaireMiddleware(vue_ecriture)(factory.post('/factures/creer/'))
+        self.assertEqual(reponse.cookies['epingle_primaire']['max-age'], 5)
+
+        EpinglagePrimaireMiddleware(vue_lecture)(factory.get('/factures/'))
+        requete = factory.get('/factures/')
+        requete.COOKIES['epingle_primaire'] = '1'
+        reponse = EpinglagePrimaireMiddleware(vue_lecture)(requete)
+        self.assertNotIn('epingle_primaire', reponse.cookies)
+        self.assertEqual(bases, ['default', 'replica_1', 'default'])
+
+
+class ConnexionsSqliteTest(SimpleTestCase):
+    """
+    Tests du réglage des connexions SQLite (facture/connexions.py) et du
+    profil de production. Les connexions testées ouvrent un fichier temporaire.
+    """
+
+    def _connexion(self, chemin, **reglages):
+        from django.db import connections
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        parametres = {**connections.settings['default'], 'NAME': chemin, **reglages}
+        connexion = DatabaseWrapper(parametres, alias='essai')
+        self.addCleanup(connexion.close)
+        return connexion
+
+    def test_pragmas_appliques_a_l_ouverture(self):
+        """Les PRAGMA configurés sont appliqués à chaque nouvelle connexion."""
+        import tempfile
+        from .connexions import lire_pragmas
+        repertoire = tempfile.TemporaryDirectory()
+        self.addCleanup(repertoire.cleanup)
+        pragmas = {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 1234, 'cache_size': -4096}
+        with self.settings(PRAGMAS_SQLITE=pragmas):
+            connexion = self._connexion(f'{repertoire.name}/essai.sqlite3')
+            connexion.ensure_connection()
+        self.assertEqual(
+            lire_pragmas(connexion, pragmas),
+            {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 1234, 'cache_size': -4096},
+        )
+
+    def test_sans_reglage(self):
+        """Sans PRAGMAS_SQLITE, SQLite garde ses valeurs par défaut."""
+        import tempfile
+        from .connexions import lire_pragmas
+        repertoire = tempfile.TemporaryDirectory()
+        self.addCleanup(repertoire.cleanup)
+        connexion = self._connexion(f'{repertoire.name}/essai.sqlite3')
+        connexion.ensure_connection()
+        self.assertEqual(lire_pragmas(connexion, ['journal_mode'])['journal_mode'], 'delete')
+
+    def test_pragma_invalide(self):
+        """Les noms et valeurs de PRAGMA sont validés avant exécution."""
+        from django.db import connection
+        from .connexions import appliquer_pragmas
+        with self.assertRaises(ValueError):
+            appliquer_pragmas(connection, {'cache_size = 0; DROP TABLE facture_facture': 1})
+        with self.assertRaises(ValueError):
+            appliquer_pragmas(connection, {'cache_size': '0; DROP TABLE facture_facture'})
+
+    def test_profil_production(self):
+        """Le profil de production règle les bases SQLite sans modifier settings.DATABASES."""
+        from django.conf import settings
+        from gestion_factures import settings_production
+        base = settings_production.DATABASES['default']
+        self.assertEqual(base['CONN_MAX_AGE'], 600)
+        self.assertEqual(base['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertEqual(settings_production.PRAGMAS_SQLITE['journal_mode'], 'WAL')
+        self.assertFalse(settings_production.DEBUG)
+        self.assertNotIn('transaction_mode', settings.DATABASES['default'].get('OPTIONS', {}))
+
+
+class VuesAsynchronesTest(TestCase):
+    """
+    Tests des variantes asynchrones des vues et des rapports (facture/asynchrone.py).
+    Sur la base de test en mémoire, les requêtes sont exécutées l'une après l'autre.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_test = Client.objects.create(nom="Client Async")
+        cls.categorie = Categorie.objects.create(nom="Async", couleur="#123456")
+        for numero, (montant, paye) in enumerate([(Decimal('100.00'), True), (Decimal('50.00'), False)]):
+            Facture.objects.create(
+                numero=f"ASYNC-{numero}", date=date(2024, 3, 1), montant_ht=montant,
+                taux_tva=Decimal('20.00'), client=cls.client_test, categorie=cls.categorie, paye=paye,
+            )
+
+    async def test_rapports_asynchrones(self):
+        """Les variantes asynchrones retournent les mêmes résultats que les rapports synchrones."""
+        import asyncio
+        total, tableau_de_bord, periodes, top = await asyncio.gather(
+            Facture.objects.amontant_total(),
+            Facture.objects.atableau_de_bord(),
+            Facture.objects.astatistiques_par_periode('mois'),
+            Facture.objects.atop_clients(1),
+        )
+        self.assertEqual(total, Decimal('180.00'))
+        self.assertEqual(tableau_de_bord['factures_payees'], 1)
+        self.assertEqual(periodes[0]['nombre'], 2)
+        self.assertEqual(top, [{'client__nom': "Client Async", 'nombre': 2, 'total_ttc': Decimal('180.00')}])
+        self.assertEqual(
+            await Facture.objects.par_client(self.client_test.pk).non_payees().amontant_ht_total(),
+            Decimal('50.00'),
+        )
+
+    async def test_vues_asynchrones(self):
+        """Les vues asynchrones rendent les mêmes pages que les vues synchrones."""
+        from django.urls import reverse
+        facture = await Facture.objects.aget(numero='ASYNC-0')
+        pages = [
+            ('index', 'index_async', {}),
+            ('liste_factures', 'liste_factures_async', {}),
+            ('detail_facture', 'detail_facture_async', {'pk': facture.pk}),
+            ('detail_client', 'detail_client_async', {'pk': self.client_test.pk}),
+            ('detail_categorie', 'detail_categorie_async', {'pk': self.categorie.pk}),
+        ]
+        for synchrone, asynchrone, kwargs in pages:
+            with self.subTest(vue=asynchrone):
+                attendue = await self.async_client.get(reverse(synchrone, kwargs=kwargs))
+                reponse = await self.async_client.get(reverse(asynchrone, kwargs=kwargs))
+                self.assertEqual(reponse.status_code, 200)
+                self.assertEqual(reponse.content, attendue.content)
+
+        reponse = await self.async_client.get(reverse('liste_factures_async'), {'client': self.client_test.pk})
+        self.assertEqual(len(reponse.context['factures']), 2)
+        reponse = await self.async_client.get(reverse('detail_client_async', kwargs={'pk': 0}))
+        self.assertEqual(reponse.status_code, 404)
+
+    def test_vues_asynchrones_cache_en_base(self):
+        """Avec un cache en base, les fragments en cache sont lus hors de la boucle d'évènements."""
+        from asgiref.sync import async_to_sync
+        from django.core.management import call_command
+        from django.urls import reverse
+        caches_base = {'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'facture_cache_test',
+        }}
+        pages = [
+            ('index_async', {}),
+            ('liste_factures_async', {}),
+            ('detail_facture_async', {'pk': Facture.objects.get(numero='ASYNC-0').pk}),
+            ('detail_client_async', {'pk': self.client_test.pk}),
+            ('detail_categorie_async', {'pk': self.categorie.pk}),
+        ]
+        with override_settings(CACHES=caches_base):
+            call_command('createcachetable', verbosity=0)
+            for nom, kwargs in pages:
+                with self.subTest(vue=nom):
+                    reponse = async_to_sync(self.async_client.get)(reverse(nom, kwargs=kwargs))
+                    self.assertEqual(reponse.status_code, 200)
+
+    async def test_requetes_simultanees(self):
+        """Hors base en mémoire, les appels sont exécutés simultanément dans des threads distincts."""
+        import threading
+        import time
+        from unittest import mock
+        from . import asynchrone
+
+        def appel():
+            time.sleep(0.2)
+            return threading.get_ident()
+
+        with mock.patch.object(asynchrone, 'parallelisme_possible', return_value=True):
+            debut = time.perf_counter()
+            threads = await asynchrone.en_parallele(appel, appel, appel)
+            duree = time.perf_counter() - debut
+        self.assertEqual(len(set(threads)), 3)
+        self.assertLess(duree, 0.5)
+
+
+class ApiJsonTest(TestCase):
+    """Tests de l'API JSON en lecture seule (facture/api.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_a = Client.objects.create(nom="Client A", email="a@example.com")
+        cls.client_b = Client.objects.create(nom="Client B")
+        cls.categorie = Categorie.objects.create(nom="Web", couleur="#123456")
+        cls.factures = [
+            Facture.objects.create(
+                numero=f"API-{numero:02d}", date=date(2024, 1 + numero % 3, 1 + numero),
+                montant_ht=Decimal('100.00'), taux_tva=Decimal('20.00'),
+                client=cls.client_a if numero % 2 else cls.client_b, categorie=cls.categorie,
+            )
+            for numero in range(7)
+        ]
+
+    def _get(self, nom, **parametres):
+        from django.urls import reverse
+        reponse = self.client.get(reverse(nom), parametres)
+        return reponse, json.loads(reponse.content)
+
+    def test_champs_et_montants(self):
+        """fields= restreint les champs ; les montants sont des chaînes décimales."""
+        reponse, donnees = self._get('api_factures', fields='numero,montant_ttc,client_nom')
+        self.assertEqual(reponse['Content-Type'], 'application/json')
+        premiere = donnees['resultats'][0]
+        self.assertEqual(set(premiere), {'numero', 'montant_ttc', 'client_nom'})
+        self.assertEqual(premiere['montant_ttc'], '120.00')
+
+        reponse, donnees = self._get('api_factures', fields='numero,inconnu')
+        self.assertEqual(reponse.status_code, 400)
+        self.assertIn('inconnu', donnees['erreur'])
+
+    def test_pagination_par_curseur(self):
+        """Les pages successives couvrent toutes les factures dans l'ordre (-date, -id)."""
+        attendus = list(Facture.objects.order_by('-date', '-id').values_list('numero', flat=True))
+        numeros, curseur = [], None
+        with self.assertNumQueries(3):
+            while True:
+                parametres = {'fields': 'numero', 'limite': 3, **({'apres': curseur} if curseur else {})}
+                _, donnees = self._get('api_factures', **parametres)
+                numeros += [ligne['numero'] for ligne in donnees['resultats']]
+                curseur = donnees['suivant']
+                if curseur is None:
+                    break
+        self.assertEqual(numeros, attendus)
+
+        reponse, _ = self._get('api_factures', apres='invalide!')
+        self.assertEqual(reponse.status_code, 400)
+
+    def test_filtres(self):
+        """Filtres client, categorie et période ; paramètres invalides en 400."""
+        _, donnees = self._get('api_factures', client=self.client_a.pk, fields='client')
+        self.assertEqual(len(donnees['resultats']), 3)
+        self.assertTrue(all(ligne['client'] == self.client_a.pk for ligne in donnees['resultats']))
+
+        _, donnees = self._get('api_factures', date_debut='2024-02-01', date_fin='2024-02-28', fields='date')
+        self.assertTrue(all(ligne['date'].startswith('2024-02') for ligne in donnees['resultats']))
+
+        for parametres in ({'client': 'abc'}, {'date_debut': '01/02/2024'}, {'limite': '0'}):
+            reponse, _ = self._get('api_factures', **parametres)
+            self.assertEqual(reponse.status_code, 400)
+
+    def test_lot(self):
+        """Le lot renvoie les factures demandées dans l'ordre, en une requête."""
+        ids = [self.factures[3].pk, 999999, self.factures[0].pk]
+        with self.assertNumQueries(1):
+            _, donnees = self._get('api_lot_factures', ids=','.join(map(str, ids)), fields='id,numero')
+        self.assertEqual([ligne['numero'] for ligne in donnees['resultats']], ['API-03', 'API-00'])
+        self.assertEqual(donnees['introuvables'], [999999])
+
+        reponse, _ = self._get('api_lot_factures', ids='1,x')
+        self.assertEqual(reponse.status_code, 400)
+
+    def test_clients_et_categories(self):
+        """Clients et catégories paginés par identifiant ; lecture seule."""
+        from django.urls import reverse
+        _, donnees = self._get('api_clients', fields='nom', limite=1)
+        self.assertEqual(donnees['resultats'], [{'nom': 'Client A'}])
+        _, donnees = self._get('api_clients', fields='nom', apres=donnees['suivant'])
+        self.assertEqual(donnees['resultats'], [{'nom': 'Client B'}])
+        self.assertIsNone(donnees['suivant'])
+
+        _, donnees = self._get('api_categories', fields='nom,nb_factures')
+        self.assertIn({'nom': 'Web', 'nb_factures': 7}, donnees['resultats'])
+
+        self.assertEqual(self.client.post(reverse('api_factures')).status_code, 405)
+
+
+class RequetesConditionnellesTest(TestCase):
+    """Tests des réponses 304 (ETag / Last-Modified) de la liste et des détails."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_test = Client.objects.create(nom="Client ETag")
+        cls.categorie = Categorie.objects.create(nom="ETag", couleur="#123456")
+        cls.facture = Facture.objects.create(
+            numero="ETAG-1", date=date(2024, 1, 1), montant_ht=Decimal('100.00'),
+            taux_tva=Decimal('20.00'), client=cls.client_test, categorie=cls.categorie,
+        )
+
+    def _urls(self):
+        from django.urls import reverse
+        return [
+            reverse('liste_factures'),
+            reverse('liste_factures') + f'?client={self.client_test.pk}',
+            reverse('detail_facture', kwargs={'pk': self.facture.pk}),
+            reverse('detail_client', kwargs={'pk': self.client_test.pk}),
+        ]
+
+    def _revalider(self, url, reponse):
+        return self.client.get(
+            url, HTTP_IF_NONE_MATCH=reponse['ETag'], HTTP_IF_MODIFIED_SINCE=reponse['Last-Modified'],
+        )
+
+    def test_304_sans_requete_principale(self):
+        """Une page inchangée est revalidée en 304, avec une seule requête et sans rendu."""
+        for url in self._urls():
+            with self.subTest(url=url):
+                reponse = self.client.get(url)
+                self.assertEqual(reponse.status_code, 200)
+                self.assertIn('ETag', reponse)
+                self.assertIn('Last-Modified', reponse)
+                with self.assertNumQueries(1):
+                    revalidation = self._revalider(url, reponse)
+                self.assertEqual(revalidation.status_code, 304)
+                self.assertEqual(revalidation.templates, [])
+
+    def test_modifications(self):
+        """Modification, modification en masse et suppression changent l'ETag."""
+        url = self._urls()[0]
+        etags = {self.client.get(url)['ETag']}
+
+        self.facture.paye = True
+        self.facture.save()
+        etags.add(self.client.get(url)['ETag'])
+
+        Facture.objects.filter(pk=self.facture.pk).update(date_modification=date(2000, 1, 1))
+        Facture.objects.filter(pk=self.facture.pk).update(paye=False)
+        etags.add(self.client.get(url)['ETag'])
+
+        Facture.objects.create(
+            numero="ETAG-2", date=date(2024, 2, 1), montant_ht=Decimal('10.00'),
+            taux_tva=Decimal('20.00'), client=self.client_test,
+        ).delete()
+        etags.add(self.client.get(url)['ETag'])
+        self.assertEqual(len(etags), 4)
+
+        reponse = self.client.get(url)
+        self.facture.delete()
+        self.assertEqual(self._revalider(url, reponse).status_code, 200)
+
+    def test_suppression_sans_changement_du_max(self):
+        """Supprimer une facture plus ancienne que les autres change l'ETag de la liste."""
+        ancienne = Facture.objects.create(
+            numero="ETAG-4", date=date(2024, 4, 1), montant_ht=Decimal('10.00'),
+            taux_tva=Decimal('20.00'), client=self.client_test,
+        )
+        autrefois = timezone.now() - timedelta(days=365)
+        Facture.objects.filter(pk=ancienne.pk).update(date_modification=autrefois)
+        Client.objects.update(date_modification=autrefois)
+        url = self._urls()[0]
+        reponse = self.client.get(url)
+        ancienne.delete()
+        # La mise à jour des compteurs du client a changé sa date de modification
+        Client.objects.update(date_modification=autrefois)
+        self.assertEqual(self._revalider(url, reponse).status_code, 200)
+
+    def test_pages_independantes(self):
+        """Le détail d'une facture ne dépend pas des autres factures."""
+        url = self._urls()[2]
+        reponse = self.client.get(url)
+        Facture.objects.create(
+            numero="ETAG-3", date=date(2024, 3, 1), montant_ht=Decimal('10.00'),
+            taux_tva=Decimal('20.00'), client=Client.objects.create(nom="Autre client"),
+        )
+        self.assertEqual(self._revalider(url, reponse).status_code, 304)
+
+    def test_introuvable(self):
+        """Une page introuvable reste une 404."""
+        from django.urls import reverse
+        for nom in ('detail_facture', 'detail_client'):
+            self.assertEqual(self.client.get(reverse(nom, kwargs={'pk': 999999})).status_code, 404)
+
+
+
+class MigrationNumerotationTest(TransactionTestCase):
+    """Tests de la migration 0011, qui renomme les numéros en double avant de poser l'index unique."""
+
+    avant = [('facture', '0010_date_modification')]
+    apres = [('facture', '0011_numerotation_factures')]
+
+    def _migrer(self, cible=None):
+        """Migre la base de test vers cible (la dernière migration par défaut) et retourne ses modèles."""
+        from django.db import connection
+        from django.db.migrations.executor import MigrationExecutor
+        executeur = MigrationExecutor(connection)
+        cible = cible or executeur.loader.graph.leaf_nodes()
+        executeur.migrate(cible)
+        return executeur.loader.project_state(cible).apps
+
+    def setUp(self):
+        self.addCleanup(self._migrer)
+        apps = self._migrer(self.avant)
+        FactureHistorique = apps.get_model('facture', 'Facture')
+        client = apps.get_model('facture', 'Client').objects.create(nom="Client Migration")
+
+        def creer(numero):
+            return FactureHistorique.objects.create(
+                numero=numero, date=date(2024, 1, 1), montant_ht=Decimal('10.00'), taux_tva=Decimal('20.00'),
+                montant_tva=Decimal('2.00'), montant_ttc=Decimal('12.00'), client=client,
+            )
+
+        self.originale = creer("DOUBLE")
+        self.doublon = creer("DOUBLE")
+        # Numéro que le renommage "<numero>-<pk>" du doublon aurait produit
+        self.existante = creer(f"DOUBLE-{self.doublon.pk}")
+        self.long = [creer("L" * 255), creer("L" * 255)]
+
+    def test_renommage_sans_collision(self):
+        """Les doublons reçoivent un numéro libre, tenant dans la colonne."""
+        apps = self._migrer(self.apres)
+        numeros = dict(apps.get_model('facture', 'Facture').objects.values_list('pk', 'numero'))
+
+        self.assertEqual(numeros[self.originale.pk], "DOUBLE")
+        self.assertEqual(numeros[self.existante.pk], f"DOUBLE-{self.doublon.pk}")
+        self.assertEqual(numeros[self.doublon.pk], f"DOUBLE-{self.doublon.pk}-2")
+        self.assertEqual(numeros[self.long[0].pk], "L" * 255)
+        suffixe = f"-{self.long[1].pk}"
+        self.assertEqual(numeros[self.long[1].pk], "L" * (255 - len(suffixe)) + suffixe)
+        self.assertEqual(len(set(numeros.values())), len(numeros))
@@ -6,7 +6,8 @@ catégories et factures. Chaque route suit le pattern RESTful standard
 avec les opérations CRUD (Create, Read, Update, Delete).
 """
 from django.urls import path
-from . import views
+from . import api, views
+from .conditionnel import etat_client, etat_facture, etat_liste_factures, page_conditionnelle
 
 # Configuration des URLs de l'application facture
 urlpatterns = [
@@ -14,16 +15,18 @@ urlpatterns = [
     # Routes pour la gestion complète des clients (CRUD)
     path('clients/', views.ListeClientsView.as_view(), name='liste_clients'),                    # Liste tous les clients
     path('clients/creer/', views.CreerClientView.as_view(), name='creer_client'),                # Formulaire de création
-    path('clients/<int:pk>/', views.DetailClientView.as_view(), name='detail_client'),           # Détails d'un client
+    path('clients/<int:pk>/', page_conditionnelle(etat_client)(views.DetailClientView.as_view()), name='detail_client'), # Détails d'un client (ETag)
     path('clients/<int:pk>/modifier/', views.ModifierClientView.as_view(), name='modifier_client'), # Formulaire de modification
     path('clients/<int:pk>/supprimer/', views.SupprimerClientView.as_view(), name='supprimer_client'), # Confirmation de suppression
 
     # ===== GESTION DES FACTURES =====
     # Routes pour la gestion complète des factures (CRUD)
     # Supporte les filtres par client et catégorie via paramètres GET
-    path('factures/', views.ListeFacturesView.as_view(), name='liste_factures'),                 # Liste toutes les factures
+    # Liste et détails répondent 304 si la page n'a pas changé (voir conditionnel.py)
+    path('factures/', page_conditionnelle(etat_liste_factures)(views.ListeFacturesView.as_view()), name='liste_factures'), # Liste toutes les factures (ETag)
     path('factures/creer/', views.CreerFactureView.as_view(), name='creer_facture'),             # Formulaire de création
-    path('factures/<int:pk>/', views.DetailFactureView.as_view(), name='detail_facture'),        # Détails d'une facture
+    path('factures/export/', views.exporter_factures_csv, name='exporter_factures'),              # Export CSV en flux
+    path('factures/<int:pk>/', page_conditionnelle(etat_facture)(views.DetailFactureView.as_view()), name='detail_facture'), # Détails d'une facture (ETag)
     path('factures/<int:pk>/modifier/', views.ModifierFactureView.as_view(), name='modifier_facture'), # Formulaire de modification
     path('factures/<int:pk>/supprimer/', views.SupprimerFactureView.as_view(), name='supprimer_facture'), # Confirmation de suppression
 
@@ -35,6 +38,31 @@ urlpatterns = [
     path('categories/<int:pk>/modifier/', views.ModifierCategorieView.as_view(), name='modifier_categorie'), # Formulaire de modification
     path('categories/<int:pk>/supprimer/', views.SupprimerCategorieView.as_view(), name='supprimer_categorie'), # Confirmation de suppression
 
+    # ===== API JSON (LECTURE SEULE) =====
+    # Champs choisis avec fields=, pagination par curseur avec apres= (voir facture/api.py)
+    path('api/factures/', api.liste_factures, name='api_factures'),                              # Factures filtrées
+    path('api/factures/lot/', api.lot_factures, name='api_lot_factures'),                         # Factures par identifiants
+    path('api/clients/', api.liste_clients, name='api_clients'),                                  # Clients
+    path('api/categories/', api.liste_categories, name='api_categories'),                         # Catégories
+
+    # ===== VARIANTES ASYNCHRONES =====
+    # Requêtes indépendantes exécutées simultanément (servir avec un serveur ASGI, ex. uvicorn)
+    path('async/', views.index_async, name='index_async'),                                       # Page d'accueil
+    path('async/factures/', views.ListeFacturesAsyncView.as_view(), name='liste_factures_async'), # Liste des factures
+    path('async/factures/<int:pk>/', views.DetailFactureAsyncView.as_view(), name='detail_facture_async'), # Détails d'une facture
+    path('async/clients/<int:pk>/', views.DetailClientAsyncView.as_view(), name='detail_client_async'),    # Détails d'un client
+    path('async/categories/<int:pk>/', views.DetailCategorieAsyncView.as_view(), name='detail_categorie_async'), # Détails d'une catégorie
+
+    # ===== PROFILS DE REQUÊTES (STAFF) =====
+    # Profils enregistrés par ProfilageMiddleware (voir facture/profilage.py)
+    path('profils/', views.liste_profils, name='liste_profils'),                                  # Profils, les plus lents d'abord
+    path('profils/<str:nom>/', views.detail_profil, name='detail_profil'),                        # Fonctions les plus coûteuses
+    path('profils/<str:nom>/telecharger/', views.telecharger_profil, name='telecharger_profil'),  # Fichier .prof
+
+    # ===== MÉTRIQUES PROMETHEUS =====
+    # Sans barre finale : chemin par défaut des collecteurs (voir facture/metriques.py)
+    path('metrics', views.exposer_metriques, name='metriques'),                                   # Format texte Prometheus
+
     # ===== VUE DE TEST MIDDLEWARE =====
     path('test-middleware/', views.test_middleware_view, name='test_middleware'),                # Vue de test du middleware
 ]
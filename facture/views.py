@@ -1,9 +1,61 @@
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.cache import never_cache
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.db import transaction
 from django.urls import reverse_lazy
-from .models import Categorie, Facture, Client
+from django.utils.functional import SimpleLazyObject
+from .models import Categorie, Facture, Client, SequenceFacture
 from .forms import CategorieForm, FactureForm, ClientForm
+from .asynchrone import en_parallele
+from .cache_rapports import valeur_en_cache
+from .pagination import paginer_par_curseur
+from .export import lignes_csv
+from .metriques import TYPE_CONTENU, configuration_metriques, registre
+from .profilage import chemin_profil, profils_enregistres, resume_profil
+
+
+# Nombre d'éléments affichés dans chaque aperçu de la page d'accueil
+TAILLE_APERCU = 3
+
+
+def requetes_index():
+    """
+    Requêtes indépendantes de la page d'accueil, par nom de variable du
+    contexte : évaluées à la demande par index(), simultanément par
+    index_async().
+    """
+    return {
+        # Les indicateurs sont servis par le cache versionné des rapports
+        'tableau_de_bord': Facture.objects.en_cache().tableau_de_bord,
+        'factures': (
+            Facture.objects.select_related('client', 'categorie')
+            .order_by('-date', '-id')[:TAILLE_APERCU]
+        ),
+        'categories': Categorie.objects.order_by('nom')[:TAILLE_APERCU],
+        'clients': Client.objects.order_by('nom')[:TAILLE_APERCU],
+        'total_categories': Categorie.objects.count,
+        'total_clients': Client.objects.count,
+    }
+
+
+def contexte_index(resultats):
+    """Complète le contexte de la page d'accueil à partir des résultats des requêtes."""
+    tableau_de_bord = resultats['tableau_de_bord']
+    return {
+        **resultats,
+        'total_factures': tableau_de_bord['total_factures'],
+        'factures_payees': tableau_de_bord['factures_payees'],
+        'montant_total': tableau_de_bord['total_ttc'],
+    }
 
 
 def index(request):
@@ -11,26 +63,28 @@ def index(request):
     Vue d'accueil affichant un aperçu des dernières factures,
     des catégories et des clients.
     Utilise les méthodes du Manager et QuerySet personnalisés.
+    Les indicateurs sont calculés en une seule requête et les aperçus
+    sont bornés, pour un temps de réponse indépendant du volume de données.
+    Les requêtes ne sont évaluées qu'au rendu : celles des aperçus dont le
+    fragment est en cache ne sont pas exécutées.
     """
-    factures = Facture.objects.all()
-    dernieres_factures = factures.order_by('-date')[:5]
-
-    total_factures = factures.count()
-    factures_payees = factures.payees().count()
-    montant_total = factures.montant_total()
+    resultats = {
+        nom: SimpleLazyObject(requete) if callable(requete) else requete
+        for nom, requete in requetes_index().items()
+    }
+    return render(request, 'index.html', contexte_index(resultats))
 
-    categories = Categorie.objects.all()
-    clients = Client.objects.all().order_by('nom')
 
-    context = {
-        'factures': dernieres_factures,
-        'categories': categories,
-        'clients': clients,
-        'total_factures': total_factures,
-        'factures_payees': factures_payees,
-        'montant_total': montant_total,
-    }
-    return render(request, 'index.html', context)
+async def index_async(request):
+    """
+    Variante asynchrone de index() : les requêtes de la page d'accueil sont
+    exécutées simultanément, le temps de réponse est celui de la plus lente.
+    Le rendu, qui lit les fragments en cache (éventuellement en base), est
+    exécuté hors de la boucle d'évènements.
+    """
+    requetes = requetes_index()
+    resultats = dict(zip(requetes, await en_parallele(*requetes.values())))
+    return await sync_to_async(render)(request, 'index.html', contexte_index(resultats))
 
 
 # ===== VUES POUR LES CATÉGORIES =====
@@ -74,10 +128,20 @@ class DetailCategorieView(DetailView):
     template_name = 'categories/detail.html'
     context_object_name = 'categorie'
 
+    def requetes_annexes(self):
+        """Requêtes du contexte indépendantes de la catégorie affichée."""
+        return {
+            'factures': (
+                Facture.objects.par_categorie(self.kwargs[self.pk_url_kwarg])
+                .select_related('client')
+                .order_by('-date')
+            ),
+        }
+
     def get_context_data(self, **kwargs):
         """Ajoute la liste des factures de cette catégorie au contexte."""
         context = super().get_context_data(**kwargs)
-        context['factures'] = Facture.objects.filter(categorie=self.object).order_by('-date')
+        context.update(self.requetes_annexes())
         return context
 
 
@@ -122,54 +186,137 @@ class DetailClientView(DetailView):
     template_name = 'clients/detail.html'
     context_object_name = 'client'
 
+    def requetes_annexes(self):
+        """Requêtes du contexte indépendantes du client affiché."""
+        return {
+            'factures': (
+                Facture.objects.par_client(self.kwargs[self.pk_url_kwarg])
+                .select_related('categorie')
+                .order_by('-date')
+            ),
+        }
+
     def get_context_data(self, **kwargs):
         """Ajoute la liste des factures de ce client au contexte."""
         context = super().get_context_data(**kwargs)
-        context['factures'] = Facture.objects.filter(client=self.object).order_by('-date')
+        context.update(self.requetes_annexes())
         return context
 
 
 # ===== VUES POUR LES FACTURES =====
 
+def noms_par_id(modele):
+    """
+    Noms des clients ou catégories par identifiant, dans l'ordre alphabétique,
+    en cache jusqu'à la prochaine écriture sur les données.
+    """
+    return valeur_en_cache(
+        f'noms_par_id:{modele._meta.model_name}',
+        lambda: dict(modele.objects.order_by('nom').values_list('id', 'nom')),
+    )
+
+
+def nom_selectionne(noms, valeur):
+    """Nom correspondant à l'identifiant sélectionné dans un filtre (None s'il est inconnu)."""
+    try:
+        return noms.get(int(valeur)) if valeur else None
+    except ValueError:
+        return None
+
+
 class ListeFacturesView(ListView):
     """
     Vue pour afficher la liste des factures avec filtres par client et catégorie.
     Supporte les filtres combinés via les paramètres GET 'client' et 'categorie'.
+    Pagination par curseur sur (-date, -id) via les paramètres GET 'apres' et 'avant'.
     """
     model = Facture
     template_name = 'factures/liste.html'
     context_object_name = 'factures'
-    ordering = ['-date']
+    ordering = ['-date', '-id']
+    paginate_by = 30
 
     def get_queryset(self):
         """
         Applique les filtres par client et/ou catégorie selon les paramètres GET.
         Utilise les méthodes du QuerySet personnalisé.
         """
-        queryset = super().get_queryset()
-        client_id = self.request.GET.get('client')
-        categorie_id = self.request.GET.get('categorie')
-
-        if client_id:
-            queryset = queryset.par_client(client_id)
-        if categorie_id:
-            queryset = queryset.par_categorie(categorie_id)
+        queryset = super().get_queryset().select_related('client', 'categorie')
+        return queryset.filtrer(
+            client=self.request.GET.get('client'),
+            categorie=self.request.GET.get('categorie'),
+        )
 
-        return queryset
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Remplace la pagination par OFFSET de ListView par une pagination par curseur :
+        une page profonde coûte autant que la première.
+        """
+        page = paginer_par_curseur(
+            queryset,
+            page_size,
+            apres=self.request.GET.get('apres'),
+            avant=self.request.GET.get('avant'),
+        )
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def requetes_annexes(self):
+        """Noms des clients et catégories proposés dans les filtres, par identifiant."""
+        return {
+            'noms_clients': lambda: noms_par_id(Client),
+            'noms_categories': lambda: noms_par_id(Categorie),
+        }
 
     def get_context_data(self, **kwargs):
         """
-        Ajoute les listes de clients et catégories au contexte pour les filtres,
-        ainsi que les valeurs actuellement sélectionnées.
+        Ajoute les noms des clients et catégories au contexte pour les filtres,
+        ainsi que les valeurs actuellement sélectionnées et leurs noms.
         """
         context = super().get_context_data(**kwargs)
-        context['clients'] = Client.objects.all().order_by('nom')
-        context['categories'] = Categorie.objects.all().order_by('nom')
+        context.update({
+            nom: requete() if callable(requete) else requete
+            for nom, requete in self.requetes_annexes().items()
+        })
         context['client_selectionne'] = self.request.GET.get('client')
         context['categorie_selectionnee'] = self.request.GET.get('categorie')
+        context['nom_client_selectionne'] = nom_selectionne(context['noms_clients'], context['client_selectionne'])
+        context['nom_categorie_selectionnee'] = nom_selectionne(
+            context['noms_categories'], context['categorie_selectionnee'],
+        )
+
+        # Filtres à conserver dans les liens de pagination
+        filtres = self.request.GET.copy()
+        filtres.pop('apres', None)
+        filtres.pop('avant', None)
+        context['parametres_filtres'] = filtres.urlencode()
         return context
 
 
+def exporter_factures_csv(request):
+    """
+    Exporte en CSV les factures filtrées par client, catégorie et période
+    (paramètres GET 'client', 'categorie', 'date_debut', 'date_fin').
+    La réponse est envoyée en flux, sans construire le fichier en mémoire.
+    """
+    try:
+        date_debut, date_fin = (
+            date.fromisoformat(valeur) if valeur else None
+            for valeur in (request.GET.get('date_debut'), request.GET.get('date_fin'))
+        )
+    except ValueError:
+        return HttpResponseBadRequest("Date invalide (format attendu : AAAA-MM-JJ).")
+
+    factures = Facture.objects.filtrer(
+        client=request.GET.get('client'),
+        categorie=request.GET.get('categorie'),
+        date_debut=date_debut,
+        date_fin=date_fin,
+    )
+    response = StreamingHttpResponse(lignes_csv(factures), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="factures.csv"'
+    return response
+
+
 class CreerFactureView(CreateView):
     """
     Vue pour créer une nouvelle facture.
@@ -189,15 +336,19 @@ class CreerFactureView(CreateView):
         facture = form.save(commit=False)
 
         # Si aucune catégorie n'est sélectionnée, assigner "Autres"
-        if not facture.categorie:
-            categorie_autres, created = Categorie.objects.get_or_create(
-                nom="Autres",
-                defaults={'couleur': '#6c757d'}
-            )
-            facture.categorie = categorie_autres
+        if not facture.categorie_id:
+            facture.categorie_id = Categorie.objects.id_autres()
 
-        facture.save()
-        return super().form_valid(form)
+        # Numéro attribué dans la transaction de l'INSERT : rendu à la séquence en cas d'échec
+        with transaction.atomic():
+            if not facture.numero:
+                facture.numero = SequenceFacture.objects.prochain_numero(facture.date.year)
+            facture.save()
+        self.object = facture
+
+        # Transmettre la facture créée au LogCreationFactureMiddleware
+        self.request.facture_creee_pk = facture.pk
+        return HttpResponseRedirect(self.get_success_url())
 
 
 class ModifierFactureView(UpdateView):
@@ -228,14 +379,13 @@ class ModifierFactureView(UpdateView):
             facture.categorie = form.cleaned_data['categorie']
         else:
             # Utiliser la même logique que le Manager
-            categorie, created = Categorie.objects.get_or_create(
-                nom='Autres',
-                defaults={'couleur': '#6c757d'}
-            )
-            facture.categorie = categorie
+            facture.categorie_id = Categorie.objects.id_autres()
 
+        # Un seul enregistrement : super().form_valid() réenregistrerait form.instance,
+        # dont l'état chargé (compteurs, agrégats) est antérieur à cette modification
         facture.save()
-        return super().form_valid(form)
+        self.object = facture
+        return HttpResponseRedirect(self.get_success_url())
 
     def get_success_url(self):
         return reverse_lazy('detail_facture', kwargs={'pk': self.object.pk})
@@ -247,6 +397,10 @@ class SupprimerFactureView(DeleteView):
     template_name = 'factures/supprimer.html'
     success_url = reverse_lazy('liste_factures')
 
+    def get_queryset(self):
+        """Charge le client et la catégorie affichés dans la confirmation."""
+        return super().get_queryset().select_related('client', 'categorie')
+
 
 class DetailFactureView(DetailView):
     """Vue pour afficher les détails d'une facture."""
@@ -254,6 +408,129 @@ class DetailFactureView(DetailView):
     template_name = 'factures/detail.html'
     context_object_name = 'facture'
 
+    def get_queryset(self):
+        """Charge le client et la catégorie dans la même requête que la facture."""
+        return super().get_queryset().select_related('client', 'categorie')
+
+
+# ===== VARIANTES ASYNCHRONES (ASGI) =====
+# Mêmes templates et mêmes requêtes que les vues synchrones, mais les requêtes
+# indépendantes d'une page sont exécutées simultanément (voir facture/asynchrone.py).
+
+def rendre(vue, **kwargs):
+    """
+    Construit le contexte d'une vue et rend son template, depuis un thread :
+    le rendu lit les fragments en cache, éventuellement en base.
+    """
+    return vue.render_to_response(vue.get_context_data(**kwargs)).render()
+
+
+class ListeFacturesAsyncView(ListeFacturesView):
+    """
+    Variante asynchrone de ListeFacturesView : la page de factures et les
+    listes des filtres sont lues simultanément.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        requetes = super().requetes_annexes()
+        self._pagination, *resultats = await en_parallele(
+            lambda: ListeFacturesView.paginate_queryset(self, self.object_list, self.paginate_by),
+            *requetes.values(),
+        )
+        self._annexes = dict(zip(requetes, resultats))
+        return await sync_to_async(rendre)(self)
+
+    def paginate_queryset(self, queryset, page_size):
+        # Page déjà lue par get()
+        return self._pagination
+
+    def requetes_annexes(self):
+        return self._annexes
+
+
+class DetailAsynchroneMixin:
+    """
+    Variante asynchrone d'une DetailView : l'objet affiché et les requêtes
+    annexes du contexte (requetes_annexes()) sont lus simultanément.
+    """
+
+    _annexes = None
+
+    async def get(self, request, *args, **kwargs):
+        requetes = self.requetes_annexes()
+        self.object, *resultats = await en_parallele(self.get_object, *requetes.values())
+        self._annexes = dict(zip(requetes, resultats))
+        return await sync_to_async(rendre)(self, object=self.object)
+
+    def requetes_annexes(self):
+        if self._annexes is not None:
+            return self._annexes
+        return getattr(super(), 'requetes_annexes', dict)()
+
+
+class DetailFactureAsyncView(DetailAsynchroneMixin, DetailFactureView):
+    """Variante asynchrone de DetailFactureView."""
+
+
+class DetailClientAsyncView(DetailAsynchroneMixin, DetailClientView):
+    """Variante asynchrone de DetailClientView : le client et ses factures sont lus simultanément."""
+
+
+class DetailCategorieAsyncView(DetailAsynchroneMixin, DetailCategorieView):
+    """Variante asynchrone de DetailCategorieView : la catégorie et ses factures sont lues simultanément."""
+
+
+# ===== PROFILS DE REQUÊTES (STAFF) =====
+
+# Nombre de profils affichés, du plus lent au plus rapide
+NOMBRE_PROFILS_AFFICHES = 50
+
+
+@staff_member_required
+def liste_profils(request):
+    """Liste les profils de requêtes enregistrés (voir facture/profilage.py), les plus lents d'abord."""
+    profils = profils_enregistres()
+    return render(request, 'profils/liste.html', {
+        'profils': profils[:NOMBRE_PROFILS_AFFICHES],
+        'total_profils': len(profils),
+    })
+
+
+@staff_member_required
+def detail_profil(request, nom):
+    """Affiche les fonctions les plus coûteuses d'un profil."""
+    try:
+        resume = resume_profil(nom)
+    except ValueError:
+        raise Http404("Profil introuvable")
+    return render(request, 'profils/detail.html', {'nom': nom, 'resume': resume})
+
+
+@staff_member_required
+def telecharger_profil(request, nom):
+    """Télécharge le fichier .prof d'un profil (pour snakeviz, pstats...)."""
+    try:
+        chemin = chemin_profil(nom)
+    except ValueError:
+        raise Http404("Profil introuvable")
+    return FileResponse(open(chemin, 'rb'), as_attachment=True, filename=nom)
+
+
+# ===== MÉTRIQUES =====
+
+@never_cache
+def exposer_metriques(request):
+    """Métriques au format texte de Prometheus, agrégées sur tous les processus (voir facture/metriques.py)."""
+    config = configuration_metriques()
+    if not config['ACTIVE']:
+        raise Http404("Métriques désactivées")
+    if config['JETON'] and not constant_time_compare(
+        request.headers.get('Authorization', ''), f"Bearer {config['JETON']}",
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(registre.exposer(config['REPERTOIRE']), content_type=TYPE_CONTENU)
+
 
 def test_middleware_view(request):
     """
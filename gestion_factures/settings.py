@@ -13,6 +13,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -55,15 +56,55 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',            # Sécurité (HTTPS, etc.)
+    'facture.middleware.EpinglagePrimaireMiddleware',           # Lecture sur la primaire après écriture
     'django.contrib.sessions.middleware.SessionMiddleware',     # Gestion des sessions
     'django.middleware.common.CommonMiddleware',                # Middleware commun
     'django.middleware.csrf.CsrfViewMiddleware',                # Protection CSRF
     'django.contrib.auth.middleware.AuthenticationMiddleware',  # Authentification
     'django.contrib.messages.middleware.MessageMiddleware',     # Messages flash
     'django.middleware.clickjacking.XFrameOptionsMiddleware',   # Protection clickjacking
+    'facture.middleware.InstrumentationSqlMiddleware',          # Requêtes SQL par page (Server-Timing, /metrics)
+    'facture.middleware.ProfilageMiddleware',                   # Profilage à la demande (staff, en-tête signé)
     'facture.middleware.LogCreationFactureMiddleware',          # Log des créations de factures
 ]
 
+# Instrumentation SQL des requêtes HTTP (voir facture/middleware.py)
+INSTRUMENTATION_SQL = {
+    'SERVER_TIMING': True,       # En-tête Server-Timing (durée et nombre de requêtes SQL)
+    'SEUIL_REQUETES': 50,        # Journalise les pages qui dépassent ces seuils,
+    'SEUIL_DUREE_MS': 500,       # avec le nom de leur URL
+    'SEUIL_DUREE_SQL_MS': 200,
+}
+
+# Profilage à la demande des requêtes (voir facture/profilage.py)
+PROFILAGE_REQUETES = {
+    'REPERTOIRE': BASE_DIR / 'profils',  # Fichiers .prof, listés sur /profils/ (staff)
+    'TAUX': 100,                         # Pourcentage des requêtes éligibles profilées
+    'MAX_FICHIERS': 200,                 # Profils conservés
+}
+
+# Métriques Prometheus exposées sur /metrics (voir facture/metriques.py)
+METRIQUES = {
+    'REPERTOIRE': None,  # Répertoire partagé entre les workers (ex. BASE_DIR / 'metriques')
+    'JETON': None,       # Si défini : en-tête "Authorization: Bearer <jeton>" exigé
+}
+
+# Cache versionné des rapports de factures (voir facture/cache_rapports.py)
+CACHE_RAPPORTS_FACTURES = {
+    'ALIAS': 'default',  # Cache Django utilisé
+    'TTL': 300,          # Durée de vie des entrées (secondes)
+    # Plusieurs processus : refuse les caches propres à chaque processus (LocMemCache)
+    'PROCESSUS_MULTIPLES': False,
+}
+
+# Tampon des logs de création de factures (voir facture/middleware.py)
+LOG_CREATION_FACTURE = {
+    'TAMPON': True,        # Écriture par lots hors du cycle de la requête
+    'TAILLE_LOT': 50,      # Vidage dès que 50 logs sont en attente
+    'DELAI_MAX': 2.0,      # ... ou au plus tard toutes les 2 secondes
+    'CAPACITE_MAX': 1000,  # Au-delà, repli sur une écriture synchrone
+}
+
 # Configuration des URLs racines
 ROOT_URLCONF = 'gestion_factures.urls'
 
@@ -99,6 +140,25 @@ DATABASES = {
     }
 }
 
+# Réplicas en lecture (voir facture/routeurs.py).
+# En local, FACTURE_REPLICAS liste des fichiers SQLite séparés par des virgules,
+# copies de db.sqlite3 : FACTURE_REPLICAS=db_replica.sqlite3 python manage.py runserver
+REPLICAS = [chemin for chemin in os.environ.get('FACTURE_REPLICAS', '').split(',') if chemin]
+for numero, chemin in enumerate(REPLICAS, start=1):
+    DATABASES[f'replica_{numero}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / chemin,
+        'TEST': {'MIRROR': 'default'},  # En test, les réplicas lisent la base primaire
+    }
+
+DATABASE_ROUTERS = ['facture.routeurs.RouteurReplicas']
+
+ROUTAGE_BASES = {
+    'PRIMAIRE': 'default',
+    'REPLICAS': [f'replica_{numero}' for numero in range(1, len(REPLICAS) + 1)],
+    'DELAI_EPINGLAGE': 5,  # Secondes de lecture sur la primaire après une écriture
+}
+
 
 # ===== VALIDATION DES MOTS DE PASSE =====
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
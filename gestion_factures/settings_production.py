@@ -0,0 +1,92 @@
+"""
+Profil de production de gestion_factures.
+
+Reprend settings.py et règle les connexions SQLite pour des écritures
+concurrentes (plusieurs workers WSGI/ASGI sur le même fichier) :
+
+    DJANGO_SETTINGS_MODULE=gestion_factures.settings_production gunicorn gestion_factures.wsgi
+
+Comparer avec le profil de développement :
+    python manage.py bench_ecritures_concurrentes
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES, SECRET_KEY
+
+
+# ===== CONFIGURATION DE SÉCURITÉ =====
+
+DEBUG = False
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)
+ALLOWED_HOSTS = [hote for hote in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if hote]
+
+
+# ===== CONFIGURATION DE LA BASE DE DONNÉES =====
+
+# Options passées à la connexion SQLite de chaque alias (primaire et réplicas)
+CONNEXION_SQLITE = {
+    # Connexions persistantes : pas de réouverture (ni de PRAGMA) à chaque requête
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        # Attente d'un verrou (secondes) avant « database is locked »
+        'timeout': 20,
+        # BEGIN IMMEDIATE : le verrou d'écriture est pris en début de transaction.
+        # En mode DEFERRED, une transaction qui lit puis écrit échoue aussitôt
+        # (sans attendre le timeout) si une autre écrit entre-temps.
+        'transaction_mode': 'IMMEDIATE',
+    },
+}
+
+# Nouveau dictionnaire : settings.DATABASES n'est pas modifié à l'import de ce module
+DATABASES = {
+    alias: {
+        **base,
+        **CONNEXION_SQLITE,
+        'OPTIONS': {**base.get('OPTIONS', {}), **CONNEXION_SQLITE['OPTIONS']},
+    } if base['ENGINE'] == 'django.db.backends.sqlite3' else base
+    for alias, base in DATABASES.items()
+}
+
+# PRAGMA appliqués à chaque nouvelle connexion SQLite (voir facture/connexions.py)
+PRAGMAS_SQLITE = {
+    'journal_mode': 'WAL',      # Lecteurs et écrivain concurrents
+    'synchronous': 'NORMAL',    # Sûr en WAL, un fsync par checkpoint
+    'busy_timeout': 20000,      # Millisecondes, identique à OPTIONS['timeout']
+    'cache_size': -65536,       # 64 Mio de cache de pages (valeur négative : Kio)
+    'mmap_size': 268435456,     # 256 Mio lus par mmap
+    'temp_store': 'MEMORY',     # Tris et tables temporaires en mémoire
+}
+
+
+# ===== CACHE =====
+
+# Cache commun à tous les workers, dans la base SQLite : la version des données
+# (facture/cache_rapports.py) y est changée par le worker qui écrit et lue
+# par tous les autres. Table créée par : python manage.py createcachetable
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'facture_cache',
+    },
+}
+
+CACHE_RAPPORTS_FACTURES = {
+    'ALIAS': 'default',
+    'TTL': 300,
+    # Refuse un cache propre à chaque processus (LocMemCache) s'il est reconfiguré
+    'PROCESSUS_MULTIPLES': True,
+}
+
+
+# ===== MÉTRIQUES =====
+
+# Plusieurs workers : /metrics additionne les instantanés de chaque processus.
+# Sans DJANGO_JETON_METRIQUES, l'application refuse de démarrer (voir facture/metriques.py).
+METRIQUES = {
+    'REPERTOIRE': os.environ.get('DJANGO_REPERTOIRE_METRIQUES', BASE_DIR / 'metriques'),
+    'JETON': os.environ.get('DJANGO_JETON_METRIQUES') or None,
+    'JETON_OBLIGATOIRE': True,
+}